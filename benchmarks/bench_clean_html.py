@@ -0,0 +1,86 @@
+"""
+Throughput benchmark for the clean_html extraction engines.
+
+Generates synthetic Confluence storage-format bodies (large tables, code,
+info and Jira macros) and reports MB/s per engine.
+
+    python benchmarks/bench_clean_html.py --size-kb 200 500 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.confluence_mcp.extract import ENGINES, lxml_available
+
+
+def make_storage_body(target_bytes: int) -> str:
+    """
+    Build a storage-format body of roughly target_bytes.
+    """
+    section = []
+    section.append("<h2>Service overview &amp; ownership</h2>")
+    section.append("<p>This runbook covers the <strong>deployment</strong> and <em>rollback</em> procedures "
+                   "for the service.&nbsp;Contact the on-call engineer before making changes.</p>")
+    section.append('<ac:structured-macro ac:name="info" ac:schema-version="1">'
+                   '<ac:parameter ac:name="title">Heads up</ac:parameter>'
+                   "<ac:rich-text-body><p>Deploys are frozen on Fridays.</p></ac:rich-text-body>"
+                   "</ac:structured-macro>")
+    section.append("<table><tbody><tr><th>Host</th><th>Region</th><th>Role</th><th>Owner</th></tr>")
+    for i in range(40):
+        section.append(f"<tr><td>host-{i:03d}.internal</td><td>eu-west-{i % 3}</td>"
+                       f"<td><p>worker</p></td><td><ac:link><ri:user ri:account-id=\"abc{i}\" /></ac:link></td></tr>")
+    section.append("</tbody></table>")
+    section.append('<ac:structured-macro ac:name="code" ac:schema-version="1">'
+                   '<ac:parameter ac:name="language">bash</ac:parameter>'
+                   "<ac:plain-text-body><![CDATA[kubectl rollout status deploy/api && echo \"ok\" > /tmp/x]]>"
+                   "</ac:plain-text-body></ac:structured-macro>")
+    section.append('<ac:structured-macro ac:name="jira" ac:schema-version="1">'
+                   '<ac:parameter ac:name="key">OPS-1234</ac:parameter>'
+                   '<ac:parameter ac:name="server">System JIRA</ac:parameter>'
+                   "</ac:structured-macro>")
+    section.append("<ul><li>Check dashboards</li><li>Announce in channel</li><li>Run smoke tests</li></ul>")
+    chunk = "".join(section)
+
+    repeats = max(1, target_bytes // len(chunk))
+    return chunk * repeats
+
+
+def bench(engine, body: str, repeat: int) -> float:
+    fn = ENGINES[engine]
+    fn(body)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(body)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engines = [e for e in ENGINES if e != "lxml" or lxml_available()]
+
+    print(f"{'size':>8}  {'engine':<8} {'median ms':>10} {'MB/s':>8} {'vs bs4':>7}")
+    for size_kb in args.size_kb:
+        body = make_storage_body(size_kb * 1024)
+        mb = len(body.encode("utf-8")) / (1024 * 1024)
+        baseline = bench("bs4", body, args.repeat)
+        reference = ENGINES["bs4"](body)
+        for engine in engines:
+            elapsed = baseline if engine == "bs4" else bench(engine, body, args.repeat)
+            same = "" if ENGINES[engine](body) == reference else "  (output differs)"
+            print(f"{size_kb:>6}KB  {engine:<8} {elapsed * 1000:>10.1f} {mb / elapsed:>8.1f} "
+                  f"{baseline / elapsed:>6.1f}x{same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark for the stdio MCP server.
+
+Spawns the server the same way the agent does and measures, per run:
+
+  import    time to import src.confluence_mcp.server in a fresh interpreter,
+            minus the time to import fastmcp alone (i.e. what this repo adds)
+  init      spawn -> MCP `initialize` answered
+  tools     spawn -> `list_tools` answered
+
+Reports medians and exits non-zero if any median exceeds its threshold, so
+it can run as a regression check:
+
+    python benchmarks/bench_startup.py --runs 5 --max-import-ms 250 --max-tools-ms 4000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Add project root to path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+IMPORT_PROBE = (
+    "import time; t = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def import_seconds(module: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE.format(module=module)],
+        cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+async def spawn_seconds():
+    """
+    Returns (seconds to initialize, seconds to list_tools, tool count).
+    """
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-m", "src.confluence_mcp", "--transport", "stdio"],
+        env=os.environ.copy(),
+        cwd=ROOT
+    )
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - start
+            result = await session.list_tools()
+            listed = time.perf_counter() - start
+    return initialized, listed, len(result.tools)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=float(os.environ.get("BENCH_MAX_IMPORT_MS", "250")))
+    parser.add_argument("--max-init-ms", type=float, default=float(os.environ.get("BENCH_MAX_INIT_MS", "4000")))
+    parser.add_argument("--max-tools-ms", type=float, default=float(os.environ.get("BENCH_MAX_TOOLS_MS", "4000")))
+    args = parser.parse_args()
+
+    # Warm the bytecode cache so the first run isn't an outlier
+    import_seconds("src.confluence_mcp.server")
+
+    imports, inits, tools = [], [], []
+    tool_count = 0
+    for _ in range(args.runs):
+        imports.append(import_seconds("src.confluence_mcp.server") - import_seconds("fastmcp"))
+        initialized, listed, tool_count = asyncio.run(spawn_seconds())
+        inits.append(initialized)
+        tools.append(listed)
+
+    results = [
+        ("import", statistics.median(imports) * 1000, args.max_import_ms),
+        ("init", statistics.median(inits) * 1000, args.max_init_ms),
+        ("tools", statistics.median(tools) * 1000, args.max_tools_ms),
+    ]
+
+    failed = False
+    print(f"{'phase':<8} {'median ms':>10} {'limit ms':>9}")
+    for name, median_ms, limit_ms in results:
+        over = median_ms > limit_ms
+        failed = failed or over
+        print(f"{name:<8} {median_ms:>10.1f} {limit_ms:>9.0f}{'  REGRESSION' if over else ''}")
+    print(f"{tool_count} tools, {args.runs} runs")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+End-to-end benchmark of every MCP tool against the offline mock Confluence.
+
+Starts benchmarks/mock_confluence.py and the stdio MCP server pointed at it,
+then drives each tool through a real MCP client session and reports, per
+tool: calls, errors, throughput, latency percentiles and Confluence requests
+per call (from get_server_stats).
+
+    python benchmarks/bench_tools.py --calls 40 --concurrency 4 --latency-ms 20
+    python benchmarks/bench_tools.py --save-baseline     # write benchmarks/baselines/tools.json
+    python benchmarks/bench_tools.py --compare           # exit 1 on regression
+
+A tool regresses when its p50 or p95 grows by more than --max-regression
+(relative, plus --slack-ms), when it makes more Confluence requests per call,
+or when it fails more often than in the baseline. Baselines are machine
+specific; record them on the machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add project root to path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+from src.confluence_mcp.metrics import Histogram
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "tools.json")
+
+PAGE_BODY = "<h2>Benchmark</h2><p>Written by bench_tools.py.</p>" * 20
+
+# Settings that must match for a baseline comparison to be meaningful
+COMPARED_SETTINGS = ("calls", "concurrency", "pages_per_root", "body_kb", "latency_ms", "jitter_ms")
+
+
+class Context:
+    """
+    Page ids discovered during setup and created while benchmarking.
+    """
+
+    def __init__(self, roots: List[Tuple[str, str]], pages: List[str], run_id: str):
+        self.roots = roots
+        self.pages = pages
+        self.created: List[str] = []
+        self.update_tokens: Dict[str, str] = {}
+        self.run_id = run_id
+
+    def root(self, i: int) -> Tuple[str, str]:
+        return self.roots[i % len(self.roots)]
+
+    def page(self, i: int) -> str:
+        return self.pages[i % len(self.pages)]
+
+    def writable(self, i: int) -> str:
+        return self.created[i % len(self.created)]
+
+
+# Scenarios run in this order; writes to pages created by create_confluence_page
+SCENARIOS: List[Tuple[str, Callable[[int, Context], Dict[str, Any]]]] = [
+    ("search_confluence", lambda i, ctx: {"query": "runbook", "max_results": 50}),
+    ("search_confluence_paged", lambda i, ctx: {"query": "runbook", "limit": 25}),
+    ("get_confluence_page", lambda i, ctx: {"page_id": ctx.page(i), "format": "text"}),
+    ("get_confluence_pages", lambda i, ctx: {"page_ids": [ctx.page(i * 10 + k) for k in range(10)]}),
+    ("get_confluence_children", lambda i, ctx: {"page_id": ctx.root(i)[1]}),
+    ("get_confluence_tree", lambda i, ctx: {"page_id": ctx.root(i)[1], "max_depth": 3}),
+    ("create_confluence_page", lambda i, ctx: {
+        "space_key": ctx.root(i)[0],
+        "parent_id": ctx.root(i)[1],
+        "title": f"bench {ctx.run_id} {i}",
+        "body": PAGE_BODY,
+    }),
+    ("prepare_confluence_page_merge_update", lambda i, ctx: {"page_id": ctx.writable(i)}),
+    ("update_confluence_page_full", lambda i, ctx: {
+        "page_id": ctx.writable(i),
+        "body": PAGE_BODY + f"<p>{i}</p>",
+        "update_token": ctx.update_tokens.get(ctx.writable(i)),
+    }),
+    ("patch_confluence_page", lambda i, ctx: {
+        "page_id": ctx.writable(i),
+        "operations": [{"op": "append", "content": f"<p>patch {i}</p>"}],
+    }),
+    ("get_server_stats", lambda i, ctx: {}),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(args, port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable, os.path.join(ROOT, "benchmarks", "mock_confluence.py"),
+            "--port", str(port),
+            "--config", args.config,
+            "--pages-per-root", str(args.pages_per_root),
+            "--body-kb", str(args.body_kb),
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--rate-limit", str(args.rate_limit),
+        ],
+        cwd=ROOT,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Mock Confluence exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Mock Confluence did not start within 30s")
+
+
+def decode(result) -> Any:
+    text = "\n".join(c.text for c in result.content if c.type == "text")
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def is_error(result, data: Any) -> bool:
+    if result.isError:
+        return True
+    if isinstance(data, dict):
+        return "error" in data
+    if isinstance(data, list):
+        return any(isinstance(item, dict) and "error" in item for item in data)
+    return False
+
+
+async def confluence_requests(session: ClientSession) -> float:
+    stats = decode(await session.call_tool("get_server_stats", {}))
+    return sum(c["value"] for c in stats.get("counters", {}).get("confluence_responses_total", []))
+
+
+async def run_scenario(session, tool, make_args, ctx, calls, concurrency) -> Tuple[Dict[str, Any], List[Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = Histogram(window=calls)
+    outputs = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            result = await session.call_tool(tool, make_args(i, ctx))
+            latencies.observe(time.perf_counter() - start)
+        data = decode(result)
+        if is_error(result, data):
+            errors += 1
+        outputs.append(data)
+
+    requests_before = await confluence_requests(session)
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(calls)])
+    elapsed = time.perf_counter() - started
+    requests = await confluence_requests(session) - requests_before
+
+    snapshot = latencies.snapshot()
+    return {
+        "calls": calls,
+        "errors": errors,
+        "callsPerSecond": round(calls / elapsed, 2),
+        "p50Ms": round(snapshot["p50"] * 1000, 2),
+        "p95Ms": round(snapshot["p95"] * 1000, 2),
+        "p99Ms": round(snapshot["p99"] * 1000, 2),
+        "requestsPerCall": round(requests / calls, 2),
+    }, outputs
+
+
+async def discover(session: ClientSession, config_path: str, run_id: str) -> Context:
+    with open(config_path) as f:
+        config = json.load(f)
+    allowed_spaces = set(config.get("allowed_spaces", []))
+    roots = [
+        (space_key, str(root))
+        for space_key, parents in config.get("allowed_parents", {}).items() if space_key in allowed_spaces
+        for root in parents
+    ]
+    pages = []
+    for _, root in roots:
+        tree = decode(await session.call_tool("get_confluence_tree", {"page_id": root, "max_depth": 10, "max_pages": 10000}))
+        stack = [tree["tree"]]
+        while stack:
+            node = stack.pop()
+            pages.append(node["id"])
+            stack.extend(node.get("children", []))
+    return Context(roots, pages, run_id)
+
+
+async def bench(args, base_url: str) -> Dict[str, Dict[str, Any]]:
+    env = {
+        # The client-side limiter would cap calls/s at the configured rate;
+        # leave it off unless set explicitly or the mock is rate limited
+        "CONFLUENCE_RATE_LIMIT_READ": "0" if not args.rate_limit else str(args.rate_limit),
+        "CONFLUENCE_RATE_LIMIT_WRITE": "0" if not args.rate_limit else str(args.rate_limit),
+        **os.environ,
+        "CONFLUENCE_BASE_URL": base_url,
+        "CONFLUENCE_EMAIL": "bench@example.com",
+        "CONFLUENCE_API_TOKEN": "bench",
+        "CONFLUENCE_MCP_CONFIG": args.config,
+    }
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-m", "src.confluence_mcp", "--transport", "stdio"],
+        env=env,
+        cwd=ROOT
+    )
+    results = {}
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            tools = {t.name for t in (await session.list_tools()).tools}
+            ctx = await discover(session, args.config, str(int(time.time())))
+
+            for tool, make_args in SCENARIOS:
+                if args.tools and tool not in args.tools:
+                    continue
+                if tool not in tools:
+                    print(f"skipping {tool}: not offered by the server")
+                    continue
+                stats, outputs = await run_scenario(session, tool, make_args, ctx, args.calls, args.concurrency)
+                if tool == "create_confluence_page":
+                    ctx.created = [o["id"] for o in outputs if isinstance(o, dict) and o.get("id")]
+                if tool == "prepare_confluence_page_merge_update":
+                    ctx.update_tokens = {
+                        o["id"]: o["updateToken"] for o in outputs if isinstance(o, dict) and o.get("updateToken")
+                    }
+                results[tool] = stats
+
+            uncovered = tools - {tool for tool, _ in SCENARIOS}
+            if uncovered:
+                print(f"not benchmarked (add a scenario): {', '.join(sorted(uncovered))}")
+    return results
+
+
+def regressions(results, baseline, max_regression: float, slack_ms: float) -> Dict[str, List[str]]:
+    found: Dict[str, List[str]] = {}
+    for tool, current in results.items():
+        base = baseline.get(tool)
+        if base is None:
+            continue
+        problems = []
+        for key in ("p50Ms", "p95Ms"):
+            limit = base[key] * (1 + max_regression) + slack_ms
+            if current[key] > limit:
+                problems.append(f"{key} {current[key]:.1f} > {limit:.1f}")
+        # Background prefetches make this slightly timing dependent
+        if current["requestsPerCall"] > base["requestsPerCall"] * 1.1 + 0.05:
+            problems.append(f"requestsPerCall {current['requestsPerCall']} > {base['requestsPerCall']}")
+        if current["errors"] > base["errors"]:
+            problems.append(f"errors {current['errors']} > {base['errors']}")
+        if problems:
+            found[tool] = problems
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=40, help="calls per tool")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tools", nargs="*", help="only benchmark these tools")
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.json"))
+    parser.add_argument("--pages-per-root", type=int, default=100)
+    parser.add_argument("--body-kb", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="mock requests/s before 429s (0 = unlimited)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=float(os.environ.get("BENCH_MAX_REGRESSION", "0.5")))
+    parser.add_argument("--slack-ms", type=float, default=float(os.environ.get("BENCH_SLACK_MS", "5")))
+    args = parser.parse_args()
+    args.config = os.path.abspath(args.config)
+
+    port = free_port()
+    mock = start_mock(args, port)
+    try:
+        results = asyncio.run(bench(args, f"http://127.0.0.1:{port}"))
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    baseline = {}
+    if args.compare:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        differing = [k for k in COMPARED_SETTINGS if saved["settings"].get(k) != getattr(args, k)]
+        if differing:
+            print(f"warning: baseline was recorded with different {', '.join(differing)}")
+
+    print(f"{'tool':<38} {'calls':>5} {'err':>4} {'calls/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/call':>8}")
+    for tool, r in results.items():
+        base_p95 = f"  (baseline p95 {baseline[tool]['p95Ms']:.1f})" if tool in baseline else ""
+        print(
+            f"{tool:<38} {r['calls']:>5} {r['errors']:>4} {r['callsPerSecond']:>8.1f} "
+            f"{r['p50Ms']:>8.1f} {r['p95Ms']:>8.1f} {r['p99Ms']:>8.1f} {r['requestsPerCall']:>8.2f}{base_p95}"
+        )
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "settings": {k: getattr(args, k) for k in COMPARED_SETTINGS},
+                "machine": {"python": platform.python_version(), "platform": platform.platform()},
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {os.path.relpath(args.baseline, ROOT)}")
+
+    if args.compare:
+        found = regressions(results, baseline, args.max_regression, args.slack_ms)
+        for tool, problems in found.items():
+            print(f"REGRESSION {tool}: {'; '.join(problems)}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Offline stand-in for the Confluence Cloud REST API, for benchmarks.
+
+Serves a synthetic page hierarchy under the allowed parents of a config.json
+(so every tool passes its access checks), with configurable size, page body
+size and injected latency:
+
+    python benchmarks/mock_confluence.py --port 8090 --pages-per-root 200 --body-kb 20 --latency-ms 30
+
+With --rate-limit N it also behaves like Confluence Cloud under load: more
+than N requests in a one-second window get 429 with Retry-After, and every
+response carries X-RateLimit-Limit/Remaining/Reset (plus NearLimit).
+
+Point the server at it with CONFLUENCE_BASE_URL=http://127.0.0.1:8090.
+
+Endpoints (response shapes follow Confluence Cloud):
+
+  GET  /rest/api/search                     CQL search, start/limit pagination
+  GET  /rest/api/content/search             CQL content search
+  GET  /rest/api/content/{id}               page, with expand
+  GET  /rest/api/content/{id}/child/page    children, start/limit pagination
+  POST /rest/api/content                    create
+  PUT  /rest/api/content/{id}               update (version must be current + 1)
+
+Only the CQL the server itself generates is understood: space, id and
+ancestor lists, text~/title~ terms, lastmodified >= "YYYY-MM-DD" and type
+(ignored).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlencode
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_clean_html import make_storage_body
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Ids of generated pages start here, clear of the configured parent ids
+FIRST_PAGE_ID = 10_000_000
+
+MANAGED_LABEL = {"prefix": "global", "name": "ai-managed"}
+
+SCOPE_RE = re.compile(r"\(id in \(([^)]*)\) OR ancestor in \(([^)]*)\)\)")
+ID_LIST_RE = re.compile(r"\bid in \(([^)]*)\)")
+ANCESTOR_LIST_RE = re.compile(r"\bancestor in \(([^)]*)\)")
+SPACE_LIST_RE = re.compile(r"\bspace in \(([^)]*)\)")
+SPACE_EQ_RE = re.compile(r'\bspace\s*=\s*"([^"]+)"')
+TEXT_RE = re.compile(r'\b(text|title)\s*~\s*"([^"]*)"')
+MODIFIED_RE = re.compile(r'\blastmodified\s*>=\s*"([^"]+)"')
+
+
+def _ids(text: str) -> Set[str]:
+    return {part.strip().strip('"') for part in text.split(",") if part.strip()}
+
+
+class MockConfluence:
+    """
+    In-memory Confluence content store.
+    """
+
+    def __init__(
+        self,
+        allowed_parents: Dict[str, List[str]],
+        pages_per_root: int = 100,
+        fanout: int = 10,
+        body_kb: int = 10,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        seed: int = 42,
+        rate_limit: int = 0,
+    ):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_limit = rate_limit
+        self.window_start = 0
+        self.window_count = 0
+        self.throttled = 0
+        self.random = random.Random(seed)
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.children: Dict[str, List[str]] = {}
+        self.next_id = FIRST_PAGE_ID
+        self.requests = 0
+
+        when = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).isoformat()
+        body = make_storage_body(body_kb * 1024)
+        for space_key, roots in allowed_parents.items():
+            for root_id in roots:
+                self._add(str(root_id), f"{space_key} root {root_id}", space_key, None, body, when)
+                # Breadth-first: each page gets up to `fanout` children
+                queue = [str(root_id)]
+                for n in range(pages_per_root):
+                    parent = queue[n // fanout]
+                    page_id = self._new_id()
+                    self._add(page_id, f"{space_key} page {page_id}", space_key, parent, body, when)
+                    queue.append(page_id)
+
+    def _new_id(self) -> str:
+        page_id = str(self.next_id)
+        self.next_id += 1
+        return page_id
+
+    def _add(self, page_id, title, space_key, parent_id, body, when, labels=None):
+        ancestors = []
+        if parent_id is not None:
+            ancestors = self.pages[parent_id]["ancestors"] + [parent_id]
+            self.children.setdefault(parent_id, []).append(page_id)
+        if labels is None:
+            # Every other page is writable by the server's label rule
+            labels = [MANAGED_LABEL] if int(page_id) % 2 == 0 else []
+        self.pages[page_id] = {
+            "id": page_id,
+            "title": title,
+            "space": space_key,
+            "ancestors": ancestors,
+            "body": body,
+            "version": 1,
+            "when": when,
+            "labels": list(labels),
+        }
+
+    def move(self, page_id: str, parent_id: Optional[str]):
+        """
+        Move a page and its subtree under parent_id (None: top level of its
+        space). Like Confluence, only the moved page counts as modified.
+        """
+        page = self.pages[page_id]
+        old_parent = page["ancestors"][-1] if page["ancestors"] else None
+        if old_parent is not None:
+            self.children[old_parent].remove(page_id)
+        if parent_id is not None:
+            self.children.setdefault(parent_id, []).append(page_id)
+        depth = len(page["ancestors"])
+        new_ancestors = self.pages[parent_id]["ancestors"] + [parent_id] if parent_id is not None else []
+        stack = [page_id]
+        while stack:
+            current = stack.pop()
+            self.pages[current]["ancestors"] = new_ancestors + self.pages[current]["ancestors"][depth:]
+            stack.extend(self.children.get(current, []))
+        page["when"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    # Representations
+
+    def content(self, page_id: str, expand: str = "") -> Dict[str, Any]:
+        page = self.pages[page_id]
+        expands = {e.strip().split(".")[0] for e in expand.split(",") if e.strip()}
+        data: Dict[str, Any] = {
+            "id": page_id,
+            "type": "page",
+            "status": "current",
+            "title": page["title"],
+            "_links": {"webui": f"/spaces/{page['space']}/pages/{page_id}"},
+        }
+        if "space" in expands:
+            data["space"] = {"key": page["space"], "name": f"{page['space']} space"}
+        if "version" in expands:
+            data["version"] = {"number": page["version"], "when": page["when"]}
+        if "body" in expands:
+            data["body"] = {"storage": {"value": page["body"], "representation": "storage"}}
+        if "metadata" in expands:
+            data["metadata"] = {"labels": {"results": page["labels"], "size": len(page["labels"])}}
+        if "ancestors" in expands:
+            data["ancestors"] = [
+                {"id": a, "type": "page", "title": self.pages[a]["title"]} for a in page["ancestors"]
+            ]
+        return data
+
+    def search_result(self, page_id: str, expand: str) -> Dict[str, Any]:
+        page = self.pages[page_id]
+        content_expand = ",".join(e.strip()[len("content."):] for e in expand.split(",") if e.strip().startswith("content."))
+        return {
+            "content": self.content(page_id, content_expand),
+            "title": page["title"],
+            "excerpt": f"Synthetic page {page_id} in {page['space']}",
+            "url": f"/spaces/{page['space']}/pages/{page_id}",
+            "resultGlobalContainer": {"title": f"{page['space']} space", "displayUrl": f"/spaces/{page['space']}"},
+            "lastModified": page["when"],
+        }
+
+    # CQL
+
+    def query(self, cql: str) -> List[str]:
+        spaces: Optional[Set[str]] = None
+        match = SPACE_LIST_RE.search(cql)
+        if match:
+            spaces = _ids(match.group(1))
+        match = SPACE_EQ_RE.search(cql)
+        if match:
+            spaces = {match.group(1)}
+
+        scope: Optional[Set[str]] = None
+        match = SCOPE_RE.search(cql)
+        if match:
+            scope = _ids(match.group(1)) | _ids(match.group(2))
+            cql = cql[:match.start()] + cql[match.end():]
+        match = ID_LIST_RE.search(cql)
+        # Kept in request order, like Confluence does for id lists
+        ids = list(dict.fromkeys(re.findall(r"\d+", match.group(1)))) if match else None
+        match = ANCESTOR_LIST_RE.search(cql)
+        ancestors = _ids(match.group(1)) if match else None
+        terms = [(field, term.lower()) for field, term in TEXT_RE.findall(cql)]
+        match = MODIFIED_RE.search(cql)
+        # ISO dates compare as strings
+        modified_since = match.group(1) if match else None
+
+        candidates = [i for i in ids if i in self.pages] if ids is not None else list(self.pages)
+
+        results = []
+        for page_id in candidates:
+            page = self.pages[page_id]
+            if spaces is not None and page["space"] not in spaces:
+                continue
+            if scope is not None and page_id not in scope and not scope.intersection(page["ancestors"]):
+                continue
+            if ancestors is not None and not ancestors.intersection(page["ancestors"]):
+                continue
+            if modified_since is not None and page["when"] < modified_since:
+                continue
+            if any(
+                term not in page["title"].lower() and (field == "title" or term not in page["body"].lower())
+                for field, term in terms
+            ):
+                continue
+            results.append(page_id)
+        return results
+
+    # Handlers
+
+    async def _delay(self):
+        self.requests += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    @staticmethod
+    def _page_of(request: Request, results: List[Any], default_limit: int = 25):
+        start = int(request.query_params.get("start", 0))
+        limit = int(request.query_params.get("limit", default_limit))
+        page = results[start:start + limit]
+        links: Dict[str, Any] = {}
+        if start + limit < len(results):
+            params = dict(request.query_params)
+            params.update(start=start + limit, limit=limit)
+            links["next"] = f"{request.url.path}?{urlencode(params)}"
+        return page, {"start": start, "limit": limit, "size": len(page), "_links": links}
+
+    async def search(self, request: Request):
+        await self._delay()
+        expand = request.query_params.get("expand", "")
+        matched = self.query(request.query_params.get("cql", ""))
+        page, envelope = self._page_of(request, matched)
+        return JSONResponse({
+            "results": [self.search_result(p, expand) for p in page],
+            "totalSize": len(matched),
+            **envelope,
+        })
+
+    async def content_search(self, request: Request):
+        await self._delay()
+        expand = request.query_params.get("expand", "")
+        page, envelope = self._page_of(request, self.query(request.query_params.get("cql", "")))
+        return JSONResponse({"results": [self.content(p, expand) for p in page], **envelope})
+
+    async def get_content(self, request: Request):
+        await self._delay()
+        page_id = request.path_params["page_id"]
+        if page_id not in self.pages:
+            return JSONResponse({"statusCode": 404, "message": "No content found with id"}, status_code=404)
+        return JSONResponse(self.content(page_id, request.query_params.get("expand", "")))
+
+    async def get_children(self, request: Request):
+        await self._delay()
+        page_id = request.path_params["page_id"]
+        if page_id not in self.pages:
+            return JSONResponse({"statusCode": 404, "message": "No content found with id"}, status_code=404)
+        page, envelope = self._page_of(request, self.children.get(page_id, []))
+        return JSONResponse({"results": [self.content(p) for p in page], **envelope})
+
+    async def create_content(self, request: Request):
+        await self._delay()
+        payload = await request.json()
+        ancestors = payload.get("ancestors") or []
+        parent_id = str(ancestors[-1]["id"]) if ancestors else None
+        if parent_id is not None and parent_id not in self.pages:
+            return JSONResponse({"statusCode": 400, "message": "Parent page not found"}, status_code=400)
+        labels = payload.get("metadata", {}).get("labels", [])
+        page_id = self._new_id()
+        self._add(
+            page_id,
+            payload.get("title"),
+            payload.get("space", {}).get("key"),
+            parent_id,
+            payload.get("body", {}).get("storage", {}).get("value", ""),
+            datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            labels=labels,
+        )
+        return JSONResponse(self.content(page_id, "space,version"))
+
+    async def update_content(self, request: Request):
+        await self._delay()
+        page_id = request.path_params["page_id"]
+        if page_id not in self.pages:
+            return JSONResponse({"statusCode": 404, "message": "No content found with id"}, status_code=404)
+        payload = await request.json()
+        page = self.pages[page_id]
+        number = payload.get("version", {}).get("number")
+        if number != page["version"] + 1:
+            return JSONResponse(
+                {"statusCode": 409, "message": f"Version must be incremented on update. Current version is: {page['version']}"},
+                status_code=409
+            )
+        page["version"] = number
+        page["when"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        page["title"] = payload.get("title") or page["title"]
+        page["body"] = payload.get("body", {}).get("storage", {}).get("value", page["body"])
+        return JSONResponse(self.content(page_id, "space,version"))
+
+    async def limit_rate(self, request: Request, call_next):
+        window = int(time.time())
+        if window != self.window_start:
+            self.window_start, self.window_count = window, 0
+        self.window_count += 1
+        remaining = max(0, self.rate_limit - self.window_count)
+        reset = datetime.datetime.fromtimestamp(window + 1, datetime.timezone.utc).isoformat()
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": reset,
+        }
+        if remaining < self.rate_limit * 0.2:
+            headers["X-RateLimit-NearLimit"] = "true"
+        if self.window_count > self.rate_limit:
+            self.throttled += 1
+            headers["Retry-After"] = str(max(1, math.ceil(window + 1 - time.time())))
+            return JSONResponse({"statusCode": 429, "message": "Rate limit exceeded"}, status_code=429, headers=headers)
+        response = await call_next(request)
+        response.headers.update(headers)
+        return response
+
+    def app(self) -> Starlette:
+        middleware = [Middleware(BaseHTTPMiddleware, dispatch=self.limit_rate)] if self.rate_limit else []
+        return Starlette(middleware=middleware, routes=[
+            Route("/rest/api/search", self.search),
+            Route("/rest/api/content/search", self.content_search),
+            Route("/rest/api/content", self.create_content, methods=["POST"]),
+            Route("/rest/api/content/{page_id}", self.get_content),
+            Route("/rest/api/content/{page_id}", self.update_content, methods=["PUT"]),
+            Route("/rest/api/content/{page_id}/child/page", self.get_children),
+        ])
+
+
+def load_allowed_parents(path: str) -> Dict[str, List[str]]:
+    with open(path) as f:
+        config = json.load(f)
+    allowed_spaces = set(config.get("allowed_spaces", []))
+    return {k: v for k, v in config.get("allowed_parents", {}).items() if k in allowed_spaces}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--config", default=os.environ.get("CONFLUENCE_MCP_CONFIG") or os.path.join(ROOT, "config.json"))
+    parser.add_argument("--pages-per-root", type=int, default=100)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--body-kb", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per second before 429s (0 = unlimited)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    mock = MockConfluence(
+        load_allowed_parents(args.config),
+        pages_per_root=args.pages_per_root,
+        fanout=args.fanout,
+        body_kb=args.body_kb,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        seed=args.seed,
+        rate_limit=args.rate_limit,
+    )
+    print(f"Serving {len(mock.pages)} pages on http://{args.host}:{args.port}", flush=True)
+    uvicorn.run(mock.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,77 @@
-from .server import mcp
+import argparse
+import os
 
-def main():
-    mcp.run(transport='stdio')
+# The server module (fastmcp, config, HTTP client) is imported inside the
+# entry points, so importing the package, e.g. for the agent, stays cheap.
+
+TRANSPORTS = ("stdio", "http", "sse")
+
+
+def create_http_app():
+    """
+    ASGI app factory used when serving HTTP with several uvicorn workers.
+    Each worker is its own process, so sessions can't be pinned to one;
+    streamable HTTP therefore runs stateless.
+    """
+    from .server import mcp
+
+    return mcp.http_app(
+        path=os.environ.get("CONFLUENCE_MCP_PATH") or None,
+        transport="http",
+        stateless_http=True
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="confluence-mcp", description="Confluence MCP server")
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORTS,
+        default=os.environ.get("CONFLUENCE_MCP_TRANSPORT", "stdio"),
+        help="stdio (default, one client per process), http (streamable HTTP) or sse"
+    )
+    parser.add_argument("--host", default=os.environ.get("CONFLUENCE_MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("CONFLUENCE_MCP_PORT", "8765")))
+    parser.add_argument(
+        "--path",
+        default=os.environ.get("CONFLUENCE_MCP_PATH"),
+        help="Endpoint path (default /mcp for http, /sse for sse)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("CONFLUENCE_MCP_WORKERS", "1")),
+        help="uvicorn worker processes for http; caches and indexes are per worker"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from .server import mcp
+
+    if args.transport == "stdio":
+        # Spawned per agent session: skip the banner, nobody sees stderr
+        mcp.run(transport="stdio", show_banner=False)
+        return
+
+    if args.workers > 1:
+        if args.transport == "sse":
+            raise SystemExit("SSE sessions are stateful; use --transport http for multiple workers.")
+        import uvicorn
+
+        if args.path:
+            os.environ["CONFLUENCE_MCP_PATH"] = args.path
+        uvicorn.run(
+            f"{__name__}:create_http_app",
+            factory=True,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            lifespan="on"
+        )
+        return
+
+    # A single process serves every client, sharing the page cache,
+    # connection pool and indexes between them.
+    mcp.run(transport=args.transport, host=args.host, port=args.port, path=args.path)
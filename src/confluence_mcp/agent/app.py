@@ -8,16 +8,51 @@ load_dotenv()
 # Add the project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
 
+import asyncio
 import chainlit as cl
 import json
-from langchain_core.messages import HumanMessage, AIMessage
-from src.confluence_mcp.agent.client import MCPClient
-from src.confluence_mcp.agent.graph import create_graph
+from chainlit.server import app as chainlit_server
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from langchain_core.messages import HumanMessage
+from src.confluence_mcp.agent.graph import get_graph
+from src.confluence_mcp.agent.pool import MCPClientPool
+from src.confluence_mcp.agent.checkpoint import open_checkpointer, prune_thread
+from src.confluence_mcp.metrics import metrics, span
 
-# Global MCP Client removed to prevent shared state issues
-# mcp_client = MCPClient()
+# Process-wide pool of warm MCP server connections.
+# Chat sessions lease a connection instead of spawning their own server
+# subprocess; the pool is bounded and reconnects crashed servers.
+mcp_pool = MCPClientPool(
+    size=int(os.environ.get("MCP_POOL_SIZE", "4")),
+    health_check_interval=float(os.environ.get("MCP_POOL_HEALTH_INTERVAL", "30")),
+)
 
-# ...
+# LLM call latency/tokens and tool call latency as seen by the agent, for
+# Prometheus. Inserted ahead of Chainlit's catch-all frontend route.
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+chainlit_server.router.routes.insert(0, Route("/metrics", metrics_endpoint))
+
+# Graph state (every message, including tool results) is checkpointed to
+# SQLite per chat thread, so it survives across turns and restarts.
+CHECKPOINT_DB = os.environ.get("AGENT_CHECKPOINT_DB", "agent_state.sqlite")
+_checkpointer = None
+_checkpointer_lock = asyncio.Lock()
+
+async def get_checkpointer():
+    global _checkpointer
+    async with _checkpointer_lock:
+        if _checkpointer is None:
+            _checkpointer = await open_checkpointer(CHECKPOINT_DB)
+    return _checkpointer
+
+def get_thread_id() -> str:
+    # Chainlit keeps the thread id when a conversation is resumed;
+    # the session id is new on every connection.
+    session = cl.context.session
+    return session.thread_id or session.id
 
 @cl.set_starters
 async def set_starters():
@@ -41,10 +76,9 @@ async def set_starters():
 
 @cl.on_chat_start
 async def on_chat_start():
-    # 1. Connect to MCP Server (Session Scoped)
-    mcp_client = MCPClient()
+    # 1. Lease a pooled MCP Server connection
     try:
-        await mcp_client.connect()
+        mcp_client = await mcp_pool.lease()
         cl.user_session.set("mcp_client", mcp_client)
     except Exception as e:
         await cl.Message(content=f"Failed to connect to MCP Server: {e}").send()
@@ -54,8 +88,8 @@ async def on_chat_start():
     provider = os.environ.get("LLM_PROVIDER", "openai")
     model = os.environ.get("LLM_MODEL", "gpt-4o")
     
-    # 3. Initialize Graph
-    graph = create_graph(mcp_client, provider, model)
+    # 3. Get the shared graph (built once per provider/model/tool set)
+    graph = get_graph(mcp_client, provider, model, checkpointer=await get_checkpointer())
     cl.user_session.set("graph", graph)
     
     # Store provider/model info for later use (don't send message to avoid hiding starters)
@@ -72,26 +106,24 @@ async def on_message(message: cl.Message):
         
         mcp_client = cl.user_session.get("mcp_client")
         if not mcp_client:
-             mcp_client = MCPClient()
              try:
-                await mcp_client.connect()
+                mcp_client = await mcp_pool.lease()
                 cl.user_session.set("mcp_client", mcp_client)
              except Exception as e:
                 await cl.Message(content=f"Error initializing agent: {e}").send()
                 return
 
         try:
-            graph = create_graph(mcp_client, provider, model)
+            graph = get_graph(mcp_client, provider, model, checkpointer=await get_checkpointer())
             cl.user_session.set("graph", graph)
         except Exception as e:
             await cl.Message(content=f"Error initializing agent: {e}").send()
             return
 
-    # Maintain conversation history in session
-    history = cl.user_session.get("history", [])
-    history.append(HumanMessage(content=message.content))
-    
-    inputs = {"messages": history}
+    # Earlier turns come from the checkpointer; only send the new message
+    thread_id = get_thread_id()
+    config = {"configurable": {"thread_id": thread_id, "mcp_client": cl.user_session.get("mcp_client")}}
+    inputs = {"messages": [HumanMessage(content=message.content)]}
     
     msg = cl.Message(content="")
     await msg.send()
@@ -100,92 +132,94 @@ async def on_message(message: cl.Message):
     current_step = None
     
     try:
-        async for event in graph.astream_events(inputs, version="v1"):
-            kind = event["event"]
+        # One trace per turn: LLM calls, tool calls and their Confluence
+        # requests nest under it when CONFLUENCE_OTEL=1
+        with span("agent turn", {"thread.id": thread_id}):
+            # durability="exit": one checkpoint write per turn, not per step
+            async for event in graph.astream_events(inputs, config=config, version="v1", durability="exit"):
+                kind = event["event"]
             
-            if kind == "on_chat_model_stream":
-                content = event["data"]["chunk"].content
-                if content:
-                    # Ensure content is a string (it might be a list for multimodal models)
-                    if isinstance(content, list):
-                        # Extract text from list of blocks if possible
-                        text_parts = []
-                        for block in content:
-                            if isinstance(block, str):
-                                text_parts.append(block)
-                            elif isinstance(block, dict) and "text" in block:
-                                text_parts.append(block["text"])
-                        content = "".join(text_parts)
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        # Ensure content is a string (it might be a list for multimodal models)
+                        if isinstance(content, list):
+                            # Extract text from list of blocks if possible
+                            text_parts = []
+                            for block in content:
+                                if isinstance(block, str):
+                                    text_parts.append(block)
+                                elif isinstance(block, dict) and "text" in block:
+                                    text_parts.append(block["text"])
+                            content = "".join(text_parts)
                     
-                    if isinstance(content, str):
-                        await msg.stream_token(content)
+                        if isinstance(content, str):
+                            await msg.stream_token(content)
                     
-            elif kind == "on_tool_start":
-                # Create a new step for the tool
-                tool_name = event["name"]
-                tool_input = event["data"].get("input")
+                elif kind == "on_tool_start":
+                    # Create a new step for the tool
+                    tool_name = event["name"]
+                    tool_input = event["data"].get("input")
                 
-                # Format input as JSON for better readability
-                if isinstance(tool_input, (dict, list)):
-                    import json
-                    tool_input = json.dumps(tool_input, indent=2)
+                    # Format input as JSON for better readability
+                    if isinstance(tool_input, (dict, list)):
+                        import json
+                        tool_input = json.dumps(tool_input, indent=2)
                 
-                current_step = cl.Step(
-                    name=tool_name,
-                    type="tool",
-                    parent_id=msg.id, # Nest step under the main message
-                )
-                current_step.input = tool_input
-                current_step.language = "json"
-                await current_step.send()
+                    current_step = cl.Step(
+                        name=tool_name,
+                        type="tool",
+                        parent_id=msg.id, # Nest step under the main message
+                    )
+                    current_step.input = tool_input
+                    current_step.language = "json"
+                    await current_step.send()
                 
-            elif kind == "on_tool_end":
-                if current_step:
-                    tool_output = event["data"].get("output")
-                    # If output is a ToolMessage, extract content
-                    if hasattr(tool_output, "content"):
-                        content = tool_output.content
-                        if isinstance(content, list):
-                             # Handle list content (e.g. from MCP tools returning multiple blocks)
-                             text_parts = []
-                             for block in content:
-                                 if isinstance(block, str):
-                                     text_parts.append(block)
-                                 elif isinstance(block, dict) and "text" in block:
-                                     text_parts.append(block["text"])
-                             current_step.output = "\n".join(text_parts)
-                        elif isinstance(content, (dict, list)):
-                             import json
-                             current_step.output = json.dumps(content, indent=2)
-                             current_step.language = "json"
+                elif kind == "on_tool_end":
+                    if current_step:
+                        tool_output = event["data"].get("output")
+                        # If output is a ToolMessage, extract content
+                        if hasattr(tool_output, "content"):
+                            content = tool_output.content
+                            if isinstance(content, list):
+                                 # Handle list content (e.g. from MCP tools returning multiple blocks)
+                                 text_parts = []
+                                 for block in content:
+                                     if isinstance(block, str):
+                                         text_parts.append(block)
+                                     elif isinstance(block, dict) and "text" in block:
+                                         text_parts.append(block["text"])
+                                 current_step.output = "\n".join(text_parts)
+                            elif isinstance(content, (dict, list)):
+                                 import json
+                                 current_step.output = json.dumps(content, indent=2)
+                                 current_step.language = "json"
+                            else:
+                                current_step.output = str(content)
                         else:
-                            current_step.output = str(content)
-                    else:
-                        current_step.output = str(tool_output)
+                            current_step.output = str(tool_output)
                     
-                    await current_step.update()
-                    current_step = None
+                        await current_step.update()
+                        current_step = None
 
     except Exception as e:
         await cl.Message(content=f"Error during execution: {str(e)}").send()
         return
 
-    # Update history with the result
-    # We need to fetch the final state to get the full history including tool messages
-    # But astream_events doesn't return the final state directly.
-    # For simplicity in this stateless-ish UI, we just append the final AIMessage
-    # A better way is to use a persistent Checkpointer in LangGraph, but that's advanced.
-    # We'll just rely on the graph returning the full list if we used ainvoke, 
-    # but since we streamed, we need to reconstruct or just re-fetch.
-    
-    # For now, let's just append the final response to our local history
-    history.append(AIMessage(content=msg.content))
-    cl.user_session.set("history", history)
+    # The turn's full state is checkpointed; older checkpoints aren't needed
+    await prune_thread(await get_checkpointer(), thread_id)
     
     await msg.update()
 
+@cl.on_chat_resume
+async def on_chat_resume(thread):
+    # The conversation, tool results included, is restored from the
+    # checkpointer by thread id; only a connection and a graph are needed.
+    await on_chat_start()
+
 @cl.on_chat_end
 async def on_chat_end():
     mcp_client = cl.user_session.get("mcp_client")
     if mcp_client:
+        # Returns the lease to the pool; the connection itself stays warm
         await mcp_client.close()
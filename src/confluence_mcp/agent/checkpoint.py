@@ -0,0 +1,36 @@
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+
+async def open_checkpointer(path: str) -> AsyncSqliteSaver:
+    """
+    Open (creating if needed) the SQLite database holding agent graph state.
+    """
+    conn = await aiosqlite.connect(path)
+    # WAL lets a session write its checkpoint while others read theirs
+    await conn.execute("PRAGMA journal_mode=WAL")
+    checkpointer = AsyncSqliteSaver(conn)
+    await checkpointer.setup()
+    return checkpointer
+
+
+async def prune_thread(checkpointer: AsyncSqliteSaver, thread_id: str):
+    """
+    Delete all but the latest checkpoint of a thread.
+
+    Every checkpoint stores the full message list, so keeping the history
+    of checkpoints would grow quadratically with conversation length; only
+    the latest is needed to resume. Checkpoint ids sort by creation time.
+    """
+    async with checkpointer.lock:
+        for table in ("checkpoints", "writes"):
+            await checkpointer.conn.execute(
+                f"""
+                DELETE FROM {table}
+                WHERE thread_id = ? AND checkpoint_id NOT IN (
+                    SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns
+                )
+                """,
+                (thread_id, thread_id)
+            )
+        await checkpointer.conn.commit()
@@ -1,32 +1,63 @@
 import os
 import sys
 import asyncio
-from typing import List, Any, Dict
+import logging
+from typing import List, Any, Dict, Optional
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from langchain_core.tools import StructuredTool
+from src.confluence_mcp.agent.compact import compact_output
+from src.confluence_mcp.metrics import trace_headers
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a token, for reporting savings
+CHARS_PER_TOKEN = 4
+
+# Tools that modify Confluence. The graph never runs these concurrently,
+# and the connection pool never replays them after a reconnect.
+MUTATING_TOOLS = {"create_confluence_page", "update_confluence_page_full", "patch_confluence_page"}
 
 class MCPClient:
-    def __init__(self):
+    def __init__(self, url: Optional[str] = None, compact: Optional[bool] = None):
         self.session: Optional[ClientSession] = None
         self.exit_stack = None
         self._tools_cache = []
         self.transport_ctx = None
+        # Set (or CONFLUENCE_MCP_URL) to use a shared network server
+        # instead of spawning a stdio subprocess.
+        self.url = url or os.environ.get("CONFLUENCE_MCP_URL")
+        # Re-encode tool results compactly for the LLM (AGENT_TOOL_OUTPUT=raw to disable)
+        if compact is None:
+            compact = os.environ.get("AGENT_TOOL_OUTPUT", "compact") != "raw"
+        self.compact = compact
+        self.output_stats = {"calls": 0, "bytesIn": 0, "bytesOut": 0}
 
     async def connect(self):
         """
-        Connects to the local Confluence MCP server subprocess.
+        Connects to the Confluence MCP server.
+        Uses the HTTP/SSE server at self.url if set, otherwise spawns a local stdio subprocess.
         """
-        # We run the server by executing the package module
-        server_params = StdioServerParameters(
-            command=sys.executable,
-            args=["-m", "src.confluence_mcp"],
-            env=os.environ.copy()
-        )
+        if self.url:
+            if self.url.rstrip("/").endswith("/sse"):
+                from mcp.client.sse import sse_client
+                self.transport_ctx = sse_client(self.url)
+            else:
+                from mcp.client.streamable_http import streamablehttp_client
+                self.transport_ctx = streamablehttp_client(self.url)
+        else:
+            # We run the server by executing the package module
+            server_params = StdioServerParameters(
+                command=sys.executable,
+                args=["-m", "src.confluence_mcp", "--transport", "stdio"],
+                env=os.environ.copy()
+            )
+            self.transport_ctx = stdio_client(server_params)
         
-        self.transport_ctx = stdio_client(server_params)
         # Properly enter the context manager
-        self.read_stream, self.write_stream = await self.transport_ctx.__aenter__()
+        # (streamable HTTP also yields a session-id getter we don't need)
+        streams = await self.transport_ctx.__aenter__()
+        self.read_stream, self.write_stream = streams[0], streams[1]
         
         self.session = ClientSession(self.read_stream, self.write_stream)
         await self.session.__aenter__()
@@ -48,6 +79,18 @@ class MCPClient:
             except (Exception, RuntimeError, GeneratorExit):
                 pass
 
+    async def ping(self) -> bool:
+        """
+        Returns True if the server answers an MCP ping.
+        """
+        if not self.session:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=10)
+            return True
+        except Exception:
+            return False
+
     def get_tools(self):
         """
         Returns the list of tools available on the server.
@@ -59,7 +102,8 @@ class MCPClient:
              raise RuntimeError("MCP Client not connected")
         
         try:
-            result = await self.session.call_tool(name, arguments=arguments)
+            # Trace context rides in _meta so server spans join the agent's trace
+            result = await self.session.call_tool(name, arguments=arguments, meta=trace_headers() or None)
         except Exception as e:
             return f"Error executing tool {name}: {str(e)}"
         
@@ -73,4 +117,22 @@ class MCPClient:
         final_text = "\n".join(text_output)
         if result.isError:
              return f"Error: {final_text}"
+        if self.compact:
+            final_text = self._compact(name, final_text)
         return final_text
+
+    def _compact(self, name: str, text: str) -> str:
+        compacted = compact_output(name, text)
+        bytes_in, bytes_out = len(text.encode("utf-8")), len(compacted.encode("utf-8"))
+        self.output_stats["calls"] += 1
+        self.output_stats["bytesIn"] += bytes_in
+        self.output_stats["bytesOut"] += bytes_out
+        logger.info(
+            "%s output: %d -> %d bytes (~%d tokens saved)",
+            name, bytes_in, bytes_out, (bytes_in - bytes_out) // CHARS_PER_TOKEN
+        )
+        return compacted
+
+    def stats(self) -> Dict[str, Any]:
+        saved = self.output_stats["bytesIn"] - self.output_stats["bytesOut"]
+        return {**self.output_stats, "bytesSaved": saved, "tokensSaved": saved // CHARS_PER_TOKEN}
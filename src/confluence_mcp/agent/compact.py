@@ -0,0 +1,217 @@
+import json
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+
+# Output budget (UTF-8 bytes) per tool once encoded for the LLM.
+# prepare_confluence_page_merge_update is never truncated: its storage body
+# is what the model merges into, and a cut body would be written back.
+TOOL_OUTPUT_BUDGETS: Dict[str, Optional[int]] = {
+    "prepare_confluence_page_merge_update": None,
+    "get_confluence_page": 48000,
+    "get_confluence_pages": 64000,
+    "get_confluence_tree": 32000,
+}
+DEFAULT_OUTPUT_BUDGET = int(os.environ.get("AGENT_TOOL_OUTPUT_MAX_BYTES", "24000"))
+
+# Strings shorter than this are never shortened when enforcing a budget
+MIN_TRUNCATED_CHARS = 200
+
+# Fields the model copies verbatim into a write; never replaced by a
+# "(same as ...)" pointer
+VERBATIM_KEYS = {"storageContent"}
+
+URL_BASE_RE = re.compile(r"^(https?://[^/]+(?:/wiki)?)(/.*)$")
+
+
+def _size(data: Any) -> int:
+    return len(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _drop_empty(data: Any) -> Any:
+    if isinstance(data, dict):
+        result = {}
+        for key, value in data.items():
+            value = _drop_empty(value)
+            if value is None or value == "" or value == [] or value == {}:
+                continue
+            result[key] = value
+        return result
+    if isinstance(data, list):
+        return [_drop_empty(item) for item in data]
+    return data
+
+
+def _dedupe(data: Any) -> Any:
+    """
+    Replace a long string that repeats an earlier field of the same object
+    with a pointer to that field, and hoist fields that are identical in
+    every item of a list of objects into a sibling "<key>Common".
+    """
+    if isinstance(data, list):
+        return [_dedupe(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    result: Dict[str, Any] = {}
+    seen: Dict[str, str] = {}
+    for key, value in data.items():
+        value = _dedupe(value)
+        if isinstance(value, str) and len(value) > 40:
+            if value in seen and key not in VERBATIM_KEYS:
+                value = f"(same as {seen[value]})"
+            else:
+                seen[value] = key
+        if (
+            isinstance(value, list) and len(value) > 1
+            and all(isinstance(item, dict) for item in value)
+        ):
+            common = {
+                k: v for k, v in value[0].items()
+                if not isinstance(v, (dict, list)) and all(item.get(k, object()) == v for item in value[1:])
+            }
+            # Keep ids and titles on each item; they identify it
+            common.pop("id", None)
+            common.pop("title", None)
+            if common:
+                value = [{k: v for k, v in item.items() if k not in common} for item in value]
+                result[f"{key}Common"] = common
+        result[key] = value
+    return result
+
+
+def _relative_urls(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Strip the shared Confluence base from every URL field and state it once
+    as "baseUrl".
+    """
+    bases = set()
+
+    def collect(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key.lower().endswith("url") and isinstance(value, str):
+                    match = URL_BASE_RE.match(value)
+                    if match:
+                        bases.add(match.group(1))
+                collect(value)
+        elif isinstance(node, list):
+            for item in node:
+                collect(item)
+
+    collect(data)
+    if len(bases) != 1:
+        return data
+    base = bases.pop()
+
+    def strip(node):
+        if isinstance(node, dict):
+            return {
+                key: value[len(base):]
+                if key.lower().endswith("url") and isinstance(value, str) and value.startswith(base + "/")
+                else strip(value)
+                for key, value in node.items()
+            }
+        if isinstance(node, list):
+            return [strip(item) for item in node]
+        return node
+
+    return {"baseUrl": base, **strip(data)}
+
+
+def _longest_string(node: Any, path=()) -> Tuple[int, tuple]:
+    best = (0, ())
+    if isinstance(node, str):
+        return (len(node), path)
+    items = node.items() if isinstance(node, dict) else enumerate(node) if isinstance(node, list) else ()
+    for key, value in items:
+        candidate = _longest_string(value, path + (key,))
+        if candidate[0] > best[0]:
+            best = candidate
+    return best
+
+
+def _longest_list(node: Any, path=()) -> Tuple[int, tuple]:
+    best = (len(node), path) if isinstance(node, list) else (0, ())
+    items = node.items() if isinstance(node, dict) else enumerate(node) if isinstance(node, list) else ()
+    for key, value in items:
+        candidate = _longest_list(value, path + (key,))
+        if candidate[0] > best[0]:
+            best = candidate
+    return best
+
+
+def _get(node: Any, path: tuple) -> Any:
+    for key in path:
+        node = node[key]
+    return node
+
+
+def _set(node: Any, path: tuple, value: Any):
+    for key in path[:-1]:
+        node = node[key]
+    node[path[-1]] = value
+
+
+def _fit(data: Any, budget: int) -> Any:
+    """
+    Shrink JSON data under `budget` bytes: cut the longest string, then the
+    tail of the longest list, each time leaving a marker saying how much
+    was cut.
+    """
+    originals: Dict[tuple, Any] = {}
+    while _size(data) > budget:
+        length, path = _longest_string(data)
+        if path:
+            value = originals.get(path, _get(data, path))
+            # Cut just enough, but never more than half per pass
+            keep = max(MIN_TRUNCATED_CHARS, length - (_size(data) - budget) - 100, length // 2)
+            cut = value[:keep] + f" [...truncated {len(value) - keep} chars; use max_chars/offset to read more]"
+            # Short strings would only grow by the marker; trim lists instead
+            if len(cut) < length:
+                originals.setdefault(path, value)
+                _set(data, path, cut)
+                continue
+        count, path = _longest_list(data)
+        if count > 1 and path:
+            items = originals.setdefault(path, _get(data, path))
+            # Estimate how many items to cut from their average size
+            per_item = _size(_get(data, path)) / count
+            keep = max(1, count - 1 - int((_size(data) - budget) / per_item))
+            _set(data, path, items[:keep] + [f"[...truncated {len(items) - keep} more items]"])
+            continue
+        break
+    return data
+
+
+def compact_output(tool_name: str, text: str) -> str:
+    """
+    Re-encode a tool result for the LLM context.
+
+    JSON results lose empty fields and repeated values, URLs become
+    relative to a single baseUrl (a top-level list is returned as
+    {"baseUrl": ..., "results": [...]}), and the result is kept within the tool's
+    byte budget with explicit truncation markers. Other text is only cut to
+    the budget.
+    """
+    budget = TOOL_OUTPUT_BUDGETS.get(tool_name, DEFAULT_OUTPUT_BUDGET)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+
+    if not isinstance(data, (dict, list)):
+        encoded = text.encode("utf-8")
+        if budget is None or len(encoded) <= budget:
+            return text
+        cut = encoded[:budget].decode("utf-8", errors="ignore")
+        return f"{cut} [...truncated {len(encoded) - budget} bytes]"
+
+    # List results (search, children, batch reads) get the same common-field
+    # hoisting and URL stripping as lists inside objects
+    if isinstance(data, list):
+        data = {"results": data}
+    data = _relative_urls(_dedupe(_drop_empty(data)))
+    if budget is not None:
+        data = _fit(data, budget)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
@@ -1,130 +1,268 @@
-from typing import Annotated, Literal, TypedDict
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from collections import OrderedDict
+from typing import Annotated, Any, Literal, TypedDict
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langchain_core.runnables import RunnableConfig
 # Assuming sys.path is fixed by app.py or environment
-from src.confluence_mcp.agent.client import MCPClient
+from src.confluence_mcp.agent.client import MCPClient, MUTATING_TOOLS
 from src.confluence_mcp.agent.llm import get_llm
+from src.confluence_mcp.agent.history import HistoryManager
+from src.confluence_mcp.metrics import metrics, span
+import asyncio
+import hashlib
 import json
+import os
+import time
+
+
+# Sent with every LLM call, so kept free of indentation whitespace
+SYSTEM_PROMPT = """You are a helpful Confluence Assistant.
+You have access to MCP tools that work with Confluence:
+- search_confluence(query, maxResults, backend, include)
+- search_confluence_paged(query, cursor, limit, include)
+- get_confluence_page(pageId, format, maxChars, offset)
+- get_confluence_pages(pageIds, format, maxChars)
+- create_confluence_page(spaceKey, parentId, title, body)
+- prepare_confluence_page_merge_update(pageId)
+- update_confluence_page_full(pageId, body, updateToken)
+- patch_confluence_page(pageId, operations)
+- get_confluence_children(pageId)
+- get_confluence_tree(pageId, maxDepth, maxPages)
+
+General rules:
+- Treat Confluence as the single source of truth for pages.
+- When creating or updating pages, always work in Confluence storage format (XHTML-style HTML with <p>, <ul>, tables, and <ac:structured-macro> etc.).
+- Never assume you know the latest page content: if you are going to change an existing page, you must read it first using the appropriate tool.
+- Only pages labelled ai-generated or ai-managed are safe for full-page updates.
+
+Reading and searching:
+- When the user asks about existing documentation, decisions, specs, or runbooks:
+    1. First call search_confluence(query) with a concise search phrase.
+    2. Then call get_confluence_page(pageId) on the most relevant result(s) to summarise or quote from them.
+       If you need several pages, fetch them together with get_confluence_pages(pageIds) instead of one call per page.
+       Use format="text" when you only need to read, format="summary" to triage several candidates, and max_chars/offset to page through very large pages.
+- If you need a result's version, labels or ancestors, ask for them with include=[...] on the search instead of fetching each page.
+- For broad queries with many matches, use search_confluence_paged and pass back nextCursor only if you need more results.
+- When the user asks for "children" or "pages under X", ALWAYS use the `get_confluence_children` tool first. Do NOT rely on CQL search for hierarchy unless specifically asked.
+- When the user needs the structure of a whole section (several levels deep), call get_confluence_tree once instead of walking it with repeated get_confluence_children calls.
+- Always clearly show the page title and URL when referencing a page.
+
+Creating new pages:
+- When the user asks you to create a new page:
+    1. Clarify (or infer) the spaceKey, parentId, and title from context or from the user’s instructions.
+    2. Draft the page body directly in storage format HTML.
+    3. Call create_confluence_page(spaceKey, parentId, title, body) with the full storage-format body.
+    4. Assume the server will automatically add an ai-generated label.
+
+Safe update flow (smart merge):
+- When the user wants to change an existing AI-generated page (improve it, add new sections, update details):
+    1. Call prepare_confluence_page_merge_update(pageId) first.
+    2. Use the returned textContent and storageContent as the current ground truth.
+    3. Read the user’s requested changes and decide how to merge them:
+        - Preserve any important existing information unless the user explicitly wants it removed.
+        - Update numbers, facts, and examples where requested.
+        - Add new sections where appropriate.
+    4. If the change is local (one or a few sections, a table row, a sentence), call
+       patch_confluence_page(pageId, operations) with only the edits, e.g.
+       [{"op": "replace_section", "heading": "Setup", "content": "<p>...</p>"},
+        {"op": "append_table_row", "heading": "Hosts", "content": "<tr><td>...</td></tr>"}].
+       Do not regenerate the whole page for a small change.
+    5. Otherwise generate a new complete page body in storage-format HTML that:
+        - Includes the merged content (old + new),
+        - Is self-contained,
+        - Is well structured (headings, lists, tables, macros as needed),
+       and call update_confluence_page_full(pageId, body, updateToken) with this final merged body,
+       passing the updateToken from step 1.
+    6. If the update reports that the page changed since it was read, go back to step 1 and merge again.
+
+Overwriting without merge (use sparingly):
+- Only overwrite an entire page without considering old content if the user explicitly asks for a complete replacement and confirms that old content can be discarded.
+- In that case, you may skip the merge logic and:
+    1. Optionally inspect the current page with prepare_confluence_page_merge_update(pageId) for context,
+    2. Then construct a fresh storage-format body,
+    3. And call update_confluence_page_full(pageId, body) to replace it entirely.
+
+Safety and correctness:
+- Never update a page that is not confirmed to be AI-managed (ai-generated / ai-managed); if the tools return an access error, explain that you cannot update that page.
+- Do not attempt to modify content you haven’t fetched in the current conversation.
+- When in doubt, propose changes in natural language or as a draft body, and let the user confirm before calling update tools.
+"""
+
+SUMMARY_PROMPT = (
+    "Summarise this earlier part of a conversation between a user and a Confluence assistant "
+    "in a few bullet points. Keep page ids, titles, decisions and open requests."
+)
 
 class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
 
-def create_graph(mcp_client: MCPClient, provider: str = "openai", model: str = None):
-    
-    # 1. Convert MCP tools to format expected by LLM
-    # We use the raw JSON schema from MCP
-    mcp_tools = mcp_client.get_tools()
-    
-    formatted_tools = []
-    for t in mcp_tools:
-        formatted_tools.append({
+def format_tools(mcp_tools) -> list:
+    """
+    MCP tool definitions as LLM function-calling schemas (raw MCP JSON schema).
+    """
+    return [
+        {
             "type": "function",
             "function": {
                 "name": t.name,
                 "description": t.description,
                 "parameters": t.inputSchema
             }
-        })
+        }
+        for t in mcp_tools
+    ]
+
+def tools_hash(formatted_tools: list) -> str:
+    return hashlib.sha256(json.dumps(formatted_tools, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Compiled graphs shared by all sessions, keyed by
+# (provider, model, tool-schema hash, checkpointer). Bounded, least recently
+# used first out, since each model or tool-set change adds one.
+_graphs: "OrderedDict[tuple, Any]" = OrderedDict()
+GRAPH_CACHE_SIZE = 8
+
+def get_graph(
+    mcp_client: MCPClient,
+    provider: str = "openai",
+    model: str = None,
+    checkpointer: BaseCheckpointSaver = None
+):
+    """
+    Return the process-wide compiled graph for this provider, model and tool
+    set, building it on first use. Pass the session's client as
+    config["configurable"]["mcp_client"] when invoking it.
+    """
+    key = (provider.lower(), model, tools_hash(format_tools(mcp_client.get_tools())), id(checkpointer))
+    if key in _graphs:
+        _graphs.move_to_end(key)
+    else:
+        _graphs[key] = create_graph(mcp_client, provider, model, checkpointer=checkpointer)
+        while len(_graphs) > GRAPH_CACHE_SIZE:
+            _graphs.popitem(last=False)
+    return _graphs[key]
+
+def create_graph(
+    mcp_client: MCPClient,
+    provider: str = "openai",
+    model: str = None,
+    max_concurrency: int = None,
+    history: HistoryManager = None,
+    checkpointer: BaseCheckpointSaver = None
+):
+    
+    """
+    Build and compile the agent graph.
+
+    `mcp_client` provides the tool schemas. Tools run on the client passed
+    as config["configurable"]["mcp_client"] for each invocation, falling
+    back to `mcp_client`, so one compiled graph can serve many sessions
+    (see get_graph).
+    """
+    
+    # Cap on tool calls from one AI message that run at the same time
+    if max_concurrency is None:
+        max_concurrency = int(os.environ.get("AGENT_TOOL_CONCURRENCY", "4"))
+    max_concurrency = max(1, max_concurrency)
+    
+    # 1. Convert MCP tools to format expected by LLM
+    formatted_tools = format_tools(mcp_client.get_tools())
 
     # 2. Initialize LLM and bind tools
     llm = get_llm(provider, model)
     llm_with_tools = llm.bind_tools(formatted_tools)
 
+    # Token budget for what is sent on each call; older turns are summarised
+    # (by the LLM if AGENT_HISTORY_SUMMARIZE=1) and big tool outputs collapsed.
+    if history is None:
+        async def summarize(dropped):
+            return (await llm.ainvoke([
+                SystemMessage(content=SUMMARY_PROMPT),
+                HumanMessage(content=HistoryManager.digest(dropped, line_chars=2000))
+            ])).content
+
+        history = HistoryManager(
+            max_tokens=int(os.environ.get("AGENT_HISTORY_MAX_TOKENS", "24000")),
+            keep_turns=int(os.environ.get("AGENT_HISTORY_KEEP_TURNS", "2")),
+            tool_output_chars=int(os.environ.get("AGENT_TOOL_OUTPUT_MAX_CHARS", "4000")),
+            summarize=summarize if os.environ.get("AGENT_HISTORY_SUMMARIZE") == "1" else None,
+        )
+
     # 3. Define Nodes
     
-    async def agent_node(state: AgentState):
+    async def agent_node(state: AgentState, config: RunnableConfig):
         messages = state["messages"]
+        session = config.get("configurable", {}).get("thread_id")
         
-        # System Instruction
-        system_instruction = """You are a helpful Confluence Assistant.
-        You have access to MCP tools that work with Confluence:
-        - search_confluence(query)
-        - get_confluence_page(pageId)
-        - create_confluence_page(spaceKey, parentId, title, body)
-        - prepare_confluence_page_merge_update(pageId)
-        - update_confluence_page_full(pageId, body)
-        - get_confluence_children(pageId)
-
-        General rules:
-        - Treat Confluence as the single source of truth for pages.
-        - When creating or updating pages, always work in Confluence storage format (XHTML-style HTML with <p>, <ul>, tables, and <ac:structured-macro> etc.).
-        - Never assume you know the latest page content: if you are going to change an existing page, you must read it first using the appropriate tool.
-        - Only pages labelled ai-generated or ai-managed are safe for full-page updates.
-
-        Reading and searching:
-        - When the user asks about existing documentation, decisions, specs, or runbooks:
-            1. First call search_confluence(query) with a concise search phrase.
-            2. Then call get_confluence_page(pageId) on the most relevant result(s) to summarise or quote from them.
-        - When the user asks for "children" or "pages under X", ALWAYS use the `get_confluence_children` tool first. Do NOT rely on CQL search for hierarchy unless specifically asked.
-        - Always clearly show the page title and URL when referencing a page.
-
-        Creating new pages:
-        - When the user asks you to create a new page:
-            1. Clarify (or infer) the spaceKey, parentId, and title from context or from the user’s instructions.
-            2. Draft the page body directly in storage format HTML.
-            3. Call create_confluence_page(spaceKey, parentId, title, body) with the full storage-format body.
-            4. Assume the server will automatically add an ai-generated label.
-
-        Safe update flow (smart merge):
-        - When the user wants to change an existing AI-generated page (improve it, add new sections, update details):
-            1. Call prepare_confluence_page_merge_update(pageId) first.
-            2. Use the returned textContent and storageContent as the current ground truth.
-            3. Read the user’s requested changes and decide how to merge them:
-                - Preserve any important existing information unless the user explicitly wants it removed.
-                - Update numbers, facts, and examples where requested.
-                - Add new sections where appropriate.
-            4. Generate a new complete page body in storage-format HTML that:
-                - Includes the merged content (old + new),
-                - Is self-contained,
-                - Is well structured (headings, lists, tables, macros as needed).
-            5. Call update_confluence_page_full(pageId, body) with this final merged body.
-
-        Overwriting without merge (use sparingly):
-        - Only overwrite an entire page without considering old content if the user explicitly asks for a complete replacement and confirms that old content can be discarded.
-        - In that case, you may skip the merge logic and:
-            1. Optionally inspect the current page with prepare_confluence_page_merge_update(pageId) for context,
-            2. Then construct a fresh storage-format body,
-            3. And call update_confluence_page_full(pageId, body) to replace it entirely.
-
-        Safety and correctness:
-        - Never update a page that is not confirmed to be AI-managed (ai-generated / ai-managed); if the tools return an access error, explain that you cannot update that page.
-        - Do not attempt to modify content you haven’t fetched in the current conversation.
-        - When in doubt, propose changes in natural language or as a draft body, and let the user confirm before calling update tools.
-        """
+        # Prepend the system prompt and fit the conversation into the token budget
+        messages, report = await history.prepare(SYSTEM_PROMPT, messages)
         
-        # Prepend SystemMessage
-        from langchain_core.messages import SystemMessage
-        if not isinstance(messages[0], SystemMessage):
-             messages = [SystemMessage(content=system_instruction)] + messages
-        
-        response = await llm_with_tools.ainvoke(messages)
+        # Timed like server tool calls (same registry), per provider and model
+        labels = {"provider": provider, "model": model or "default"}
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            with span("llm call", {"llm.messages": len(messages)}) as current:
+                response = await llm_with_tools.ainvoke(messages)
+                usage = getattr(response, "usage_metadata", None) or {}
+                if current is not None:
+                    current.set_attribute("llm.input_tokens", usage.get("input_tokens") or 0)
+                    current.set_attribute("llm.output_tokens", usage.get("output_tokens") or 0)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            metrics.observe("agent_llm_seconds", time.perf_counter() - start, **labels)
+            metrics.inc("agent_llm_calls_total", status=status, **labels)
+        for kind in ("input", "output"):
+            if usage.get(f"{kind}_tokens"):
+                metrics.inc("agent_llm_tokens_total", usage[f"{kind}_tokens"], kind=kind, **labels)
+        history.record_usage(response, report, session)
         return {"messages": [response]}
 
-    async def tool_node(state: AgentState):
+    async def tool_node(state: AgentState, config: RunnableConfig):
         messages = state["messages"]
         last_message = messages[-1]
         
         if not isinstance(last_message, AIMessage) or not last_message.tool_calls:
             return {"messages": []}
 
-        results = []
-        for tool_call in last_message.tool_calls:
+        client = config.get("configurable", {}).get("mcp_client") or mcp_client
+        tool_semaphore = asyncio.Semaphore(max_concurrency)
+        # Per invocation: writes from one message run one at a time, while
+        # other sessions sharing this graph write independently
+        write_lock = asyncio.Lock()
+
+        async def run_tool(tool_call):
             tool_name = tool_call["name"]
             tool_args = tool_call["args"]
             tool_id = tool_call["id"]
             
             # Execute tool via MCP Client
-            output = await mcp_client.call_tool(tool_name, tool_args)
+            # Writes queue on the lock before taking a concurrency slot so a
+            # waiting write doesn't hold up reads.
+            if tool_name in MUTATING_TOOLS:
+                async with write_lock, tool_semaphore:
+                    with span(f"call {tool_name}", {"mcp.tool": tool_name}), metrics.timer("agent_tool_seconds", tool=tool_name):
+                        output = await client.call_tool(tool_name, tool_args)
+            else:
+                async with tool_semaphore:
+                    with span(f"call {tool_name}", {"mcp.tool": tool_name}), metrics.timer("agent_tool_seconds", tool=tool_name):
+                        output = await client.call_tool(tool_name, tool_args)
             
-            results.append(ToolMessage(
+            return ToolMessage(
                 tool_call_id=tool_id,
                 name=tool_name,
                 content=output
-            ))
+            )
+        
+        # Run all calls from this message concurrently; gather keeps results
+        # in the same order as the tool_calls they answer.
+        results = await asyncio.gather(*[run_tool(tc) for tc in last_message.tool_calls])
             
-        return {"messages": results}
+        return {"messages": list(results)}
 
     # 4. Define Conditional Logic
     def should_continue(state: AgentState) -> Literal["tools", "__end__"]:
@@ -149,4 +287,6 @@ def create_graph(mcp_client: MCPClient, provider: str = "openai", model: str = N
     
     workflow.add_edge("tools", "agent")
 
-    return workflow.compile()
+    # With a checkpointer, state (including tool results) persists per
+    # thread_id, so callers pass only the new message each turn.
+    return workflow.compile(checkpointer=checkpointer)
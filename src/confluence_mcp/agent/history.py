@@ -0,0 +1,258 @@
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a token for budgeting; close enough for English text and
+# JSON across the supported providers, and free to compute.
+CHARS_PER_TOKEN = 4
+
+# Longest line kept per message in the built-in (non-LLM) summary
+DIGEST_LINE_CHARS = 300
+
+# Summaries kept; one manager serves every session of a cached graph
+SUMMARY_CACHE_SIZE = 128
+
+# Sessions whose usage stats are kept, most recently active first
+SESSION_STATS_SIZE = 256
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    size = len(content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        size += len(json.dumps(message.tool_calls, default=str))
+    return size // CHARS_PER_TOKEN + 4
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Group messages into turns, each starting at a HumanMessage. Turns are
+    dropped whole so tool calls never lose their results.
+    """
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(b if isinstance(b, str) else b.get("text", "") for b in content if isinstance(b, (str, dict)))
+    return str(content)
+
+
+def describe_output(content: str) -> str:
+    """
+    One-line description of a tool result: the pages it mentions if it is
+    JSON from one of our tools, otherwise its first characters.
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content[:200].replace("\n", " ")
+
+    def page(item):
+        return f"{item.get('id')} \"{item.get('title')}\"" if isinstance(item, dict) else str(item)
+
+    if isinstance(data, dict):
+        items = data.get("results") or data.get("pages") or data.get("children")
+        if isinstance(items, list):
+            shown = ", ".join(page(i) for i in items[:10])
+            more = f" and {len(items) - 10} more" if len(items) > 10 else ""
+            return f"{len(items)} pages: {shown}{more}"
+        if "id" in data:
+            return f"page {page(data)}"
+    return content[:200].replace("\n", " ")
+
+
+class HistoryManager:
+    """
+    Keeps the messages sent to the LLM within a token budget.
+
+    Applied on every LLM call (including tool-loop iterations), in order,
+    until the estimate fits `max_tokens`:
+
+    1. Large tool outputs from earlier turns, oldest first, are replaced
+       with a short reference naming the tool call that produced them, so
+       the model can re-fetch the page if it needs it again.
+    2. The oldest turns (beyond the last `keep_turns`) are dropped and
+       replaced by a summary in the system prompt. `summarize` produces it
+       (e.g. an LLM call); without it a short digest of the dropped turns is
+       used. Summaries are cached, so each dropped prefix is summarised once.
+    3. Large tool outputs in the current turn are collapsed too, except the
+       latest batch the model is about to read.
+
+    The stored conversation is never modified; only the outgoing request is.
+    Conversations aren't stored (only per-session usage stats), so one
+    manager can serve every session.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 24000,
+        keep_turns: int = 2,
+        tool_output_chars: int = 4000,
+        summarize: Optional[Callable[[List[BaseMessage]], Awaitable[str]]] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_turns = max(0, keep_turns)
+        self.tool_output_chars = tool_output_chars
+        self.summarize = summarize
+        self._summaries: "OrderedDict[Any, str]" = OrderedDict()
+
+        self._calls = 0
+        # Per session (thread id): {"calls": n, "last": report}
+        self._sessions: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+
+    def _collapse(self, message: BaseMessage, calls: Dict[str, Dict[str, Any]], report: Dict[str, Any]) -> BaseMessage:
+        if not isinstance(message, ToolMessage):
+            return message
+        content = _text(message.content)
+        if len(content) <= self.tool_output_chars:
+            return message
+        call = calls.get(message.tool_call_id, {})
+        name = call.get("name") or message.name or "tool"
+        args = json.dumps(call.get("args", {}), ensure_ascii=False)
+        report["collapsedOutputs"] += 1
+        return ToolMessage(
+            tool_call_id=message.tool_call_id,
+            name=message.name,
+            content=(
+                f"[Output of {name}({args}) omitted to save context: {len(content)} chars, "
+                f"{describe_output(content)}. Call {name} again if you need its content.]"
+            )
+        )
+
+    async def _summary(self, dropped: List[BaseMessage]) -> str:
+        key = tuple(m.id or id(m) for m in dropped)
+        if key in self._summaries:
+            self._summaries.move_to_end(key)
+            return self._summaries[key]
+        summary = None
+        if self.summarize is not None:
+            try:
+                summary = await self.summarize(dropped)
+            except Exception as e:
+                logger.warning("History summarisation failed, using digest: %s", e)
+        if not summary:
+            summary = self.digest(dropped)
+        self._summaries[key] = summary
+        while len(self._summaries) > SUMMARY_CACHE_SIZE:
+            self._summaries.popitem(last=False)
+        return summary
+
+    @staticmethod
+    def digest(messages: List[BaseMessage], line_chars: int = DIGEST_LINE_CHARS) -> str:
+        lines = []
+        for message in messages:
+            text = _text(message.content).strip().replace("\n", " ")
+            if isinstance(message, HumanMessage):
+                lines.append(f"- User: {text[:line_chars]}")
+            elif isinstance(message, AIMessage):
+                if message.tool_calls:
+                    lines.append("- Assistant called: " + ", ".join(tc["name"] for tc in message.tool_calls))
+                if text:
+                    lines.append(f"- Assistant: {text[:line_chars]}")
+        return "\n".join(lines)
+
+    async def prepare(
+        self, system_prompt: str, messages: List[BaseMessage]
+    ) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """
+        Return the message list to send: system prompt (plus any summary of
+        dropped turns) followed by the compacted conversation, and a report
+        of the call's token estimates to pass to record_usage.
+        """
+        self._calls += 1
+        report: Dict[str, Any] = {"collapsedOutputs": 0}
+        messages = [m for m in messages if not isinstance(m, SystemMessage)]
+        original = sum(estimate_tokens(m) for m in messages) + len(system_prompt) // CHARS_PER_TOKEN
+        calls = {
+            tc["id"]: tc
+            for m in messages if isinstance(m, AIMessage)
+            for tc in m.tool_calls
+        }
+        turns = split_turns(messages)
+        current = turns.pop() if turns else []
+
+        def total(summary: str = "") -> int:
+            return (
+                (len(system_prompt) + len(summary)) // CHARS_PER_TOKEN
+                + sum(estimate_tokens(m) for turn in turns for m in turn)
+                + sum(estimate_tokens(m) for m in current)
+            )
+
+        # 1. Earlier turns' tool outputs become references, oldest first
+        for turn in turns:
+            if total() <= self.max_tokens:
+                break
+            turn[:] = [self._collapse(m, calls, report) for m in turn]
+
+        # 2. Drop the oldest turns into a summary
+        dropped: List[BaseMessage] = []
+        while len(turns) > self.keep_turns and total() > self.max_tokens:
+            dropped.extend(turns.pop(0))
+        summary = await self._summary(dropped) if dropped else ""
+
+        # 3. Collapse the current turn's older tool outputs (not the latest batch)
+        if total(summary) > self.max_tokens:
+            last_ai = max((i for i, m in enumerate(current) if isinstance(m, AIMessage)), default=len(current))
+            current = [self._collapse(m, calls, report) if i < last_ai else m for i, m in enumerate(current)]
+
+        content = system_prompt
+        if summary:
+            content += f"\n\nSummary of the earlier conversation (older turns were removed):\n{summary}"
+        result = [SystemMessage(content=content)] + [m for turn in turns for m in turn] + current
+
+        report.update({
+            "messages": len(result),
+            "estimatedTokens": total(summary),
+            "estimatedTokensBeforeCompaction": original,
+            "droppedTurns": len(split_turns(dropped)) if dropped else 0,
+        })
+        return result, report
+
+    def record_usage(self, response: BaseMessage, report: Dict[str, Any], session: Any = None):
+        """
+        Log the token counts for the call that produced `response`: our
+        estimate, and the provider's own counts when it reports them.
+        Counted under `session` (the chat thread id) for stats().
+        """
+        usage = getattr(response, "usage_metadata", None) or {}
+        report["inputTokens"] = usage.get("input_tokens")
+        report["outputTokens"] = usage.get("output_tokens")
+        entry = self._sessions.pop(session, None) or {"calls": 0, "last": {}}
+        entry["calls"] += 1
+        entry["last"] = report
+        self._sessions[session] = entry
+        while len(self._sessions) > SESSION_STATS_SIZE:
+            self._sessions.popitem(last=False)
+        logger.info(
+            "LLM call: %d messages, ~%d tokens sent (~%d before compaction), input=%s output=%s",
+            report["messages"],
+            report["estimatedTokens"],
+            report["estimatedTokensBeforeCompaction"],
+            report["inputTokens"],
+            report["outputTokens"],
+        )
+
+    def stats(self, session: Any = None) -> Dict[str, Any]:
+        """
+        Usage for one session (chat thread id), or the total call count and
+        number of tracked sessions if none is given.
+        """
+        if session is None:
+            return {"calls": self._calls, "sessions": len(self._sessions)}
+        entry = self._sessions.get(session, {"calls": 0, "last": {}})
+        return {"calls": entry["calls"], "last": dict(entry["last"])}
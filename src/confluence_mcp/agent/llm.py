@@ -1,32 +1,46 @@
 import os
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+DEFAULT_MODELS = {
+    "openai": "gpt-4o",
+    "anthropic": "claude-3-5-sonnet-20240620",
+    "google": "gemini-2.5-flash",
+}
+
+# One client per (provider, model) for the whole process. Clients are safe
+# to share between sessions, and sharing them shares their HTTP connection
+# pools to the provider.
+_clients: Dict[Tuple[str, str], BaseChatModel] = {}
+
 def get_llm(provider: str = "openai", model: Optional[str] = None) -> BaseChatModel:
     """
-    Factory to get a LangChain ChatModel based on provider and model name.
+    Get the process-wide LangChain ChatModel for a provider and model name.
     """
     provider = provider.lower()
-    
+    model = model or DEFAULT_MODELS.get(provider)
+    key = (provider, model)
+    if key not in _clients:
+        _clients[key] = _create_llm(provider, model)
+    return _clients[key]
+
+def _create_llm(provider: str, model: str) -> BaseChatModel:
     if provider == "openai":
-        model = model or "gpt-4o"
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment")
         return ChatOpenAI(model=model, api_key=api_key, temperature=0)
         
     elif provider == "anthropic":
-        model = model or "claude-3-5-sonnet-20240620"
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment")
         return ChatAnthropic(model=model, api_key=api_key, temperature=0)
         
     elif provider == "google":
-        model = model or "gemini-2.5-flash"
         api_key = os.environ.get("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment")
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional
+
+from src.confluence_mcp.agent.client import MCPClient, MUTATING_TOOLS
+
+logger = logging.getLogger(__name__)
+
+
+class _Slot:
+    """
+    One warm MCP server connection.
+
+    The connection is opened and closed inside a single dedicated task, so
+    the stdio transport's context managers are entered and exited from the
+    same task no matter which chat session is using it.
+    """
+
+    def __init__(self, index: int, factory: Callable[[], MCPClient]):
+        self.index = index
+        self.factory = factory
+        self.client: Optional[MCPClient] = None
+        self.leases = 0
+        self.ready = asyncio.Event()
+        self.error: Optional[BaseException] = None
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return self.client is not None and self.ready.is_set() and self._task is not None and not self._task.done()
+
+    async def _run(self):
+        client = self.factory()
+        try:
+            await client.connect()
+            self.client = client
+            self.error = None
+            self.ready.set()
+            await self._stop.wait()
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            logger.warning("MCP pool slot %d failed to connect: %s", self.index, e)
+        finally:
+            self.client = None
+            await client.close()
+
+    async def ensure_connected(self):
+        async with self._lock:
+            if self.healthy:
+                return
+            await self._shutdown()
+            self.ready = asyncio.Event()
+            self._stop = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            await self.ready.wait()
+            if self.error is not None:
+                raise self.error
+
+    async def reconnect(self):
+        async with self._lock:
+            await self._shutdown()
+        await self.ensure_connected()
+
+    async def _shutdown(self):
+        if self._task is not None and not self._task.done():
+            self._stop.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=10)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+        self._task = None
+        self.client = None
+
+    async def close(self):
+        async with self._lock:
+            await self._shutdown()
+
+
+class PooledMCPClient:
+    """
+    A chat session's lease on a pooled connection.
+
+    Quacks like MCPClient (get_tools / call_tool / close) so the graph code
+    doesn't care whether it owns a connection or shares one. Many leases
+    share a slot: MCP multiplexes concurrent requests over one connection.
+    Each lease sticks to one slot so it keeps hitting the same server
+    process and its page cache.
+    """
+
+    def __init__(self, pool: "MCPClientPool", slot: _Slot):
+        self.pool = pool
+        self.slot = slot
+        self._released = False
+
+    def get_tools(self):
+        return self.slot.client.get_tools() if self.slot.client else self.pool.tools
+
+    async def call_tool(self, name: str, arguments: dict) -> str:
+        if not self.slot.healthy:
+            await self.slot.ensure_connected()
+        result = await self.slot.client.call_tool(name, arguments)
+        if result.startswith(f"Error executing tool {name}:") and not await self.slot.client.ping():
+            # The server process died under us; bring it back and retry once.
+            # A write may already have reached Confluence, so it is not replayed
+            # (that could create a duplicate page); the agent sees the error.
+            logger.warning("MCP pool slot %d is unresponsive, reconnecting", self.slot.index)
+            await self.slot.reconnect()
+            if name in MUTATING_TOOLS:
+                return (
+                    f"{result}\nThe MCP server restarted during this call, so it may or may not "
+                    "have been applied. Check the page before retrying."
+                )
+            result = await self.slot.client.call_tool(name, arguments)
+        return result
+
+    async def close(self):
+        if not self._released:
+            self._released = True
+            self.pool.release(self)
+
+
+class MCPClientPool:
+    """
+    Bounded pool of warm Confluence MCP server connections shared by all
+    chat sessions in this process.
+
+    Connections are spawned on demand up to `size`, health-checked with MCP
+    pings every `health_check_interval` seconds and reconnected if their
+    server process has died.
+    """
+
+    def __init__(self, size: int = 4, health_check_interval: float = 30.0, factory: Callable[[], MCPClient] = MCPClient):
+        self.size = max(1, size)
+        self.health_check_interval = health_check_interval
+        self.factory = factory
+        self.slots: List[_Slot] = []
+        self.tools: List[Any] = []
+        self._lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def lease(self) -> PooledMCPClient:
+        """
+        Lease a connection. Opens a new one while the pool is below its size
+        and every existing one is in use, otherwise shares the least-loaded.
+        """
+        async with self._lock:
+            self._start_health_checks()
+            idle = [s for s in self.slots if s.leases == 0]
+            if idle:
+                slot = idle[0]
+            elif len(self.slots) < self.size:
+                slot = _Slot(len(self.slots), self.factory)
+                self.slots.append(slot)
+            else:
+                slot = min(self.slots, key=lambda s: s.leases)
+            slot.leases += 1
+
+        try:
+            await slot.ensure_connected()
+        except Exception:
+            slot.leases -= 1
+            raise
+        self.tools = slot.client.get_tools()
+        return PooledMCPClient(self, slot)
+
+    def release(self, lease: PooledMCPClient):
+        lease.slot.leases = max(0, lease.slot.leases - 1)
+
+    def _start_health_checks(self):
+        if self.health_check_interval > 0 and (self._health_task is None or self._health_task.done()):
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for slot in list(self.slots):
+                if slot.client is None and slot.leases == 0:
+                    continue
+                try:
+                    if not slot.healthy or not await slot.client.ping():
+                        logger.warning("MCP pool slot %d failed health check, reconnecting", slot.index)
+                        await slot.reconnect()
+                except Exception as e:
+                    logger.warning("MCP pool slot %d reconnect failed: %s", slot.index, e)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "connections": sum(1 for s in self.slots if s.healthy),
+            "leases": [s.leases for s in self.slots],
+        }
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for slot in self.slots:
+            await slot.close()
+        self.slots = []
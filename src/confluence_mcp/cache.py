@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class CacheEntry:
+    __slots__ = ("data", "version", "size", "checked_at")
+
+    def __init__(self, data: Dict[str, Any], version: Optional[int], size: int):
+        self.data = data
+        self.version = version
+        self.size = size
+        self.checked_at = time.monotonic()
+
+
+def page_version(data: Dict[str, Any]) -> Optional[int]:
+    return (data.get("version") or {}).get("number")
+
+
+def estimate_size(data: Dict[str, Any]) -> int:
+    """
+    Approximate the memory footprint of a page payload.
+    The storage body dominates, so that is what we count.
+    """
+    body = (data.get("body") or {}).get("storage", {}).get("value") or ""
+    title = data.get("title") or ""
+    return len(body.encode("utf-8")) + len(title.encode("utf-8")) + 512
+
+
+class PageCache:
+    """
+    In-process LRU cache of raw Confluence page payloads, keyed by page id.
+
+    Bounded by both entry count and total body bytes. Entries younger than
+    `ttl` seconds are served directly; older entries are "stale" and the
+    caller is expected to revalidate them with a cheap version probe,
+    reporting the outcome through revalidated().
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._revalidations = 0
+        self._revalidated_unchanged = 0
+        self._revalidated_changed = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._stale_puts = 0
+
+    def lookup(self, page_id: str) -> Optional[CacheEntry]:
+        """
+        Return the cached entry for page_id, or None on a miss.
+        Use is_fresh() to decide whether the entry needs revalidation.
+        """
+        with self._lock:
+            entry = self._entries.get(page_id)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(page_id)
+            if self._is_fresh(entry):
+                self._hits += 1
+            else:
+                self._revalidations += 1
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self._is_fresh(entry)
+
+    def _is_fresh(self, entry: CacheEntry) -> bool:
+        return self.ttl > 0 and (time.monotonic() - entry.checked_at) < self.ttl
+
+    def revalidated(self, page_id: str, version: Optional[int]) -> Optional[CacheEntry]:
+        """
+        Record the result of a version probe for a stale entry.
+
+        If the probed version matches the cached one the entry is marked fresh
+        and returned; otherwise it is dropped and None is returned so the
+        caller refetches the body.
+        """
+        with self._lock:
+            entry = self._entries.get(page_id)
+            if entry is not None and version is not None and entry.version == version:
+                entry.checked_at = time.monotonic()
+                self._revalidated_unchanged += 1
+                return entry
+            self._revalidated_changed += 1
+            if entry is not None:
+                self._remove(page_id)
+            return None
+
+    def put(self, page_id: str, data: Dict[str, Any]):
+        """
+        Cache a page payload. Ignored if a newer version is already cached,
+        e.g. when a read that was in flight during a write finishes after
+        the write has cached its result.
+        """
+        size = estimate_size(data)
+        version = page_version(data)
+        with self._lock:
+            current = self._entries.get(page_id)
+            if current is not None and current.version is not None and (version is None or version < current.version):
+                self._stale_puts += 1
+                return
+            if current is not None:
+                self._remove(page_id)
+            if size > self.max_bytes:
+                # Larger than the whole cache; don't evict everything for it.
+                return
+            self._entries[page_id] = CacheEntry(data, version, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def invalidate(self, page_id: str):
+        with self._lock:
+            if page_id in self._entries:
+                self._remove(page_id)
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, page_id: str):
+        entry = self._entries.pop(page_id)
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses + self._revalidations
+            served = self._hits + self._revalidated_unchanged
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "revalidations": self._revalidations,
+                "revalidatedUnchanged": self._revalidated_unchanged,
+                "revalidatedChanged": self._revalidated_changed,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "stalePutsSkipped": self._stale_puts,
+                "hitRatio": round(served / lookups, 4) if lookups else 0.0,
+            }
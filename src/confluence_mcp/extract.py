@@ -0,0 +1,130 @@
+import html
+import os
+import re
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+
+from .metrics import metrics
+
+# Storage-format elements whose text is macro configuration, not content
+# (e.g. <ac:parameter ac:name="language">python</ac:parameter>).
+SKIPPED_TAGS = {"ac:parameter", "ac:placeholder"}
+
+CDATA_RE = re.compile(r"<!\[CDATA\[(.*?)\]\]>", re.DOTALL)
+
+
+def _unwrap_cdata(html_content: str) -> str:
+    # Code/noformat macros keep their body in CDATA, which HTML parsers treat
+    # as a bogus comment; turn it into escaped text so it is extracted.
+    if "<![CDATA[" not in html_content:
+        return html_content
+    return CDATA_RE.sub(lambda m: html.escape(m.group(1), quote=False), html_content)
+
+
+class _TextCollector(HTMLParser):
+    """
+    SAX-style extractor: collects text nodes as the parser streams through
+    the document, without building a tree.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def unknown_decl(self, data):
+        if data.startswith("CDATA[") and not self._skip_depth:
+            self.parts.append(data[6:])
+
+
+def clean_html_stream(html_content: str) -> str:
+    parser = _TextCollector()
+    parser.feed(html_content)
+    parser.close()
+    return "\n".join(parser.parts).strip()
+
+
+def clean_html_lxml(html_content: str) -> str:
+    import lxml.html
+
+    root = lxml.html.fragment_fromstring(_unwrap_cdata(html_content), create_parent="div")
+    for el in list(root.iter(*SKIPPED_TAGS)):
+        el.drop_tree()
+    return "\n".join(root.itertext()).strip()
+
+
+def clean_html_bs4(html_content: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, "html.parser")
+    for el in soup.find_all(list(SKIPPED_TAGS)):
+        el.decompose()
+    return soup.get_text(separator="\n").strip()
+
+
+ENGINES: Dict[str, Callable[[str], str]] = {
+    "lxml": clean_html_lxml,
+    "stream": clean_html_stream,
+    "bs4": clean_html_bs4,
+}
+
+
+def lxml_available() -> bool:
+    try:
+        import lxml.html  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_engine(name: str) -> str:
+    """
+    Map an engine name (or "auto") to an installed engine.
+    auto prefers lxml and falls back to the pure-Python streaming parser.
+    """
+    name = (name or "auto").lower()
+    if name == "auto":
+        return "lxml" if lxml_available() else "stream"
+    if name not in ENGINES:
+        raise ValueError(f"Unknown HTML extraction engine '{name}' (use one of: auto, {', '.join(ENGINES)})")
+    if name == "lxml" and not lxml_available():
+        return "stream"
+    return name
+
+
+# Resolved on first use so importing this module doesn't load lxml.
+ENGINE: Optional[str] = None
+
+
+def default_engine() -> str:
+    global ENGINE
+    if ENGINE is None:
+        ENGINE = resolve_engine(os.environ.get("CONFLUENCE_HTML_ENGINE", "auto"))
+    return ENGINE
+
+
+def clean_html(html_content: str, engine: str = None) -> str:
+    """
+    Extract plain text from Confluence storage-format HTML.
+    Text nodes are separated by newlines; macro parameters are dropped.
+    """
+    if not html_content:
+        return ""
+    engine = engine or default_engine()
+    with metrics.timer("clean_html_seconds", engine=engine):
+        return ENGINES[engine](html_content)
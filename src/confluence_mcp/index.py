@@ -0,0 +1,236 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+from .transport import ConfluenceTransport, response_json
+
+logger = logging.getLogger(__name__)
+
+INDEX_PAGE_SIZE = 100
+
+
+class IndexedPage:
+    __slots__ = ("id", "title", "parent_id", "space_key")
+
+    def __init__(self, id: str, title: Optional[str], parent_id: Optional[str], space_key: str):
+        self.id = id
+        self.title = title
+        self.parent_id = parent_id
+        self.space_key = space_key
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "parentId": self.parent_id,
+            "spaceKey": self.space_key
+        }
+
+
+class AllowedPageIndex:
+    """
+    Local index of every page under the configured allowed parents.
+
+    Built in the background with one paginated CQL query per space, then kept
+    current with cheap `lastmodified` queries. Permission checks become set
+    lookups; pages that are not (yet) indexed fall back to the remote check
+    in the server, which adds them here when allowed.
+
+    The incremental sync also looks at pages modified elsewhere in the
+    allowed spaces, and drops those that were moved out of an allowed
+    hierarchy (with their indexed descendants). Pages moved to another space
+    or deleted are only dropped on the next full rebuild (every
+    `full_rebuild_interval` seconds).
+    """
+
+    def __init__(
+        self,
+        transport: ConfluenceTransport,
+        allowed_parents: Dict[str, Set[str]],
+        refresh_interval: float = 300.0,
+        full_rebuild_interval: float = 3600.0,
+    ):
+        self.transport = transport
+        self.allowed_parents = {k: set(v) for k, v in allowed_parents.items() if v}
+        self.refresh_interval = refresh_interval
+        self.full_rebuild_interval = full_rebuild_interval
+
+        self.pages: Dict[str, IndexedPage] = {}
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+        self._last_full_build: Optional[float] = None
+        self._last_refresh: Optional[float] = None
+        # Wall-clock time the last sync started; the next incremental sync
+        # asks for pages modified since then.
+        self._synced_since: Optional[datetime.datetime] = None
+
+        self._builds = 0
+        self._refreshes = 0
+        self._failures = 0
+        self._local_hits = 0
+        self._local_misses = 0
+
+    # Lookups
+
+    def contains(self, page_id: str) -> bool:
+        found = page_id in self.pages
+        if found:
+            self._local_hits += 1
+        else:
+            self._local_misses += 1
+        return found
+
+    def get(self, page_id: str) -> Optional[IndexedPage]:
+        return self.pages.get(page_id)
+
+    def add(self, page_id: str, title: Optional[str], parent_id: Optional[str], space_key: str):
+        self.pages[page_id] = IndexedPage(page_id, title, parent_id, space_key)
+
+    def discard(self, page_id: str):
+        self.pages.pop(page_id, None)
+
+    def discard_tree(self, page_id: str):
+        """
+        Drop page_id and every indexed page below it.
+        """
+        if page_id not in self.pages:
+            return
+        children: Dict[str, List[str]] = {}
+        for page in self.pages.values():
+            if page.parent_id is not None:
+                children.setdefault(page.parent_id, []).append(page.id)
+        stack = [page_id]
+        while stack:
+            current = stack.pop()
+            self.pages.pop(current, None)
+            stack.extend(children.get(current, ()))
+
+    # Syncing
+
+    def hierarchy_cql(self, space_key: str) -> str:
+        roots = ", ".join(sorted(self.allowed_parents[space_key]))
+        return f'space = "{space_key}" AND type=page AND (id in ({roots}) OR ancestor in ({roots}))'
+
+    async def _iter_content(self, cql: str) -> AsyncIterator[Dict[str, Any]]:
+        params: Optional[Dict[str, Any]] = {"cql": cql, "expand": "ancestors", "limit": INDEX_PAGE_SIZE}
+        path = "/rest/api/content/search"
+        while path:
+            response = await self.transport.get(path, params=params)
+            response.raise_for_status()
+            data = response_json(response)
+            for result in data.get("results", []):
+                yield result
+            # _links.next already carries cql, cursor and limit
+            path = data.get("_links", {}).get("next")
+            params = None
+
+    def in_scope(self, result: Dict[str, Any], space_key: str) -> bool:
+        """
+        Whether a content result (with ancestors) is, or is under, one of
+        the allowed parents of space_key.
+        """
+        roots = self.allowed_parents.get(space_key, set())
+        ancestor_ids = {str(a.get("id")) for a in result.get("ancestors") or []}
+        return str(result.get("id")) in roots or bool(ancestor_ids & roots)
+
+    def _index_result(self, pages: Dict[str, IndexedPage], result: Dict[str, Any], space_key: str):
+        page_id = str(result.get("id"))
+        ancestors = result.get("ancestors") or []
+        parent_id = str(ancestors[-1].get("id")) if ancestors else None
+        pages[page_id] = IndexedPage(page_id, result.get("title"), parent_id, space_key)
+
+    async def build(self):
+        """
+        Rebuild the whole index and swap it in atomically.
+        """
+        started = datetime.datetime.now(datetime.timezone.utc)
+        pages: Dict[str, IndexedPage] = {}
+        for space_key in self.allowed_parents:
+            async for result in self._iter_content(self.hierarchy_cql(space_key)):
+                self._index_result(pages, result, space_key)
+
+        self.pages = pages
+        self.ready = True
+        self._synced_since = started
+        self._last_full_build = time.time()
+        self._builds += 1
+
+    async def refresh(self):
+        """
+        Pull in pages created or modified since the last sync, and drop
+        those that were moved out of the allowed hierarchies.
+        """
+        if self._synced_since is None:
+            await self.build()
+            return
+
+        started = datetime.datetime.now(datetime.timezone.utc)
+        # CQL dates are evaluated in the account's timezone; going back a
+        # full day keeps the query correct regardless of offset.
+        since = (self._synced_since - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        for space_key in self.allowed_parents:
+            # The whole space rather than hierarchy_cql, so that pages moved
+            # out of the hierarchy come back too and can be dropped
+            cql = f'space = "{space_key}" AND type=page AND lastmodified >= "{since}"'
+            async for result in self._iter_content(cql):
+                if self.in_scope(result, space_key):
+                    self._index_result(self.pages, result, space_key)
+                else:
+                    self.discard_tree(str(result.get("id")))
+
+        self._synced_since = started
+        self._last_refresh = time.time()
+        self._refreshes += 1
+
+    def start(self):
+        """
+        Start the background sync loop (idempotent). Must be called from
+        within the running event loop.
+        """
+        if not self.allowed_parents:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                due_full = (
+                    self._last_full_build is None
+                    or time.time() - self._last_full_build >= self.full_rebuild_interval
+                )
+                if due_full:
+                    await self.build()
+                else:
+                    await self.refresh()
+            except httpx.HTTPError as e:
+                self._failures += 1
+                logger.warning("Allowed-page index sync failed: %s", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "pages": len(self.pages),
+            "roots": sum(len(v) for v in self.allowed_parents.values()),
+            "builds": self._builds,
+            "refreshes": self._refreshes,
+            "failures": self._failures,
+            "localHits": self._local_hits,
+            "localMisses": self._local_misses,
+            "lastFullBuild": self._last_full_build,
+            "lastRefresh": self._last_refresh,
+        }
@@ -0,0 +1,187 @@
+import contextlib
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Samples kept per histogram for percentiles; count and sum are exact
+HISTOGRAM_WINDOW = 2048
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+ID_SEGMENT_RE = re.compile(r"/\d+(?=/|$)")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def endpoint_template(path: str) -> str:
+    """
+    Collapse ids in a REST path so requests group by endpoint,
+    e.g. /rest/api/content/123/child/page -> /rest/api/content/{id}/child/page.
+    """
+    path = path.split("?", 1)[0]
+    if "://" in path:
+        path = "/" + path.split("://", 1)[1].split("/", 1)[-1]
+    return ID_SEGMENT_RE.sub("/{id}", path)
+
+
+class Histogram:
+    """
+    Latency distribution over a sliding window of recent samples.
+    """
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.samples: deque = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        result = {"count": self.count, "sumSeconds": round(self.sum, 6)}
+        for q in PERCENTILES:
+            value = self.percentile(q)
+            result[f"p{int(q * 100)}"] = round(value, 6) if value is not None else None
+        return result
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms, keyed by name and labels.
+
+    Exposed as JSON (snapshot) for the get_server_stats tool and as
+    Prometheus text (prometheus) for scraping.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._histograms.setdefault(name, {}).setdefault(key, Histogram()).observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{**dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [{**dict(key), **hist.snapshot()} for key, hist in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        Render in the Prometheus text exposition format. Histograms are
+        exported as summaries (quantiles over the recent window).
+        """
+        def labels_text(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ""
+            escaped = (v.replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{labels_text(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} summary")
+                for key, hist in series.items():
+                    for q in PERCENTILES:
+                        value = hist.percentile(q)
+                        if value is not None:
+                            lines.append(f"{name}{labels_text(key, (('quantile', str(q)),))} {value:.6f}")
+                    lines.append(f"{name}_sum{labels_text(key)} {hist.sum:.6f}")
+                    lines.append(f"{name}_count{labels_text(key)} {hist.count}")
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Optional OpenTelemetry spans. Enabled with CONFLUENCE_OTEL=1 when the
+# opentelemetry-api package is installed; exporters are configured the usual
+# way (SDK setup or opentelemetry-instrument). Trace context is passed from
+# the agent to the server in the MCP request _meta, so an agent turn, its
+# tool calls and their Confluence requests form one trace.
+
+_tracer = None
+if os.environ.get("CONFLUENCE_OTEL") == "1":
+    try:
+        from opentelemetry import trace as _otel_trace
+        from opentelemetry import propagate as _otel_propagate
+
+        _tracer = _otel_trace.get_tracer("confluence_mcp")
+    except ImportError:
+        _tracer = None
+
+
+def tracing_enabled() -> bool:
+    return _tracer is not None
+
+
+@contextlib.contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None, carrier: Optional[Dict[str, str]] = None):
+    """
+    Open a span (no-op unless tracing is enabled). `carrier` holds
+    propagated trace headers (e.g. traceparent) to parent the span on.
+    """
+    if _tracer is None:
+        yield None
+        return
+    parent = _otel_propagate.extract(carrier) if carrier else None
+    with _tracer.start_as_current_span(name, context=parent, attributes=attributes or {}) as current:
+        yield current
+
+
+def trace_headers() -> Dict[str, str]:
+    """
+    The current trace context as propagation headers ({} when disabled).
+    """
+    carrier: Dict[str, str] = {}
+    if _tracer is not None:
+        _otel_propagate.inject(carrier)
+    return carrier
@@ -0,0 +1,269 @@
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# HTML elements that never have a closing tag, in case a body uses <br>
+# rather than the XHTML <br />
+VOID_TAGS = {"br", "hr", "img", "col", "input", "meta", "link", "wbr", "area", "source"}
+
+# Headings listed in a "not found" error
+LISTED_HEADINGS = 30
+
+
+class PatchError(ValueError):
+    pass
+
+
+class Element:
+    """
+    Character offsets of one element in the source:
+    source[start:inner_start] is the start tag, source[inner_start:inner_end]
+    the content and source[inner_end:end] the end tag.
+    """
+
+    __slots__ = ("tag", "start", "inner_start", "inner_end", "end", "parent", "text")
+
+    def __init__(self, tag: str, start: int, inner_start: int, parent: Optional["Element"]):
+        self.tag = tag
+        self.start = start
+        self.inner_start = inner_start
+        self.inner_end = inner_start
+        self.end = inner_start
+        self.parent = parent
+        self.text: List[str] = []
+
+
+class _ElementIndexer(HTMLParser):
+    """
+    Records where every element starts and ends without building a tree, so
+    edits can be spliced into the original string and everything outside
+    them stays byte-for-byte unchanged.
+    """
+
+    def __init__(self, source: str):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        self.line_offsets = [0] + [m.end() for m in re.finditer("\n", source)]
+        self.elements: List[Element] = []
+        self.stack: List[Element] = []
+        self.unmatched = 0
+
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        start = self._offset()
+        element = Element(tag, start, start + len(self.get_starttag_text()), self.stack[-1] if self.stack else None)
+        self.elements.append(element)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        start = self._offset()
+        self.elements.append(
+            Element(tag, start, start + len(self.get_starttag_text()), self.stack[-1] if self.stack else None)
+        )
+
+    def handle_endtag(self, tag):
+        if not any(e.tag == tag for e in self.stack):
+            self.unmatched += 1
+            return
+        start = self._offset()
+        end = self.source.index(">", start) + 1
+        while self.stack:
+            element = self.stack.pop()
+            element.inner_end = start
+            element.end = start if element.tag != tag else end
+            if element.tag == tag:
+                break
+            # Closed implicitly by an outer end tag
+            self.unmatched += 1
+
+    def handle_data(self, data):
+        for element in self.stack:
+            if element.tag in HEADING_TAGS:
+                element.text.append(data)
+
+    def close(self):
+        super().close()
+        self.unmatched += len(self.stack)
+        for element in self.stack:
+            element.inner_end = element.end = len(self.source)
+        self.stack = []
+
+
+def index_elements(source: str) -> Tuple[List[Element], int]:
+    """
+    Returns the elements of `source` in document order and the number of
+    unbalanced tags found.
+    """
+    indexer = _ElementIndexer(source)
+    indexer.feed(source)
+    indexer.close()
+    return indexer.elements, indexer.unmatched
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def heading_text(element: Element) -> str:
+    return " ".join("".join(element.text).split())
+
+
+def _content(op: Dict[str, Any], key: str = "content") -> str:
+    content = op.get(key)
+    if not isinstance(content, str):
+        raise PatchError(f"'{key}' must be a string.")
+    _, unmatched = index_elements(content)
+    if unmatched:
+        raise PatchError(f"'{key}' is not balanced markup (unclosed or stray tags).")
+    return content
+
+
+def _find_heading(elements: List[Element], op: Dict[str, Any], key: str = "heading") -> Element:
+    wanted = op.get(key)
+    if not isinstance(wanted, str):
+        raise PatchError(f"'{key}' (heading text) is required.")
+    headings = [e for e in elements if e.tag in HEADING_TAGS]
+    matches = [e for e in headings if _normalize(heading_text(e)) == _normalize(wanted)]
+    if not matches:
+        listed = ", ".join(f'"{heading_text(e)}"' for e in headings[:LISTED_HEADINGS])
+        raise PatchError(f"Heading '{wanted}' not found. Headings on the page: {listed or 'none'}.")
+    occurrence = op.get("occurrence")
+    if occurrence is None:
+        if len(matches) > 1:
+            raise PatchError(f"Heading '{wanted}' appears {len(matches)} times; pass occurrence (1-based).")
+        return matches[0]
+    if not isinstance(occurrence, int) or not 1 <= occurrence <= len(matches):
+        raise PatchError(f"Heading '{wanted}' has {len(matches)} occurrence(s); occurrence must be 1..{len(matches)}.")
+    return matches[occurrence - 1]
+
+
+def section_bounds(elements: List[Element], heading: Element, source_length: int) -> Tuple[int, int]:
+    """
+    (start, end) of the content under `heading`: up to the next heading of
+    the same or a higher level, or the end of the heading's container.
+    """
+    level = int(heading.tag[1])
+    limit = heading.parent.inner_end if heading.parent else source_length
+    for element in elements:
+        if element.start < heading.end:
+            continue
+        if element.start >= limit:
+            break
+        if element.tag in HEADING_TAGS and int(element.tag[1]) <= level:
+            return heading.end, element.start
+    return heading.end, limit
+
+
+def _find_element(elements: List[Element], op: Dict[str, Any], source_length: int, tag: Optional[str] = None) -> Element:
+    tag = (tag or op.get("tag") or "").lower()
+    if not tag:
+        raise PatchError("'tag' is required (e.g. \"table\").")
+    index = op.get("index", 0)
+    if not isinstance(index, int) or index < 0:
+        raise PatchError("'index' must be a non-negative integer.")
+    start, end = 0, source_length
+    where = "on the page"
+    if op.get("heading") is not None:
+        start, end = section_bounds(elements, _find_heading(elements, op), source_length)
+        where = f"under heading '{op['heading']}'"
+    candidates = [e for e in elements if e.tag == tag and e.start >= start and e.end <= end]
+    if index >= len(candidates):
+        raise PatchError(f"No <{tag}> with index {index} {where} (found {len(candidates)}).")
+    return candidates[index]
+
+
+def apply_operation(source: str, op: Dict[str, Any]) -> str:
+    if not isinstance(op, dict):
+        raise PatchError("Each operation must be an object with an 'op' field.")
+    name = op.get("op")
+    handler = OPERATIONS.get(name)
+    if handler is None:
+        raise PatchError(f"Unknown operation '{name}' (use one of: {', '.join(OPERATIONS)}).")
+    elements, _ = index_elements(source)
+    return handler(source, elements, op)
+
+
+def _replace_section(source, elements, op):
+    start, end = section_bounds(elements, _find_heading(elements, op), len(source))
+    return source[:start] + _content(op) + source[end:]
+
+
+def _append_to_section(source, elements, op):
+    _, end = section_bounds(elements, _find_heading(elements, op), len(source))
+    return source[:end] + _content(op) + source[end:]
+
+
+def _delete_section(source, elements, op):
+    heading = _find_heading(elements, op)
+    _, end = section_bounds(elements, heading, len(source))
+    return source[:heading.start] + source[end:]
+
+
+def _append(source, elements, op):
+    return source + _content(op)
+
+
+def _append_table_row(source, elements, op):
+    row = _content(op)
+    if not row.lstrip().startswith("<tr"):
+        raise PatchError("'content' must be a <tr>...</tr> row.")
+    table = _find_element(elements, op, len(source), tag="table")
+    bodies = [e for e in elements if e.tag == "tbody" and e.parent is table]
+    position = bodies[-1].inner_end if bodies else table.inner_end
+    return source[:position] + row + source[position:]
+
+
+def _replace_element(source, elements, op):
+    element = _find_element(elements, op, len(source))
+    return source[:element.start] + _content(op) + source[element.end:]
+
+
+def _delete_element(source, elements, op):
+    element = _find_element(elements, op, len(source))
+    return source[:element.start] + source[element.end:]
+
+
+def _replace_text(source, elements, op):
+    find = op.get("find")
+    if not isinstance(find, str) or not find:
+        raise PatchError("'find' must be a non-empty string.")
+    replace = _content(op, "replace")
+    count = source.count(find)
+    if count == 0:
+        raise PatchError("'find' does not occur in the storage body.")
+    if count > 1 and not op.get("all"):
+        raise PatchError(f"'find' occurs {count} times; make it unique or pass all=true.")
+    return source.replace(find, replace)
+
+
+OPERATIONS = {
+    "replace_section": _replace_section,
+    "append_to_section": _append_to_section,
+    "delete_section": _delete_section,
+    "append": _append,
+    "append_table_row": _append_table_row,
+    "replace_element": _replace_element,
+    "delete_element": _delete_element,
+    "replace_text": _replace_text,
+}
+
+
+def apply_operations(source: str, operations: List[Dict[str, Any]]) -> str:
+    """
+    Apply patch operations to a storage-format body, in order. Raises
+    PatchError (a ValueError) if any operation can't be applied; the body
+    is then left as it was.
+    """
+    for position, op in enumerate(operations, 1):
+        try:
+            source = apply_operation(source, op)
+        except PatchError as e:
+            name = op.get("op") if isinstance(op, dict) else None
+            raise PatchError(f"Operation {position} ({name}): {e}")
+    return source
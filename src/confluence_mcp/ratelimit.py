@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import datetime
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+from .metrics import metrics
+from .transport import parse_retry_after
+
+# Session the current request is made for, set per tool call by the server.
+# Background work (index syncs) queues under its own name.
+current_session: contextvars.ContextVar[str] = contextvars.ContextVar("confluence_session", default="background")
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Adaptive rate (AIMD): cut on throttling, creep back up on success
+DECREASE_FACTOR = 0.7
+NEAR_LIMIT_FACTOR = 0.9
+INCREASE_STEP = 0.02
+MIN_RATE_FRACTION = 0.05
+# Fraction of the remaining window budget we allow ourselves to use
+HEADROOM = 0.9
+# Shortest reset window the ceiling is computed over
+MIN_WINDOW = 0.1
+# Pause after a 429 without Retry-After
+DEFAULT_PAUSE = 1.0
+
+
+def request_kind(method: str) -> str:
+    return "read" if method.upper() in READ_METHODS else "write"
+
+
+def parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    """
+    Seconds until an X-RateLimit-Reset (ISO 8601 timestamp or epoch seconds).
+    """
+    if not value:
+        return None
+    try:
+        reset_at = float(value)
+    except ValueError:
+        try:
+            reset_at = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return max(0.0, reset_at - now)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.max_rate = rate
+        self.rate = rate
+        # Cap from the last X-RateLimit-Remaining/Reset, independent of the
+        # adaptive rate so it lifts as soon as a new window starts
+        self.ceiling = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """
+        Seconds until a token is available (0 if one is available now).
+        """
+        rate = min(self.rate, self.ceiling)
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class RateLimiter:
+    """
+    Token-bucket scheduler in front of every Confluence request.
+
+    Reads and writes draw from separate buckets. Requests that have to wait
+    queue per session and are released round-robin, so one busy session
+    can't starve the others. The rate adapts to Confluence's feedback: a
+    429 pauses the bucket for Retry-After and cuts the rate, X-RateLimit-
+    Remaining/Reset cap it to what is left of the window, and successful
+    responses raise it gradually back to the configured rate. Throughput
+    settles just under the limit instead of alternating between bursts and
+    429 storms.
+
+    A rate of 0 disables that bucket.
+    """
+
+    def __init__(self, read_rate: float = 20.0, write_rate: float = 5.0, burst_seconds: float = 2.0):
+        self.buckets: Dict[str, TokenBucket] = {}
+        for kind, rate in (("read", read_rate), ("write", write_rate)):
+            if rate > 0:
+                self.buckets[kind] = TokenBucket(rate, rate * burst_seconds)
+        self._queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            kind: OrderedDict() for kind in self.buckets
+        }
+        self._dispatchers: Dict[str, asyncio.Task] = {}
+
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._throttled = 0
+
+    async def acquire(self, method: str):
+        """
+        Wait for a token for one request.
+        """
+        kind = request_kind(method)
+        bucket = self.buckets.get(kind)
+        if bucket is None:
+            return
+        queue = self._queues[kind]
+        start = time.monotonic()
+        # Fast path; anyone already queued goes first
+        if not queue and bucket.wait_time(start) == 0:
+            bucket.tokens -= 1
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue.setdefault(current_session.get(), deque()).append(future)
+        dispatcher = self._dispatchers.get(kind)
+        if dispatcher is None or dispatcher.done():
+            self._dispatchers[kind] = loop.create_task(self._dispatch(kind))
+        await future
+
+        waited = time.monotonic() - start
+        self._waits += 1
+        self._wait_seconds += waited
+        metrics.observe("confluence_rate_limit_wait_seconds", waited, kind=kind)
+
+    async def _dispatch(self, kind: str):
+        bucket = self.buckets[kind]
+        queue = self._queues[kind]
+        while queue:
+            delay = bucket.wait_time(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            # Round-robin: the served session moves to the back of the line
+            session, waiters = next(iter(queue.items()))
+            queue.move_to_end(session)
+            future = waiters.popleft()
+            if not waiters:
+                del queue[session]
+            if future.done():
+                # Caller was cancelled while waiting
+                continue
+            bucket.tokens -= 1
+            future.set_result(None)
+
+    def observe(self, method: str, response: httpx.Response):
+        """
+        Adjust the rate from a response's status and rate-limit headers.
+        """
+        bucket = self.buckets.get(request_kind(method))
+        if bucket is None:
+            return
+        now = time.monotonic()
+        headers = response.headers
+        floor = bucket.max_rate * MIN_RATE_FRACTION
+
+        bucket.ceiling = bucket.max_rate
+        remaining = headers.get("X-RateLimit-Remaining")
+        window = parse_reset(headers.get("X-RateLimit-Reset"), time.time())
+        if remaining is not None and window is not None:
+            try:
+                remaining_requests = max(0, int(float(remaining)))
+            except ValueError:
+                remaining_requests = None
+            if remaining_requests is not None:
+                if remaining_requests == 0:
+                    bucket.paused_until = max(bucket.paused_until, now + window)
+                bucket.ceiling = max(floor, HEADROOM * remaining_requests / max(window, MIN_WINDOW))
+
+        if response.status_code == 429:
+            self._throttled += 1
+            pause = parse_retry_after(headers.get("Retry-After"))
+            bucket.paused_until = max(bucket.paused_until, now + (DEFAULT_PAUSE if pause is None else pause))
+            bucket.tokens = min(bucket.tokens, 0.0)
+            bucket.rate = max(floor, bucket.rate * DECREASE_FACTOR)
+        elif headers.get("X-RateLimit-NearLimit", "").lower() == "true":
+            bucket.rate = max(floor, bucket.rate * NEAR_LIMIT_FACTOR)
+        elif response.status_code < 400:
+            bucket.rate = min(bucket.max_rate, bucket.rate + bucket.max_rate * INCREASE_STEP)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        result: Dict[str, Any] = {
+            "waits": self._waits,
+            "waitSeconds": round(self._wait_seconds, 3),
+            "throttled": self._throttled,
+        }
+        for kind, bucket in self.buckets.items():
+            result[f"{kind}Rate"] = round(min(bucket.rate, bucket.ceiling), 3)
+            result[f"{kind}MaxRate"] = bucket.max_rate
+            result[f"{kind}Queued"] = sum(len(w) for w in self._queues[kind].values())
+            result[f"{kind}PausedSeconds"] = round(max(0.0, bucket.paused_until - now), 3)
+        return result
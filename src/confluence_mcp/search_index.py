@@ -0,0 +1,328 @@
+import asyncio
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from .transport import ConfluenceTransport, response_json
+
+logger = logging.getLogger(__name__)
+
+SYNC_PAGE_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    space_key TEXT,
+    url TEXT,
+    version INTEGER,
+    synced_at REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    id UNINDEXED,
+    title,
+    body,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def fts5_available() -> bool:
+    try:
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def to_match_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 MATCH expression: every word must appear,
+    the last word is prefix-matched.
+    """
+    words = re.findall(r"\w+", query, flags=re.UNICODE)
+    if not words:
+        return ""
+    terms = ['"%s"' % w.replace('"', '""') for w in words]
+    terms[-1] += "*"
+    return " AND ".join(terms)
+
+
+class LocalSearchIndex:
+    """
+    On-disk SQLite FTS5 index of the pages the server is allowed to see.
+
+    `scope_cql` is the CQL restriction (spaces + allowed parents) used to
+    decide which pages to pull in; `extract_text` turns storage-format HTML
+    into the indexed plain text. Syncs are incremental via `lastmodified`
+    queries. Given `space_cql` (the scope's spaces without the parent
+    restriction), incremental syncs also drop pages moved out of the allowed
+    hierarchies, with everything below them; a periodic full sync removes
+    any other pages that left the scope (deleted, moved to another space).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        transport: ConfluenceTransport,
+        scope_cql: str,
+        extract_text: Callable[[str], str],
+        base_url: str = "",
+        refresh_interval: float = 600.0,
+        full_sync_interval: float = 3600.0,
+        space_cql: Optional[str] = None,
+    ):
+        self.path = path
+        self.transport = transport
+        self.scope_cql = scope_cql
+        self.space_cql = space_cql
+        self.extract_text = extract_text
+        self.base_url = base_url
+        self.refresh_interval = refresh_interval
+        self.full_sync_interval = full_sync_interval
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Whether the index has completed a sync for the current scope (possibly
+        # in an earlier run); until then, searches would miss pages
+        self.ready = self._get_state("last_sync") is not None and self._get_state("scope") == scope_cql
+
+        self._syncs = 0
+        self._failures = 0
+        self._queries = 0
+
+    # Storage (blocking; run through asyncio.to_thread from async code)
+
+    def _get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def _upsert(self, rows: Iterable[Tuple[str, str, str, str, int, str]]):
+        now = time.time()
+        with self._lock, self._conn:
+            for page_id, title, space_key, url, version, text in rows:
+                self._conn.execute("DELETE FROM pages_fts WHERE id = ?", (page_id,))
+                self._conn.execute(
+                    "INSERT INTO pages_fts (id, title, body) VALUES (?, ?, ?)", (page_id, title, text)
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pages (id, title, space_key, url, version, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (page_id, title, space_key, url, version, now)
+                )
+
+    def _versions(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, version FROM pages").fetchall())
+
+    def _delete_missing(self, keep: set):
+        with self._lock:
+            stale = [r[0] for r in self._conn.execute("SELECT id FROM pages").fetchall() if r[0] not in keep]
+        self._delete(stale)
+
+    def _delete(self, page_ids: Iterable[str]):
+        with self._lock, self._conn:
+            for page_id in page_ids:
+                self._conn.execute("DELETE FROM pages_fts WHERE id = ?", (page_id,))
+                self._conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+
+    def remove(self, page_id: str):
+        self._delete([page_id])
+
+    def put_page(self, data: Dict[str, Any]):
+        """
+        Index a single raw page payload (e.g. right after we wrote it).
+        """
+        self._upsert_pages([data])
+
+    def _upsert_pages(self, pages: Iterable[Dict[str, Any]]):
+        # Text extraction is CPU-bound, so it runs here rather than on the
+        # event loop, and before taking the lock
+        rows = [row for row in map(self._row, pages) if row is not None]
+        self._upsert(rows)
+
+    def _row(self, data: Dict[str, Any]) -> Optional[Tuple[str, str, str, str, int, str]]:
+        if not data.get("id"):
+            return None
+        body_html = data.get("body", {}).get("storage", {}).get("value", "")
+        return (
+            str(data["id"]),
+            data.get("title") or "",
+            data.get("space", {}).get("key"),
+            data.get("_links", {}).get("webui", ""),
+            data.get("version", {}).get("number") or 0,
+            self.extract_text(body_html),
+        )
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Ranked full-text query with highlighted snippets. No network access.
+        """
+        match = to_match_query(query)
+        if not match:
+            return []
+        self._queries += 1
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT f.id, p.title, p.space_key, p.url,
+                       snippet(pages_fts, 2, '[', ']', '...', 16),
+                       bm25(pages_fts, 0.0, 10.0, 1.0) AS rank
+                FROM pages_fts f JOIN pages p ON p.id = f.id
+                WHERE pages_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, limit)
+            ).fetchall()
+        return [
+            {
+                "id": page_id,
+                "title": title,
+                "spaceKey": space_key,
+                "url": f"{self.base_url}{url}",
+                "excerpt": snippet,
+                "score": round(-rank, 4)
+            }
+            for page_id, title, space_key, url, snippet, rank in rows
+        ]
+
+    # Syncing
+
+    async def _iter_content(self, cql: str, expand: str):
+        params: Optional[Dict[str, Any]] = {"cql": cql, "expand": expand, "limit": SYNC_PAGE_SIZE}
+        path = "/rest/api/content/search"
+        while path:
+            response = await self.transport.get(path, params=params)
+            response.raise_for_status()
+            data = response_json(response)
+            yield data.get("results", [])
+            path = data.get("_links", {}).get("next")
+            params = None
+
+    async def sync(self, full: bool = False):
+        """
+        Pull pages modified since the last sync into the index.
+
+        A full sync lists every page in scope (versions only), downloads the
+        ones that are new or changed, and drops the ones no longer in scope.
+        """
+        started = datetime.datetime.now(datetime.timezone.utc)
+        last_sync = await asyncio.to_thread(self._get_state, "last_sync")
+        # A changed access scope invalidates everything indexed so far
+        if await asyncio.to_thread(self._get_state, "scope") != self.scope_cql:
+            full = True
+
+        if full or last_sync is None:
+            known = await asyncio.to_thread(self._versions)
+            seen = set()
+            changed = []
+            async for results in self._iter_content(self.scope_cql, "version"):
+                for r in results:
+                    page_id = str(r.get("id"))
+                    seen.add(page_id)
+                    if known.get(page_id) != r.get("version", {}).get("number"):
+                        changed.append(page_id)
+            for i in range(0, len(changed), SYNC_PAGE_SIZE):
+                chunk = ", ".join(changed[i:i + SYNC_PAGE_SIZE])
+                async for results in self._iter_content(f"id in ({chunk})", "body.storage,space,version"):
+                    await asyncio.to_thread(self._upsert_pages, results)
+            await asyncio.to_thread(self._delete_missing, seen)
+            await asyncio.to_thread(self._set_state, "scope", self.scope_cql)
+            await asyncio.to_thread(self._set_state, "last_full_sync", str(time.time()))
+        else:
+            # CQL dates are evaluated in the account's timezone; going back a
+            # day keeps the window correct regardless of offset.
+            since_dt = datetime.datetime.fromisoformat(last_sync) - datetime.timedelta(days=1)
+            modified = f'lastmodified >= "{since_dt.strftime("%Y-%m-%d")}"'
+            in_scope = set()
+            async for results in self._iter_content(f"{self.scope_cql} AND {modified}", "body.storage,space,version"):
+                in_scope.update(str(r.get("id")) for r in results)
+                await asyncio.to_thread(self._upsert_pages, results)
+            if self.space_cql not in (None, self.scope_cql):
+                await self._drop_moved(f"{self.space_cql} AND {modified}", in_scope)
+
+        await asyncio.to_thread(self._set_state, "last_sync", started.isoformat())
+        self.ready = True
+        self._syncs += 1
+
+    async def _drop_moved(self, cql: str, in_scope: set):
+        """
+        Remove indexed pages that `cql` (recently modified pages in the
+        scope's spaces) returns but the scope query didn't, i.e. pages moved
+        out of the allowed hierarchies, and the pages below them (which
+        weren't modified, so neither query returns them).
+        """
+        known = await asyncio.to_thread(self._versions)
+        moved = []
+        async for results in self._iter_content(cql, "version"):
+            moved.extend(
+                page_id for page_id in (str(r.get("id")) for r in results)
+                if page_id not in in_scope and page_id in known
+            )
+        below = []
+        for i in range(0, len(moved), SYNC_PAGE_SIZE):
+            chunk = ", ".join(moved[i:i + SYNC_PAGE_SIZE])
+            async for results in self._iter_content(f"type=page AND ancestor in ({chunk})", "version"):
+                below.extend(str(r.get("id")) for r in results)
+        if moved:
+            await asyncio.to_thread(self._delete, moved + below)
+
+    def start(self):
+        """
+        Start the background sync loop (idempotent). Must be called from
+        within the running event loop.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                last_full = await asyncio.to_thread(self._get_state, "last_full_sync")
+                full = last_full is None or time.time() - float(last_full) >= self.full_sync_interval
+                await self.sync(full=full)
+            except (httpx.HTTPError, sqlite3.Error) as e:
+                self._failures += 1
+                logger.warning("Local search index sync failed: %s", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {
+            "path": self.path,
+            "ready": self.ready,
+            "pages": pages,
+            "syncs": self._syncs,
+            "failures": self._failures,
+            "queries": self._queries,
+            "lastSync": self._get_state("last_sync"),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,28 @@
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
+import logging
+import base64
+import hashlib
+import hmac
+import secrets
+import asyncio
+import contextlib
+import httpx
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+import time
 from fastmcp import FastMCP
-from typing import List, Dict, Any, Optional
+from fastmcp.server.middleware import Middleware
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from .transport import ConfluenceTransport, response_json
+from .extract import clean_html
+from .cache import PageCache
+from .patch import apply_operations
+from .metrics import metrics, span
+from .ratelimit import RateLimiter, current_session
+from .index import AllowedPageIndex
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 BASE_URL = os.environ.get("CONFLUENCE_BASE_URL", "").rstrip("/")
@@ -54,129 +73,581 @@ ALLOWED_SPACES = set(config.get("allowed_spaces", []))
 ALLOWED_PARENTS = {k: set(v) for k, v in config.get("allowed_parents", {}).items()}
 
 # Initialize FastMCP Server
-mcp = FastMCP("Confluence MCP Server")
+@contextlib.asynccontextmanager
+async def lifespan(server: FastMCP):
+    # The local search index syncs from startup, so it is (closer to) ready
+    # by the first backend="local" search
+    if local_index is not None:
+        local_index.start()
+    yield
+
+mcp = FastMCP("Confluence MCP Server", lifespan=lifespan)
+
+class ToolMetricsMiddleware(Middleware):
+    """
+    Times every tool call and, with tracing enabled, opens a span parented
+    on the trace context the agent sent in the request _meta.
+    """
+
+    @staticmethod
+    def _session_id(context) -> str:
+        try:
+            return context.fastmcp_context.session_id
+        except (AttributeError, RuntimeError):
+            return "unknown"
+
+    async def on_call_tool(self, context, call_next):
+        name = context.message.name
+        meta = context.message.meta
+        carrier = {k: v for k, v in meta.model_dump().items() if isinstance(v, str)} if meta else None
+        # Confluence requests made by this call queue under its MCP session
+        session = current_session.set(self._session_id(context))
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            with span(f"tool {name}", {"mcp.tool": name}, carrier):
+                return await call_next(context)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            current_session.reset(session)
+            metrics.observe("mcp_tool_seconds", time.perf_counter() - start, tool=name)
+            metrics.inc("mcp_tool_calls_total", tool=name, status=status)
+
+mcp.add_middleware(ToolMetricsMiddleware())
 
 def get_auth():
     return (EMAIL, API_TOKEN)
 
-def get_headers():
-    return {
-        "Accept": "application/json",
-        "Content-Type": "application/json"
-    }
+# Shared HTTP transport (keep-alive pool, timeouts, retries)
+# Every tool goes through this async client so TCP+TLS connections to
+# Confluence are reused (and multiplexed over HTTP/2) across calls, and a
+# slow request never blocks other tool calls on the same MCP session.
+transport = ConfluenceTransport(
+    BASE_URL,
+    get_auth(),
+    pool_size=int(os.environ.get("CONFLUENCE_POOL_SIZE", "10")),
+    timeout=float(os.environ.get("CONFLUENCE_TIMEOUT", "30")),
+    max_retries=int(os.environ.get("CONFLUENCE_MAX_RETRIES", "3")),
+    # Client-side rate limits (requests/second; 0 disables). Shared by every
+    # session this process serves, so most useful with the HTTP transport.
+    rate_limiter=RateLimiter(
+        read_rate=float(os.environ.get("CONFLUENCE_RATE_LIMIT_READ", "20")),
+        write_rate=float(os.environ.get("CONFLUENCE_RATE_LIMIT_WRITE", "5")),
+        burst_seconds=float(os.environ.get("CONFLUENCE_RATE_LIMIT_BURST", "2")),
+    ),
+)
 
-def clean_html(html_content: str) -> str:
-    if not html_content:
-        return ""
-    soup = BeautifulSoup(html_content, "html.parser")
-    return soup.get_text(separator="\n").strip()
+# Page cache shared by all page reads
+# Fresh entries (younger than the TTL) are served without a round trip;
+# stale ones are revalidated with a version-only probe before reuse.
+page_cache = PageCache(
+    max_entries=int(os.environ.get("CONFLUENCE_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.environ.get("CONFLUENCE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.environ.get("CONFLUENCE_CACHE_TTL", "30")),
+)
 
-@mcp.tool()
-def search_confluence(query: str) -> List[Dict[str, Any]]:
+# Index of every page under ALLOWED_PARENTS, built in the background on
+# first use so parent permission checks are local set lookups.
+page_index = AllowedPageIndex(
+    transport,
+    {k: v for k, v in ALLOWED_PARENTS.items() if k in ALLOWED_SPACES},
+    refresh_interval=float(os.environ.get("CONFLUENCE_INDEX_REFRESH", "300")),
+    full_rebuild_interval=float(os.environ.get("CONFLUENCE_INDEX_REBUILD", "3600")),
+)
+INDEX_ENABLED = os.environ.get("CONFLUENCE_INDEX", "1") != "0"
+
+# Expansions needed by every page read (get, prepare-merge, update checks)
+PAGE_EXPAND = "body.storage,space,version,metadata.labels"
+
+async def fetch_page(page_id: str) -> Dict[str, Any]:
     """
-    Search for Confluence pages using CQL.
-    Returns pages only from allowed spaces and within allowed parent hierarchies.
-    If a parent page is specified in config, all its descendants are automatically allowed.
+    Return the raw page payload (body, space, version, labels), using the page cache.
+    Concurrent misses for the same page share one request.
+    Raises httpx.HTTPError on HTTP errors.
+    """
+    url = f"/rest/api/content/{page_id}"
+
+    entry = page_cache.lookup(page_id)
+    if entry is not None:
+        if page_cache.is_fresh(entry):
+            return entry.data
+
+        # Stale: probe only the version number and reuse the body if unchanged
+        probe = await transport.get_json(url, params={"expand": "version"})
+        version = probe.get("version", {}).get("number")
+        entry = page_cache.revalidated(page_id, version)
+        if entry is not None:
+            return entry.data
+
+    async def load():
+        # Cached inside the shared request, so callers arriving just after it
+        # completes find the page in the cache instead of fetching it again
+        data = await transport.get_json(url, params={"expand": PAGE_EXPAND})
+        page_cache.put(page_id, data)
+        return data
+
+    return await transport.coalesce((url, "page"), load)
+
+# Pages per content/search request when fetching in batches
+BATCH_CHUNK_SIZE = 25
+
+async def _search_content_by_ids(page_ids: List[str], expand: str) -> List[Dict[str, Any]]:
+    """
+    Fetch many pages with `id in (...)` CQL, one request per chunk, chunks in parallel.
+    """
+    chunks = [page_ids[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(page_ids), BATCH_CHUNK_SIZE)]
+
+    async def fetch_chunk(chunk):
+        response = await transport.get(
+            "/rest/api/content/search",
+            params={"cql": f"id in ({', '.join(chunk)})", "expand": expand, "limit": len(chunk)}
+        )
+        response.raise_for_status()
+        return response_json(response).get("results", [])
+
+    results = []
+    for chunk_results in await asyncio.gather(*[fetch_chunk(c) for c in chunks]):
+        results.extend(chunk_results)
+    return results
+
+async def fetch_pages(page_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Batch version of fetch_page: returns {page_id: raw page payload} for every
+    id that exists and is visible. Uses the page cache; stale entries are
+    revalidated together in one version-only request per chunk.
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    stale: List[str] = []
+    missing: List[str] = []
+    for page_id in page_ids:
+        entry = page_cache.lookup(page_id)
+        if entry is None:
+            missing.append(page_id)
+        elif page_cache.is_fresh(entry):
+            found[page_id] = entry.data
+        else:
+            stale.append(page_id)
+
+    if stale:
+        versions = {
+            str(r.get("id")): r.get("version", {}).get("number")
+            for r in await _search_content_by_ids(stale, "version")
+        }
+        for page_id in stale:
+            entry = page_cache.revalidated(page_id, versions.get(page_id))
+            if entry is not None:
+                found[page_id] = entry.data
+            elif page_id in versions:
+                missing.append(page_id)
+
+    if missing:
+        for data in await _search_content_by_ids(missing, PAGE_EXPAND):
+            page_id = str(data.get("id"))
+            page_cache.put(page_id, data)
+            found[page_id] = data
+    return found
+
+def extract_labels(data: Dict[str, Any]) -> List[str]:
+    # The structure of labels might be different depending on expansion.
+    labels_data = data.get("metadata", {}).get("labels", {})
+    if isinstance(labels_data, dict):
+        labels_data = labels_data.get("results", [])
+
+    labels = []
+    for l in labels_data:
+        if isinstance(l, dict):
+            labels.append(l.get("name"))
+        elif isinstance(l, str):
+            labels.append(l)
+    return labels
+
+def is_raw_cql(query: str) -> bool:
+    return "=" in query or " IN " in query.upper()
+
+def build_search_cql(query: str) -> str:
+    """
+    Turn a user query (free text or raw CQL) into CQL restricted to the
+    allowed spaces and parent hierarchies.
     """
     # Build base CQL query
-    if "=" in query or " IN " in query.upper():
+    if is_raw_cql(query):
         # Assume raw CQL
         base_cql = f'({query}) AND type=page'
     else:
         # Simple text search
         base_cql = f'text~"{query}" AND type=page'
-    
-    # Build space filter
-    if ALLOWED_SPACES:
-        space_filter = " OR ".join([f'space = "{s}"' for s in ALLOWED_SPACES])
-        base_cql = f'{base_cql} AND ({space_filter})'
-    
-    # Build ancestor filter for each space
+    return add_scope_cql(base_cql)
+
+def add_scope_cql(base_cql: str, hierarchy: bool = True) -> str:
+    """
+    Restrict a CQL expression to the allowed spaces and parent hierarchies
+    (only to the spaces those hierarchies are in if hierarchy is False).
+    """
+    # Build space + ancestor filter
     # This allows any page that is either:
     # 1. One of the allowed parent pages (id in (...))
     # 2. A descendant of an allowed parent page (ancestor in (...))
-    ancestor_filters = []
-    for space_key, parent_ids in ALLOWED_PARENTS.items():
-        if parent_ids:
-            parent_list = ", ".join(parent_ids)
-            # Match pages that are either the parent itself OR have the parent as an ancestor
-            space_ancestor_filter = f'(space = "{space_key}" AND (id in ({parent_list}) OR ancestor in ({parent_list})))'
-            ancestor_filters.append(space_ancestor_filter)
+    # Page ids are global, so a single clause over all parents is equivalent
+    # to one clause per space and much cheaper for Confluence to evaluate.
+    # Spaces without configured parents are excluded when any parents exist.
+    space_keys = set(ALLOWED_SPACES)
+    parent_spaces = {k for k, v in ALLOWED_PARENTS.items() if v}
+    if parent_spaces:
+        space_keys = parent_spaces & space_keys if space_keys else parent_spaces
+        if not space_keys:
+            raise ValueError("None of the allowed spaces has allowed parent pages configured.")
     
-    if ancestor_filters:
-        ancestor_cql = " OR ".join(ancestor_filters)
-        cql = f'{base_cql} AND ({ancestor_cql})'
-    else:
-        cql = base_cql
+    if space_keys:
+        space_list = ", ".join(f'"{k}"' for k in sorted(space_keys))
+        base_cql = f'{base_cql} AND space in ({space_list})'
+    
+    if parent_spaces and hierarchy:
+        parent_ids = sorted({p for k in space_keys for p in ALLOWED_PARENTS.get(k, ())})
+        parent_list = ", ".join(parent_ids)
+        return f'{base_cql} AND (id in ({parent_list}) OR ancestor in ({parent_list}))'
+    return base_cql
+
+# Optional search result fields and the expansion each one needs.
+# content.space is always expanded so spaceKey never needs guessing.
+SEARCH_INCLUDES = {
+    "version": "content.version",
+    "labels": "content.metadata.labels",
+    "ancestors": "content.ancestors",
+}
+
+def search_expand(include: Optional[List[str]]) -> str:
+    include = include or []
+    unknown = [i for i in include if i not in SEARCH_INCLUDES]
+    if unknown:
+        raise ValueError(f"Unknown include field(s) {unknown} (use any of: {', '.join(SEARCH_INCLUDES)}).")
+    return ",".join(["content.space"] + [SEARCH_INCLUDES[i] for i in sorted(set(include))])
+
+def format_search_result(result: Dict[str, Any], include: Optional[List[str]] = None) -> Dict[str, Any]:
+    content = result.get("content", {})
     
-    url = f"{BASE_URL}/rest/api/search"
+    # Extract space key
+    # Method 1: content.space (always expanded)
+    space_key = content.get("space", {}).get("key")
     
-    try:
-        response = requests.get(
-            url,
-            auth=get_auth(),
-            params={"cql": cql, "limit": 50},
-            headers=get_headers()
-        )
-        response.raise_for_status()
-        data = response.json()
+    # Method 2: Fall back to parsing the display URL
+    if not space_key:
+        container = result.get("resultGlobalContainer", {})
+        for web_url in (container.get("displayUrl", ""), result.get("url", "")):
+            if "/spaces/" in web_url:
+                space_key = web_url.split("/spaces/")[1].split("/")[0]
+                break
         
-        results = []
-        for result in data.get("results", []):
-            # Extract space key
-            space_key = None
-            
-            # Method 1: Try resultGlobalContainer
-            container = result.get("resultGlobalContainer", {})
-            display_url = container.get("displayUrl", "")
-            if "/spaces/" in display_url:
-                parts = display_url.split("/spaces/")
-                if len(parts) > 1:
-                    space_key = parts[1].split("/")[0]
-            
-            # Method 2: Try URL if Method 1 failed
-            if not space_key:
-                web_url = result.get("url", "")
-                if "/spaces/" in web_url:
-                    parts = web_url.split("/spaces/")
-                    if len(parts) > 1:
-                        space_key = parts[1].split("/")[0]
+    page_id = content.get("id") or result.get("id")
+    
+    item = {
+        "id": str(page_id),
+        "title": result.get("title"),
+        "spaceKey": space_key,
+        "url": f"{BASE_URL}{result.get('url', '')}",
+        "excerpt": result.get("excerpt", "")
+    }
+    
+    include = include or []
+    if "version" in include:
+        version = content.get("version", {})
+        item["version"] = version.get("number")
+        item["lastModified"] = version.get("when") or result.get("lastModified")
+    if "labels" in include:
+        item["labels"] = extract_labels(content)
+    if "ancestors" in include:
+        item["ancestors"] = [
+            {"id": str(a.get("id")), "title": a.get("title")}
+            for a in content.get("ancestors", [])
+        ]
+    return item
+
+# Search pagination
+# Confluence paginates /rest/api/search with an opaque `cursor` plus a
+# `start` offset, both carried in `_links.next`. We hand them back to the
+# caller as a single opaque token.
+SEARCH_PAGE_SIZE = 50
+
+def encode_search_token(cursor: Optional[str], start: Optional[int]) -> str:
+    raw = json.dumps({"c": cursor, "s": start}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_search_token(token: str) -> Dict[str, Any]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid search cursor")
+    if not isinstance(raw, dict):
+        raise ValueError("Invalid search cursor")
+    params = {}
+    if raw.get("c"):
+        if not isinstance(raw["c"], str):
+            raise ValueError("Invalid search cursor")
+        params["cursor"] = raw["c"]
+    if raw.get("s") is not None:
+        try:
+            params["start"] = int(raw["s"])
+        except (ValueError, TypeError):
+            raise ValueError("Invalid search cursor")
+    return params
+
+def next_search_token(data: Dict[str, Any]) -> Optional[str]:
+    next_link = data.get("_links", {}).get("next")
+    if not next_link:
+        return None
+    query = parse_qs(urlparse(next_link).query)
+    cursor = query.get("cursor", [None])[0]
+    start = query.get("start", [None])[0]
+    if cursor is None and start is None:
+        return None
+    return encode_search_token(cursor, int(start) if start is not None else None)
+
+async def fetch_search_page(cql: str, limit: int, token: Optional[str] = None, expand: Optional[str] = None) -> Dict[str, Any]:
+    params = {"cql": cql, "limit": limit, "expand": expand or search_expand(None)}
+    if token:
+        params.update(decode_search_token(token))
+    return await transport.get_json("/rest/api/search", params=params)
+
+async def iter_search_pages(
+    cql: str,
+    max_results: Optional[int] = None,
+    page_size: int = SEARCH_PAGE_SIZE,
+    token: Optional[str] = None,
+    include: Optional[List[str]] = None,
+) -> AsyncIterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Lazily stream search results one page at a time.
+
+    Yields (results, next_token) tuples until Confluence runs out of results
+    or max_results have been produced. The request for the next page is
+    started before the current one is yielded, so it downloads while the
+    caller is processing.
+    """
+    remaining = max_results
+    page_size = max(1, page_size)
+    expand = search_expand(include)
+
+    def page_limit():
+        return page_size if remaining is None else min(page_size, remaining)
+
+    pending = asyncio.ensure_future(fetch_search_page(cql, page_limit(), token, expand))
+    try:
+        while pending is not None:
+            data = await pending
+            pending = None
             
-            # Method 3: Try content.space
-            if not space_key:
-                space_key = result.get("content", {}).get("space", {}).get("key")
-                
-            page_id = result.get("content", {}).get("id") or result.get("id")
+            results = [format_search_result(r, include) for r in data.get("results", [])]
+            if remaining is not None:
+                remaining -= len(results)
+            token = next_search_token(data)
             
-            results.append({
-                "id": str(page_id),
-                "title": result.get("title"),
-                "spaceKey": space_key,
-                "url": f"{BASE_URL}{result.get('url', '')}",
-                "excerpt": result.get("excerpt", "")
-            })
+            # Prefetch the next page before handing this one over
+            if token and results and (remaining is None or remaining > 0):
+                pending = asyncio.ensure_future(fetch_search_page(cql, page_limit(), token, expand))
             
+            yield results, token
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+# Next pages prefetched for search_confluence_paged, keyed by (cql, limit, expand, token).
+# Bounded so abandoned cursors don't pile up.
+_search_prefetch: "OrderedDict[Tuple[str, int, str, str], asyncio.Future]" = OrderedDict()
+SEARCH_PREFETCH_MAX = 16
+
+def _prefetch_search_page(cql: str, limit: int, expand: str, token: str):
+    key = (cql, limit, expand, token)
+    if key in _search_prefetch:
+        return
+    future = asyncio.ensure_future(fetch_search_page(cql, limit, token, expand))
+    # Mark failures as retrieved; the error resurfaces when the page is awaited.
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _search_prefetch[key] = future
+    while len(_search_prefetch) > SEARCH_PREFETCH_MAX:
+        _, stale = _search_prefetch.popitem(last=False)
+        stale.cancel()
+
+# Optional local full-text index (SQLite FTS5) of everything in scope.
+# Enabled by pointing CONFLUENCE_LOCAL_INDEX_PATH at a database file.
+local_index = None
+LOCAL_INDEX_PATH = os.environ.get("CONFLUENCE_LOCAL_INDEX_PATH")
+if LOCAL_INDEX_PATH:
+    # sqlite3 is only loaded when the local index is in use
+    from .search_index import LocalSearchIndex, fts5_available
+
+    if not fts5_available():
+        logger.warning("SQLite FTS5 is not available; local search index disabled")
+    else:
+        try:
+            local_index = LocalSearchIndex(
+                LOCAL_INDEX_PATH,
+                transport,
+                add_scope_cql("type=page"),
+                clean_html,
+                base_url=BASE_URL,
+                refresh_interval=float(os.environ.get("CONFLUENCE_LOCAL_INDEX_REFRESH", "600")),
+                full_sync_interval=float(os.environ.get("CONFLUENCE_LOCAL_INDEX_FULL_SYNC", "3600")),
+                space_cql=add_scope_cql("type=page", hierarchy=False),
+            )
+        except ValueError as e:
+            logger.warning("Local search index disabled: %s", e)
+
+async def index_locally(data: Dict[str, Any]):
+    """
+    Keep the local index current with our own writes. Only pages under the
+    allowed parents are indexed (write checks don't cover the hierarchy);
+    anything else is dropped so local search never returns it.
+    """
+    if local_index is None:
+        return
+    page_id = str(data.get("id"))
+    try:
+        denied = await check_parent_access(page_id)
+    except httpx.HTTPError as e:
+        logger.warning("Not indexing page %s locally, scope check failed: %s", page_id, e)
+        denied = True
+    if denied:
+        await asyncio.to_thread(local_index.remove, page_id)
+    else:
+        await asyncio.to_thread(local_index.put_page, data)
+
+@mcp.tool()
+async def search_confluence(query: str, max_results: int = 50, backend: str = "remote", include: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Search for Confluence pages using CQL.
+    Returns pages only from allowed spaces and within allowed parent hierarchies.
+    If a parent page is specified in config, all its descendants are automatically allowed.
+    Follows Confluence pagination until max_results pages have been collected.
+    backend="local" answers free-text queries from the server's local full-text
+    index (ranked, with snippets, no Confluence round trip) when it is enabled;
+    while the index is still being built it falls back to remote search.
+    include adds optional fields fetched in the same request: "version"
+    (version + lastModified), "labels", "ancestors" (remote backend only).
+    """
+    if backend == "local":
+        if local_index is None:
+            raise RuntimeError("Local search backend is not enabled (set CONFLUENCE_LOCAL_INDEX_PATH).")
+        if is_raw_cql(query):
+            raise RuntimeError("Local search backend only supports free-text queries, not CQL.")
+        local_index.start()
+        if local_index.ready:
+            return await asyncio.to_thread(local_index.search, query, max(1, max_results))
+        # An index still on its first sync would return too little; use CQL
+        logger.info("Local search index is still building; searching Confluence instead")
+        backend = "remote"
+    if backend != "remote":
+        raise RuntimeError(f"Unknown search backend '{backend}' (use 'remote' or 'local').")
+
+    try:
+        cql = build_search_cql(query)
+        results = []
+        async for page, _ in iter_search_pages(cql, max_results=max(1, max_results), include=include):
+            results.extend(page)
         return results
-    except requests.RequestException as e:
+    except ValueError as e:
+        raise RuntimeError(str(e))
+    except httpx.HTTPError as e:
         raise RuntimeError(f"Error searching Confluence: {str(e)}")
 
 @mcp.tool()
-def get_confluence_page(page_id: str) -> Dict[str, Any]:
+async def search_confluence_paged(query: str, cursor: Optional[str] = None, limit: int = 25, include: Optional[List[str]] = None) -> Dict[str, Any]:
     """
-    Get a Confluence page by ID, returning plain text content.
+    Search for Confluence pages one page of results at a time.
+    Same filtering and include fields as search_confluence. Pass the returned
+    nextCursor back (with the same query) to get the next page; nextCursor is
+    null when there are no more results.
     """
-    url = f"{BASE_URL}/rest/api/content/{page_id}"
-    params = {"expand": "body.storage,space"}
+    limit = max(1, limit)
     
     try:
-        response = requests.get(
-            url,
-            auth=get_auth(),
-            params=params,
-            headers=get_headers()
-        )
-        response.raise_for_status()
-        data = response.json()
+        cql = build_search_cql(query)
+        expand = search_expand(include)
+        pending = _search_prefetch.pop((cql, limit, expand, cursor), None) if cursor else None
+        if pending is not None:
+            data = await pending
+        else:
+            data = await fetch_search_page(cql, limit, cursor, expand)
+    except ValueError as e:
+        return {"error": str(e)}
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"Error searching Confluence: {str(e)}")
+    
+    next_cursor = next_search_token(data)
+    if next_cursor:
+        # Fetch the following page while the caller works on this one
+        _prefetch_search_page(cql, limit, expand, next_cursor)
+    
+    return {
+        "results": [format_search_result(r, include) for r in data.get("results", [])],
+        "nextCursor": next_cursor,
+        "totalSize": data.get("totalSize")
+    }
+
+# Page read formats
+# text/storage/both select which bodies are returned; summary returns only
+# metadata, body lengths and the start of the text.
+PAGE_FORMATS = ("text", "storage", "both", "summary")
+SUMMARY_CHARS = 500
+
+async def page_content_fields(body_html: str, format: str, max_chars: Optional[int], offset: int) -> Dict[str, Any]:
+    """
+    Build the body fields of a page read.
+
+    With max_chars/offset each returned body is sliced to
+    [offset, offset + max_chars) and nextOffset tells the caller where to
+    continue (null once everything has been returned).
+    """
+    if format not in PAGE_FORMATS:
+        raise ValueError(f"Unknown format '{format}' (use one of: {', '.join(PAGE_FORMATS)}).")
+
+    if format == "summary":
+        text = await asyncio.to_thread(clean_html, body_html)
+        summary = text[:SUMMARY_CHARS]
+        if len(text) > SUMMARY_CHARS:
+            summary += "..."
+        return {
+            "summary": summary,
+            "textLength": len(text),
+            "storageLength": len(body_html)
+        }
+
+    contents = {}
+    if format in ("text", "both"):
+        contents["textContent"] = await asyncio.to_thread(clean_html, body_html)
+    if format in ("storage", "both"):
+        contents["storageContent"] = body_html
+
+    if max_chars is None and not offset:
+        return contents
+
+    offset = max(0, offset)
+    end = offset + max(1, max_chars) if max_chars is not None else None
+    fields: Dict[str, Any] = {}
+    has_more = False
+    for key, value in contents.items():
+        fields[key] = value[offset:end]
+        if end is not None and end < len(value):
+            has_more = True
+    if "textContent" in contents:
+        fields["textLength"] = len(contents["textContent"])
+    if "storageContent" in contents:
+        fields["storageLength"] = len(body_html)
+    fields["offset"] = offset
+    fields["nextOffset"] = end if has_more else None
+    return fields
+
+@mcp.tool()
+async def get_confluence_page(page_id: str, format: str = "both", max_chars: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+    """
+    Get a Confluence page by ID, returning plain text content.
+    format: "text" (textContent only), "storage" (storageContent only), "both"
+    (default) or "summary" (metadata, lengths and the first few hundred characters).
+    For large pages pass max_chars to read a chunk; call again with
+    offset=nextOffset to continue.
+    """
+    try:
+        data = await fetch_page(page_id)
         
         space_key = data.get("space", {}).get("key")
         body_html = data.get("body", {}).get("storage", {}).get("value", "")
@@ -186,14 +657,57 @@ def get_confluence_page(page_id: str) -> Dict[str, Any]:
             "title": data.get("title"),
             "spaceKey": space_key,
             "url": f"{BASE_URL}{data.get('_links', {}).get('webui', '')}",
-            "textContent": clean_html(body_html),
-            "storageContent": body_html
+            **await page_content_fields(body_html, format, max_chars, offset)
         }
-    except requests.RequestException as e:
+    except ValueError as e:
         return {"error": str(e)}
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+
+# Upper bound on ids per get_confluence_pages call
+MAX_BATCH_PAGES = 100
 
 @mcp.tool()
-def create_confluence_page(space_key: str, parent_id: str, title: str, body: str) -> Dict[str, Any]:
+async def get_confluence_pages(page_ids: List[str], format: str = "text", max_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Get many Confluence pages in one call (far fewer HTTP requests than
+    calling get_confluence_page for each). Results are returned in the same
+    order as page_ids; ids that can't be read get an entry with an "error".
+    format and max_chars work as in get_confluence_page (default "text").
+    """
+    if len(page_ids) > MAX_BATCH_PAGES:
+        return [{"error": f"At most {MAX_BATCH_PAGES} page ids per call."}]
+    if format not in PAGE_FORMATS:
+        return [{"error": f"Unknown format '{format}' (use one of: {', '.join(PAGE_FORMATS)})."}]
+
+    # Only numeric ids can go into the CQL id list
+    valid_ids = list(dict.fromkeys(str(p) for p in page_ids if str(p).isdigit()))
+    try:
+        pages = await fetch_pages(valid_ids) if valid_ids else {}
+    except httpx.HTTPError as e:
+        return [{"id": str(p), "error": str(e)} for p in page_ids]
+
+    results = []
+    for page_id in map(str, page_ids):
+        data = pages.get(page_id)
+        if not page_id.isdigit():
+            results.append({"id": page_id, "error": "Invalid page id."})
+            continue
+        if data is None:
+            results.append({"id": page_id, "error": "Page not found or not accessible."})
+            continue
+        body_html = data.get("body", {}).get("storage", {}).get("value", "")
+        results.append({
+            "id": data.get("id"),
+            "title": data.get("title"),
+            "spaceKey": data.get("space", {}).get("key"),
+            "url": f"{BASE_URL}{data.get('_links', {}).get('webui', '')}",
+            **await page_content_fields(body_html, format, max_chars, 0)
+        })
+    return results
+
+@mcp.tool()
+async def create_confluence_page(space_key: str, parent_id: str, title: str, body: str) -> Dict[str, Any]:
     """
     Create a new Confluence page in a restricted set of spaces and parents.
     Automatically applies 'ai-generated' label.
@@ -206,7 +720,7 @@ def create_confluence_page(space_key: str, parent_id: str, title: str, body: str
     if parent_id not in allowed_parents:
         return {"error": f"Parent ID '{parent_id}' is not allowed for space '{space_key}'."}
 
-    url = f"{BASE_URL}/rest/api/content"
+    url = "/rest/api/content"
     payload = {
         "type": "page",
         "title": title,
@@ -226,134 +740,307 @@ def create_confluence_page(space_key: str, parent_id: str, title: str, body: str
     }
     
     try:
-        response = requests.post(
+        response = await transport.post(
             url,
-            auth=get_auth(),
-            json=payload,
-            headers=get_headers()
+            json=payload
         )
         response.raise_for_status()
-        data = response.json()
+        data = response_json(response)
+        
+        # Seed the page cache so the usual follow-up read is free
+        if data.get("id"):
+            page_index.add(str(data["id"]), title, parent_id, space_key)
+            created = {
+                **data,
+                "title": data.get("title", title),
+                "space": data.get("space") or {"key": space_key},
+                "body": {"storage": {"value": body, "representation": "storage"}},
+                "metadata": {"labels": {"results": [{"prefix": "global", "name": "ai-managed"}]}},
+            }
+            page_cache.put(str(data["id"]), created)
+            await index_locally(created)
         
         return {
             "id": data.get("id"),
             "spaceKey": space_key,
             "url": f"{BASE_URL}{data.get('_links', {}).get('webui', '')}"
         }
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         return {"error": str(e)}
 
+def update_access_error(data: Dict[str, Any], action: str = "modified") -> Optional[str]:
+    """
+    Why the page in `data` may not be modified, or None if it may.
+    `action` names what was refused in the space error.
+    """
+    space_key = data.get("space", {}).get("key")
+    if space_key not in ALLOWED_SPACES:
+        return f"Page in space '{space_key}' cannot be {action} (space not allowed)."
+    labels = extract_labels(data)
+    if "ai-generated" not in labels and "ai-managed" not in labels:
+        return "Page does not have required 'ai-generated' or 'ai-managed' labels."
+    return None
+
+async def saved_write(page_id: str, version: int, body: str) -> Optional[Dict[str, Any]]:
+    """
+    The latest page payload if it is `version` with exactly `body`, i.e. a
+    write that reported failure was saved after all; otherwise None.
+    """
+    try:
+        latest = await fetch_page(page_id)
+    except httpx.HTTPError:
+        return None
+    if latest.get("version", {}).get("number") != version:
+        return None
+    if latest.get("body", {}).get("storage", {}).get("value") != body:
+        return None
+    return latest
+
+async def put_page_body(page_id: str, current_data: Dict[str, Any], body: str) -> Dict[str, Any]:
+    """
+    Write `body` as the next version of the page last read as `current_data`,
+    then refresh the page cache and local index with it. Returns the update
+    response. Raises httpx.HTTPError (409 if the page changed since the read),
+    unless the page turns out to hold this write anyway.
+    """
+    current_version = current_data.get("version", {}).get("number", 1)
+    payload = {
+        "id": page_id,
+        "type": "page",
+        "title": current_data.get("title"),
+        "space": {"key": current_data.get("space", {}).get("key")},
+        "body": {
+            "storage": {
+                "value": body,
+                "representation": "storage"
+            }
+        },
+        "version": {
+            "number": current_version + 1
+        }
+    }
+
+    url_put = f"/rest/api/content/{page_id}"
+    try:
+        response_put = await transport.put(
+            url_put,
+            json=payload
+        )
+        response_put.raise_for_status()
+        data = response_json(response_put)
+    except httpx.HTTPError as e:
+        page_cache.invalidate(page_id)
+        # A write that timed out or failed with a 5xx may have been saved
+        # anyway, and a 409 may be such a write replayed on the way
+        status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+        if status is not None and status != 409 and status < 500:
+            raise
+        data = await saved_write(page_id, current_version + 1, body)
+        if data is None:
+            raise
+    finally:
+        # Whatever happened, the cached copy can no longer be trusted
+        page_cache.invalidate(page_id)
+
+    # Populate the cache with what we just wrote
+    updated = {
+        **current_data,
+        "body": {"storage": {"value": body, "representation": "storage"}},
+        "version": data.get("version") or {"number": current_version + 1},
+        "_links": data.get("_links", current_data.get("_links", {})),
+    }
+    page_cache.put(page_id, updated)
+    await index_locally(updated)
+    return data
+
+# Update tokens
+# prepare_confluence_page_merge_update hands back a signed token carrying
+# what the update needs (version, space, title, labels), so the update can
+# skip its own pre-fetch. Tokens are only accepted by the process that
+# issued them unless CONFLUENCE_UPDATE_TOKEN_SECRET is shared (e.g. across
+# HTTP workers).
+UPDATE_TOKEN_SECRET = os.environ.get("CONFLUENCE_UPDATE_TOKEN_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+UPDATE_TOKEN_TTL = float(os.environ.get("CONFLUENCE_UPDATE_TOKEN_TTL", "600"))
+
+def _sign(raw: bytes) -> str:
+    digest = hmac.new(UPDATE_TOKEN_SECRET, raw, hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+def encode_update_token(data: Dict[str, Any]) -> str:
+    raw = json.dumps({
+        "p": str(data.get("id")),
+        "v": data.get("version", {}).get("number"),
+        "s": data.get("space", {}).get("key"),
+        "t": data.get("title"),
+        "l": extract_labels(data),
+        "u": data.get("_links", {}).get("webui", ""),
+        "e": int(time.time() + UPDATE_TOKEN_TTL),
+    }, separators=(",", ":")).encode("utf-8")
+    return f"{base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')}.{_sign(raw)}"
+
+def decode_update_token(token: str, page_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The page metadata (as a partial page payload) carried by a valid,
+    unexpired token for page_id, or None.
+    """
+    try:
+        encoded, signature = token.split(".", 1)
+        raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if not hmac.compare_digest(signature, _sign(raw)):
+        return None
+    claims = json.loads(raw)
+    if claims.get("p") != str(page_id) or claims.get("e", 0) < time.time():
+        return None
+    return {
+        "id": claims["p"],
+        "title": claims.get("t"),
+        "space": {"key": claims.get("s")},
+        "version": {"number": claims.get("v")},
+        "metadata": {"labels": {"results": [{"prefix": "global", "name": l} for l in claims.get("l", [])]}},
+        "_links": {"webui": claims.get("u", "")},
+    }
+
 @mcp.tool()
-def update_confluence_page_full(page_id: str, body: str) -> Dict[str, Any]:
+async def update_confluence_page_full(page_id: str, body: str, update_token: Optional[str] = None) -> Dict[str, Any]:
     """
     Overwrite a Confluence page's body. 
     Only allowed if the page is in an allowed space and has 'ai-generated' or 'ai-managed' labels.
+    Pass the updateToken returned by prepare_confluence_page_merge_update to
+    save a round trip; if the page changed since then the update is refused
+    and the page must be prepared and merged again.
     """
-    # 1. Fetch current info to check permissions and get version
-    url_get = f"{BASE_URL}/rest/api/content/{page_id}"
-    params = {"expand": "body.storage,space,version,metadata.labels"}
+    # 1. Page info from the token, or fetched to check permissions and get the version
+    current_data = decode_update_token(update_token, page_id) if update_token else None
     
     try:
-        response = requests.get(
-            url_get,
-            auth=get_auth(),
-            params=params,
-            headers=get_headers()
-        )
-        response.raise_for_status()
-        current_data = response.json()
-        
-        # 2. Check permissions
-        space_key = current_data.get("space", {}).get("key")
-        if space_key not in ALLOWED_SPACES:
-            return {"error": f"Page in space '{space_key}' cannot be modified (space not allowed)."}
-        
-        # Robust label extraction
-        # The structure of labels might be different depending on expansion.
-        labels_data = current_data.get("metadata", {}).get("labels", {}).get("results", [])
-        
-        # Fallback if it's a list directly
-        if isinstance(current_data.get("metadata", {}).get("labels"), list):
-             labels_data = current_data.get("metadata", {}).get("labels")
-        
-        labels = []
-        for l in labels_data:
-            if isinstance(l, dict):
-                labels.append(l.get("name"))
-            elif isinstance(l, str):
-                labels.append(l)
-
-        if "ai-generated" not in labels and "ai-managed" not in labels:
-            return {"error": "Page does not have required 'ai-generated' or 'ai-managed' labels."}
+        if current_data is None:
+            url_get = f"/rest/api/content/{page_id}"
+            params = {"expand": PAGE_EXPAND}
+            response = await transport.get(
+                url_get,
+                params=params
+            )
+            response.raise_for_status()
+            current_data = response_json(response)
             
-        # 3. Prepare update payload
-        current_version = current_data.get("version", {}).get("number", 1)
-        current_title = current_data.get("title")
+            # 2. Check permissions (a token certifies they passed at prepare time)
+            error = update_access_error(current_data)
+            if error:
+                return {"error": error}
         
-        payload = {
-            "id": page_id,
-            "type": "page",
-            "title": current_title,
-            "space": {"key": space_key},
-            "body": {
-                "storage": {
-                    "value": body,
-                    "representation": "storage"
-                }
-            },
-            "version": {
-                "number": current_version + 1
+        # 3. Write the new body as the next version
+        try:
+            data = await put_page_body(page_id, current_data, body)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 409:
+                raise
+            # Someone else saved in between: the merge was based on old content
+            latest = await fetch_page(page_id)
+            return {
+                "error": (
+                    f"Page changed since it was read (version {current_data.get('version', {}).get('number')} "
+                    f"-> {latest.get('version', {}).get('number')}). Call prepare_confluence_page_merge_update "
+                    "again and merge into the latest content."
+                )
             }
-        }
-        
-        # 4. Perform update
-        url_put = f"{BASE_URL}/rest/api/content/{page_id}"
-        response_put = requests.put(
-            url_put,
-            auth=get_auth(),
-            json=payload,
-            headers=get_headers()
-        )
-        response_put.raise_for_status()
-        data = response_put.json()
         
         return {
             "id": data.get("id"),
-            "spaceKey": space_key,
+            "spaceKey": current_data.get("space", {}).get("key"),
             "url": f"{BASE_URL}{data.get('_links', {}).get('webui', '')}"
         }
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def prepare_confluence_page_merge_update(page_id: str) -> Dict[str, Any]:
+async def patch_confluence_page(page_id: str, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Edit part of a page without resending its whole body. Operations are
+    applied in order to the current storage body on the server, then the
+    result is saved as one update; if any operation fails nothing is saved.
+    Same access rules as update_confluence_page_full.
+    Each operation is an object with "op" and:
+    - replace_section: heading, content  (replaces everything under the heading,
+      up to the next heading of the same or higher level; the heading stays)
+    - append_to_section: heading, content
+    - delete_section: heading  (removes the heading and its content)
+    - append: content  (end of the page)
+    - append_table_row: content ("<tr>...</tr>") and heading (first table under
+      it) and/or index (0-based table number, default 0)
+    - replace_element / delete_element: tag (e.g. "table", "ul", "ac:structured-macro"),
+      index (0-based, default 0), optional heading to count within that section,
+      content (replace only)
+    - replace_text: find, replace, optional all=true  (exact storage-format text)
+    Headings match on their text, ignoring case and spacing; when a heading
+    text repeats, add occurrence (1-based). content is storage-format markup.
+    """
+    if not operations:
+        return {"error": "No operations given."}
+    
+    try:
+        # A stale cached body makes the update fail with 409; the operations
+        # are then re-applied once to the latest version. (put_page_body
+        # already returns success if the page holds what this call wrote,
+        # so they are never applied twice.)
+        for attempt in range(2):
+            # 1. Current page (from the page cache when fresh)
+            current_data = await fetch_page(page_id)
+            
+            # 2. Check permissions
+            error = update_access_error(current_data)
+            if error:
+                return {"error": error}
+            
+            # 3. Apply the operations locally
+            body = current_data.get("body", {}).get("storage", {}).get("value", "")
+            new_body = await asyncio.to_thread(apply_operations, body, operations)
+            if new_body == body:
+                return {"id": page_id, "changed": False, "version": current_data.get("version", {}).get("number")}
+            
+            # 4. Save the result as the next version
+            try:
+                data = await put_page_body(page_id, current_data, new_body)
+                break
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 409 or attempt:
+                    raise
+        
+        return {
+            "id": data.get("id"),
+            "spaceKey": current_data.get("space", {}).get("key"),
+            "url": f"{BASE_URL}{data.get('_links', {}).get('webui', '')}",
+            "version": data.get("version", {}).get("number"),
+            "changed": True,
+            "storageLength": len(new_body),
+            "previousStorageLength": len(body)
+        }
+    
+    except ValueError as e:
+        return {"error": str(e)}
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+
+@mcp.tool()
+async def prepare_confluence_page_merge_update(page_id: str, format: str = "both", max_chars: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
     """
     Retrieve page content and metadata for merging. 
     Enforces the same access control as updates (allowed space + AI labels).
+    format, max_chars and offset work as in get_confluence_page.
+    Pass the returned updateToken to update_confluence_page_full.
     """
-    url = f"{BASE_URL}/rest/api/content/{page_id}"
-    params = {"expand": "body.storage,space,version,metadata.labels"}
-    
     try:
-        response = requests.get(
-            url,
-            auth=get_auth(),
-            params=params,
-            headers=get_headers()
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = await fetch_page(page_id)
         
         # Check permissions
-        space_key = data.get("space", {}).get("key")
-        if space_key not in ALLOWED_SPACES:
-            return {"error": f"Page in space '{space_key}' cannot be prepared for merge (space not allowed)."}
-            
-        labels = [l.get("name") for l in data.get("metadata", {}).get("labels", [])]
-        if "ai-generated" not in labels and "ai-managed" not in labels:
-            return {"error": "Page does not have required 'ai-generated' or 'ai-managed' labels."}
+        error = update_access_error(data, action="prepared for merge")
+        if error:
+            return {"error": error}
             
+        space_key = data.get("space", {}).get("key")
+        labels = extract_labels(data)
         body_html = data.get("body", {}).get("storage", {}).get("value", "")
         
         return {
@@ -363,67 +1050,92 @@ def prepare_confluence_page_merge_update(page_id: str) -> Dict[str, Any]:
             "url": f"{BASE_URL}{data.get('_links', {}).get('webui', '')}",
             "labels": labels,
             "version": data.get("version", {}).get("number"),
-            "textContent": clean_html(body_html),
-            "storageContent": body_html
+            "updateToken": encode_update_token(data),
+            **await page_content_fields(body_html, format, max_chars, offset)
         }
         
-    except requests.RequestException as e:
+    except ValueError as e:
+        return {"error": str(e)}
+    except httpx.HTTPError as e:
         return {"error": str(e)}
 
+async def check_parent_access(page_id: str) -> Optional[str]:
+    """
+    Verify a page is in an allowed space and is (or descends from) an allowed parent.
+    Returns an error message, or None if access is allowed.
+    Raises httpx.HTTPError if the page can't be fetched.
+    """
+    # Fast path: pages in the local index are known to be allowed
+    if INDEX_ENABLED:
+        page_index.start()
+        if page_index.contains(page_id):
+            return None
+
+    url_parent = f"/rest/api/content/{page_id}"
+    parent_data = await transport.get_json(
+        url_parent,
+        params={"expand": "ancestors,space"}
+    )
+    
+    space_key = parent_data.get("space", {}).get("key")
+    if space_key not in ALLOWED_SPACES:
+        return f"Space '{space_key}' not allowed"
+
+    allowed_ids = ALLOWED_PARENTS.get(space_key, set())
+    
+    # Check if parent itself is allowed or is a descendant of an allowed page
+    ancestors = parent_data.get("ancestors", [])
+    ancestor_ids = {a.get("id") for a in ancestors}
+    if page_id in allowed_ids or ancestor_ids.intersection(allowed_ids):
+        # Not indexed yet (e.g. created since the last sync); remember it
+        parent_id = ancestors[-1].get("id") if ancestors else None
+        page_index.add(page_id, parent_data.get("title"), parent_id, space_key)
+        return None
+    return "Parent page is not accessible under current permissions"
+
+CHILDREN_PAGE_SIZE = 100
+
+async def fetch_children(page_id: str, max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Return the raw child pages of page_id, following start/limit pagination.
+    """
+    url_children = f"/rest/api/content/{page_id}/child/page"
+    children = []
+    start = 0
+    while max_results is None or len(children) < max_results:
+        limit = CHILDREN_PAGE_SIZE
+        if max_results is not None:
+            limit = min(limit, max_results - len(children))
+        data = await transport.get_json(
+            url_children,
+            params={"start": start, "limit": limit}
+        )
+        
+        results = data.get("results", [])
+        children.extend(results)
+        if not results or not data.get("_links", {}).get("next") or len(results) < limit:
+            break
+        start += len(results)
+    return children
+
 @mcp.tool()
-def get_confluence_children(page_id: str) -> List[Dict[str, Any]]:
+async def get_confluence_children(page_id: str, max_results: int = 200) -> List[Dict[str, Any]]:
     """
     Get direct child pages of a specific page.
     Useful for navigating the hierarchy when search is unreliable.
     """
     # 1. Verify access to the parent page first
-    url_parent = f"{BASE_URL}/rest/api/content/{page_id}"
     try:
-        response = requests.get(
-            url_parent,
-            auth=get_auth(),
-            params={"expand": "ancestors,space"},
-            headers=get_headers()
-        )
-        response.raise_for_status()
-        parent_data = response.json()
-        
-        space_key = parent_data.get("space", {}).get("key")
-        if space_key not in ALLOWED_SPACES:
-             return [{"error": f"Space '{space_key}' not allowed"}]
-
-        allowed_ids = ALLOWED_PARENTS.get(space_key, set())
-        
-        # Check if parent itself is allowed or is a descendant of an allowed page
-        is_allowed = False
-        if page_id in allowed_ids:
-            is_allowed = True
-        else:
-            ancestors = parent_data.get("ancestors", [])
-            ancestor_ids = {a.get("id") for a in ancestors}
-            if ancestor_ids.intersection(allowed_ids):
-                is_allowed = True
-        
-        if not is_allowed:
-             return [{"error": "Parent page is not accessible under current permissions"}]
-
-    except requests.RequestException as e:
+        error = await check_parent_access(page_id)
+        if error:
+            return [{"error": error}]
+    except httpx.HTTPError as e:
         return [{"error": f"Error verifying parent page: {str(e)}"}]
 
     # 2. Fetch Children
-    url_children = f"{BASE_URL}/rest/api/content/{page_id}/child/page"
     try:
-        response = requests.get(
-            url_children,
-            auth=get_auth(),
-            params={"limit": 50},
-            headers=get_headers()
-        )
-        response.raise_for_status()
-        data = response.json()
-        
         results = []
-        for result in data.get("results", []):
+        for result in await fetch_children(page_id, max_results=max(1, max_results)):
             results.append({
                 "id": result.get("id"),
                 "title": result.get("title"),
@@ -431,7 +1143,124 @@ def get_confluence_children(page_id: str) -> List[Dict[str, Any]]:
             })
         return results
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         return [{"error": f"Error fetching children: {str(e)}"}]
 
+# Child listings run concurrently (a batch of nodes at a time) while walking a tree
+TREE_CONCURRENCY = int(os.environ.get("CONFLUENCE_TREE_CONCURRENCY", "8"))
+
+@mcp.tool()
+async def get_confluence_tree(page_id: str, max_depth: int = 3, max_pages: int = 500) -> Dict[str, Any]:
+    """
+    Get the page hierarchy under a page as a nested tree of {id, title, children}.
+    Walks breadth-first up to max_depth levels below the page (deeper pages are
+    not listed) and stops after max_pages pages, setting "truncated" to true.
+    Prefer this over repeated get_confluence_children calls for whole sections.
+    """
+    # Access is checked once at the root; everything below it inherits it.
+    try:
+        error = await check_parent_access(page_id)
+        if error:
+            return {"error": error}
+        # The access check leaves the root in the page index; only the title
+        # is needed, so fall back to a request without any expansions
+        indexed = page_index.get(page_id)
+        if indexed is not None and indexed.title is not None:
+            title = indexed.title
+        else:
+            title = (await transport.get_json(f"/rest/api/content/{page_id}")).get("title")
+    except httpx.HTTPError as e:
+        return {"error": f"Error verifying parent page: {str(e)}"}
+
+    root = {"id": page_id, "title": title}
+    batch_size = max(1, TREE_CONCURRENCY)
+    max_pages = max(1, max_pages)
+    count = 1
+    truncated = False
+
+    level = [root]
+    depth = 0
+    try:
+        while level and depth < max_depth and not truncated:
+            next_level = []
+            # A level is listed a batch at a time, so no listings are started
+            # once the budget is spent
+            for i in range(0, len(level), batch_size):
+                batch = level[i:i + batch_size]
+                # No node can add more than the remaining budget; one extra
+                # child tells us the tree was truncated
+                limit = max_pages - count + 1
+                listings = await asyncio.gather(*[fetch_children(node["id"], max_results=limit) for node in batch])
+                for node, children in zip(batch, listings):
+                    for child in children:
+                        if count >= max_pages:
+                            truncated = True
+                            break
+                        child_node = {"id": child.get("id"), "title": child.get("title")}
+                        node.setdefault("children", []).append(child_node)
+                        next_level.append(child_node)
+                        count += 1
+                    if truncated:
+                        break
+                if truncated:
+                    break
+            level = next_level
+            depth += 1
+    except httpx.HTTPError as e:
+        return {"error": f"Error fetching children: {str(e)}"}
+
+    return {
+        "tree": root,
+        "pageCount": count,
+        "truncated": truncated
+    }
+
+def server_stats() -> Dict[str, Any]:
+    stats = {
+        "http": transport.stats(),
+        "rateLimit": transport.rate_limiter.stats(),
+        "cache": page_cache.stats(),
+        "index": page_index.stats(),
+        **metrics.snapshot(),
+    }
+    if local_index is not None:
+        stats["localIndex"] = local_index.stats()
+    return stats
+
+def stats_gauges() -> Dict[str, float]:
+    """
+    Numeric component stats (connection reuse, cache hit ratio, index size)
+    as flat Prometheus gauge names.
+    """
+    gauges = {}
+    components = {
+        "http": transport.stats(),
+        "rate_limit": transport.rate_limiter.stats(),
+        "cache": page_cache.stats(),
+        "index": page_index.stats(),
+    }
+    for component, values in components.items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                name = "".join(f"_{c.lower()}" if c.isupper() else c for c in key)
+                gauges[f"confluence_{component}_{name}"] = float(value)
+    return gauges
+
+@mcp.tool()
+async def get_server_stats(format: str = "json") -> Dict[str, Any]:
+    """
+    Server instrumentation: per-tool and per-Confluence-endpoint latency
+    (p50/p95/p99), HTTP status counts, retries, bytes in/out, JSON decode and
+    clean_html timings, connection reuse and page cache hit ratio.
+    format="prometheus" returns the same data as Prometheus text under "text".
+    """
+    if format == "prometheus":
+        return {"text": metrics.prometheus(stats_gauges())}
+    return server_stats()
+
+# Prometheus scrape endpoint when serving over HTTP/SSE
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    from starlette.responses import PlainTextResponse
 
+    return PlainTextResponse(metrics.prometheus(stats_gauges()), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,283 @@
+import asyncio
+import email.utils
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from .metrics import endpoint_template, metrics, span
+
+if TYPE_CHECKING:
+    from .ratelimit import RateLimiter
+
+# Status codes that are worth retrying. 429 means we were throttled and the
+# request was never processed; the 5xx family are transient server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Methods that are safe to replay after a 5xx or a dropped connection.
+# POST (page creation) and PUT (page update) are only retried on 429, where
+# Confluence guarantees the request was rejected before doing any work. A
+# page update that timed out may still have been saved, and replaying it
+# then fails with a 409 that looks like someone else's edit; callers check
+# what was saved instead (see server.put_page_body).
+IDEMPOTENT_METHODS = {"GET", "HEAD", "DELETE", "OPTIONS"}
+
+
+def response_json(response: httpx.Response) -> Any:
+    """
+    Decode a JSON response body, timing the decode.
+    """
+    with metrics.timer("confluence_json_decode_seconds"):
+        return response.json()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date) into seconds.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ConfluenceTransport:
+    """
+    Shared async HTTP transport for all Confluence REST calls.
+
+    Wraps a single httpx.AsyncClient so connections are kept alive (and, over
+    HTTP/2, multiplexed) across tool calls, applies a default per-request
+    timeout, and retries throttled or failed requests with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: Tuple[str, str],
+        pool_size: int = 10,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        http2: bool = True,
+        rate_limiter: Optional["RateLimiter"] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.auth = auth
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        # HTTP/2 needs the optional h2 package (httpx[http2]); fall back to
+        # HTTP/1.1 keep-alive if it is missing.
+        self.http2 = http2 and http2_available()
+        # Every attempt (retries included) waits for a token first
+        self.rate_limiter = rate_limiter
+
+        self._client: Optional[httpx.AsyncClient] = None
+        # In-flight coalesced calls, keyed by (path, ...)
+        self._inflight: Dict[Tuple[Any, ...], asyncio.Task] = {}
+
+        self._requests = 0
+        self._coalesced = 0
+        self._retries = 0
+        self._errors = 0
+        self._connections_opened = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the server's running event loop.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                auth=self.auth,
+                headers={
+                    "Accept": "application/json",
+                    "Content-Type": "application/json"
+                },
+                timeout=self.timeout,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                ),
+            )
+        return self._client
+
+    def url(self, path: str) -> str:
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}{path}"
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        # httpcore emits this once per newly established TCP connection;
+        # any request that doesn't trigger it rode an existing connection.
+        if event_name == "connection.connect_tcp.complete":
+            self._connections_opened += 1
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        return min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+
+    def _should_retry(self, method: str, status: Optional[int]) -> bool:
+        if status is None:
+            # Connection-level failure
+            return method in IDEMPOTENT_METHODS
+        if status not in RETRY_STATUSES:
+            return False
+        return status == 429 or method in IDEMPOTENT_METHODS
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request through the pooled client.
+
+        Retries on 429, and on 5xx or transport errors for idempotent
+        methods, up to max_retries times. The final response is returned as-is; callers
+        are expected to call raise_for_status() themselves.
+        """
+        method = method.upper()
+        url = self.url(path)
+        endpoint = endpoint_template(path)
+        extensions = kwargs.pop("extensions", {})
+        extensions.setdefault("trace", self._trace)
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire(method)
+            self._requests += 1
+            start = time.perf_counter()
+            try:
+                with span("confluence " + method, {"http.method": method, "http.route": endpoint}) as current:
+                    response = await self.client.request(method, url, extensions=extensions, **kwargs)
+                    if current is not None:
+                        current.set_attribute("http.status_code", response.status_code)
+            except httpx.TransportError:
+                metrics.observe("confluence_request_seconds", time.perf_counter() - start, method=method, endpoint=endpoint)
+                metrics.inc("confluence_responses_total", method=method, endpoint=endpoint, status="error")
+                if attempt >= self.max_retries or not self._should_retry(method, None):
+                    self._errors += 1
+                    raise
+                delay = self._backoff(attempt, None)
+            else:
+                self._record(method, endpoint, response, time.perf_counter() - start)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.observe(method, response)
+                if attempt >= self.max_retries or not self._should_retry(method, response.status_code):
+                    return response
+                delay = self._backoff(attempt, response)
+                await response.aclose()
+
+            self._retries += 1
+            metrics.inc("confluence_retries_total", method=method, endpoint=endpoint)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _record(self, method: str, endpoint: str, response: httpx.Response, seconds: float):
+        metrics.observe("confluence_request_seconds", seconds, method=method, endpoint=endpoint)
+        metrics.inc("confluence_responses_total", method=method, endpoint=endpoint, status=response.status_code)
+        metrics.inc("confluence_bytes_received_total", len(response.content), endpoint=endpoint)
+        metrics.inc("confluence_bytes_sent_total", len(response.request.content or b""), endpoint=endpoint)
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path: str, **kwargs: Any) -> httpx.Response:
+        try:
+            return await self.request("PUT", path, **kwargs)
+        finally:
+            # Reads of this path that started before the write finished may
+            # return the old content; don't hand them to new callers
+            for key in [k for k in self._inflight if k[0] == path]:
+                del self._inflight[key]
+
+    async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        GET path and return the decoded JSON body. Raises httpx.HTTPError
+        like get() followed by raise_for_status().
+
+        Identical concurrent calls (same path and params) are coalesced:
+        callers that arrive while a request is in flight wait for it and
+        share its decoded result (which they must not modify) instead of
+        sending their own.
+        """
+        key = (path, tuple(sorted((k, str(v)) for k, v in (params or {}).items())))
+        return await self.coalesce(key, lambda: self._get_json(path, params))
+
+    async def coalesce(self, key: Tuple[Any, ...], factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory() unless a call with the same key is already in flight,
+        in which case wait for that one's result. key[0] is the path a PUT
+        invalidates. Work the caller would do with the result (e.g. caching
+        it) belongs inside factory, so it is done before the key is released.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish_inflight(key, t))
+        else:
+            self._coalesced += 1
+            metrics.inc("confluence_coalesced_total", endpoint=endpoint_template(key[0]))
+        # Shielded so a cancelled caller doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _get_json(self, path: str, params: Optional[Dict[str, Any]]) -> Any:
+        response = await self.get(path, params=params)
+        response.raise_for_status()
+        return response_json(response)
+
+    def _finish_inflight(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark failures as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return request and connection counters.
+
+        connectionsOpened is the number of TCP connections that had to be
+        established; every other request was served on a reused keep-alive
+        (or multiplexed HTTP/2) connection. coalesced counts get_json calls
+        that shared another call's in-flight request.
+        """
+        return {
+            "http2": self.http2,
+            "requests": self._requests,
+            "retries": self._retries,
+            "errors": self._errors,
+            "coalesced": self._coalesced,
+            "connectionsOpened": self._connections_opened,
+            "connectionsReused": max(0, self._requests - self._errors - self._connections_opened),
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
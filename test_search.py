@@ -1,5 +1,6 @@
 import os
 import sys
+import asyncio
 from dotenv import load_dotenv
 
 # Add project root to path
@@ -7,23 +8,24 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), ".")))
 
 load_dotenv()
 
-from src.confluence_mcp.server import search_confluence
+from src.confluence_mcp.server import search_confluence, transport
 
-# Test searches
-print("=" * 80)
-print("Testing search for 'docker'")
-print("=" * 80)
-results = search_confluence("docker")
-print(f"\nFound {len(results)} results:")
-for r in results:
-    print(f" - {r['title']} (ID: {r['id']})")
-    print(f"   URL: {r['url']}")
+async def main():
+    # One event loop for all searches: the server's pooled HTTP client binds
+    # to the loop it is first used on
+    try:
+        for query in ["docker", "google"]:
+            print("=" * 80)
+            print(f"Testing search for '{query}'")
+            print("=" * 80)
+            # search_confluence is registered as an MCP tool; .fn is the function itself
+            results = await search_confluence.fn(query)
+            print(f"\nFound {len(results)} results:")
+            for r in results:
+                print(f" - {r['title']} (ID: {r['id']})")
+                print(f"   URL: {r['url']}")
+            print()
+    finally:
+        await transport.aclose()
 
-print("\n" + "=" * 80)
-print("Testing search for 'google'")
-print("=" * 80)
-results = search_confluence("google")
-print(f"\nFound {len(results)} results:")
-for r in results:
-    print(f" - {r['title']} (ID: {r['id']})")
-    print(f"   URL: {r['url']}")
+asyncio.run(main())
@@ -0,0 +1,36 @@
+import httpx
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def mock_confluence(monkeypatch):
+    """
+    The server's tools wired to an in-process benchmarks/mock_confluence.py
+    (no sockets, no latency). Yields the MockConfluence instance.
+    """
+    from mock_confluence import MockConfluence
+    from src.confluence_mcp import server
+
+    mock = MockConfluence(
+        {space: sorted(roots) for space, roots in server.ALLOWED_PARENTS.items()},
+        pages_per_root=30,
+        fanout=5,
+        body_kb=2,
+    )
+    # Process-wide state that would otherwise leak between tests (and event loops)
+    monkeypatch.setattr(server, "INDEX_ENABLED", False)
+    monkeypatch.setattr(server, "local_index", None)
+    monkeypatch.setattr(server.transport, "rate_limiter", None)
+    monkeypatch.setattr(server.transport, "_inflight", {})
+    monkeypatch.setattr(server.transport, "base_url", "http://confluence.test")
+    monkeypatch.setattr(server.transport, "_client", httpx.AsyncClient(transport=httpx.ASGITransport(app=mock.app())))
+    monkeypatch.setattr(server, "_search_prefetch", type(server._search_prefetch)())
+    server.page_cache.clear()
+    server.page_index.pages.clear()
+    yield mock
+    server.page_cache.clear()
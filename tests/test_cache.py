@@ -0,0 +1,113 @@
+import pytest
+
+from src.confluence_mcp import server
+from src.confluence_mcp.cache import PageCache, estimate_size
+
+
+def page(page_id, version=1, body="<p>x</p>"):
+    return {"id": page_id, "title": f"Page {page_id}", "version": {"number": version}, "body": {"storage": {"value": body}}}
+
+
+def expire(cache, page_id):
+    cache._entries[page_id].checked_at -= cache.ttl + 1
+
+
+def test_fresh_entry_is_a_hit():
+    cache = PageCache()
+    assert cache.lookup("1") is None
+    cache.put("1", page("1"))
+    entry = cache.lookup("1")
+    assert cache.is_fresh(entry) and entry.data["id"] == "1"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PageCache(max_entries=2)
+    cache.put("1", page("1"))
+    cache.put("2", page("2"))
+    cache.lookup("1")
+    cache.put("3", page("3"))
+    assert cache.lookup("2") is None
+    assert cache.lookup("1") is not None and cache.lookup("3") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_is_bounded_by_bytes():
+    size = estimate_size(page("1", body="x" * 1000))
+    cache = PageCache(max_bytes=2 * size + 10)
+    for page_id in "123":
+        cache.put(page_id, page(page_id, body="x" * 1000))
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] == 2 * size
+    # Larger than the whole cache: not cached, nothing evicted for it
+    cache.put("4", page("4", body="x" * 10000))
+    assert cache.lookup("4") is None and cache.stats()["entries"] == 2
+
+
+def test_stale_entry_revalidated_unchanged_is_fresh_again():
+    cache = PageCache(ttl=30)
+    cache.put("1", page("1", version=3))
+    expire(cache, "1")
+    entry = cache.lookup("1")
+    assert not cache.is_fresh(entry)
+    assert cache.revalidated("1", 3) is entry
+    assert cache.is_fresh(cache.lookup("1"))
+    stats = cache.stats()
+    assert stats["revalidations"] == 1 and stats["revalidatedUnchanged"] == 1
+    assert stats["hitRatio"] == 1.0
+
+
+def test_stale_entry_revalidated_changed_is_dropped():
+    cache = PageCache(ttl=30)
+    cache.put("1", page("1", version=3))
+    expire(cache, "1")
+    assert cache.revalidated("1", 4) is None
+    assert cache.lookup("1") is None
+    assert cache.stats()["revalidatedChanged"] == 1
+
+
+def test_zero_ttl_always_revalidates():
+    cache = PageCache(ttl=0)
+    cache.put("1", page("1"))
+    assert not cache.is_fresh(cache.lookup("1"))
+
+
+def test_older_version_does_not_replace_newer():
+    cache = PageCache()
+    cache.put("1", page("1", version=5, body="new"))
+    cache.put("1", page("1", version=4, body="old"))
+    cache.put("1", {"id": "1", "title": "no version"})
+    assert cache.lookup("1").data["body"]["storage"]["value"] == "new"
+    assert cache.stats()["stalePutsSkipped"] == 2
+    cache.put("1", page("1", version=6, body="newer"))
+    assert cache.lookup("1").version == 6
+
+
+def test_invalidate():
+    cache = PageCache()
+    cache.put("1", page("1"))
+    cache.invalidate("1")
+    cache.invalidate("1")
+    assert cache.lookup("1") is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["bytes"] == 0
+
+
+@pytest.mark.anyio
+async def test_fetch_page_revalidates_with_a_version_probe(mock_confluence):
+    page_id = next(iter(mock_confluence.pages))
+    before = mock_confluence.requests
+    await server.fetch_page(page_id)
+    await server.fetch_page(page_id)
+    assert mock_confluence.requests - before == 1
+
+    # Stale and unchanged: a version probe, body reused
+    expire(server.page_cache, page_id)
+    await server.fetch_page(page_id)
+    assert mock_confluence.requests - before == 2
+
+    # Stale and changed: probe, then the new body
+    mock_confluence.pages[page_id]["version"] += 1
+    mock_confluence.pages[page_id]["body"] = "<p>changed</p>"
+    expire(server.page_cache, page_id)
+    data = await server.fetch_page(page_id)
+    assert data["body"]["storage"]["value"] == "<p>changed</p>"
+    assert mock_confluence.requests - before == 4
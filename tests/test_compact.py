@@ -0,0 +1,89 @@
+import json
+
+from src.confluence_mcp.agent.compact import compact_output
+
+BASE = "https://example.atlassian.net/wiki"
+
+
+def size(text):
+    return len(text.encode("utf-8"))
+
+
+def search_results(count, excerpt=""):
+    return [
+        {
+            "id": str(i),
+            "title": f"Page {i}",
+            "type": "page",
+            "space": "AR",
+            "url": f"{BASE}/spaces/AR/pages/{i}",
+            "excerpt": excerpt,
+            "labels": [],
+        }
+        for i in range(count)
+    ]
+
+
+def test_list_results_get_relative_urls_and_common_fields():
+    data = json.loads(compact_output("search_confluence", json.dumps(search_results(3))))
+    assert data["baseUrl"] == BASE
+    assert data["resultsCommon"] == {"type": "page", "space": "AR"}
+    assert data["results"][1] == {"id": "1", "title": "Page 1", "url": "/spaces/AR/pages/1"}
+
+
+def test_repeated_long_value_becomes_pointer():
+    text = "x" * 100
+    data = json.loads(compact_output("get_confluence_page", json.dumps({"id": "1", "summary": text, "textContent": text})))
+    assert data["summary"] == text
+    assert data["textContent"] == "(same as summary)"
+
+
+def test_storage_content_is_never_deduplicated():
+    body = "<p>" + "x" * 100 + "</p>"
+    data = json.loads(compact_output(
+        "prepare_confluence_page_merge_update",
+        json.dumps({"id": "1", "textContent": body, "storageContent": body}),
+    ))
+    assert data["storageContent"] == body
+
+
+def test_long_string_is_cut_to_budget_with_marker():
+    text = "word " * 20000
+    out = compact_output("get_confluence_page", json.dumps({"id": "1", "title": "T", "textContent": text}))
+    assert size(out) <= 48000
+    data = json.loads(out)
+    assert data["id"] == "1" and data["title"] == "T"
+    assert data["textContent"].startswith("word word")
+    assert "[...truncated " in data["textContent"] and "use max_chars/offset" in data["textContent"]
+
+
+def test_long_list_is_cut_to_budget_with_marker():
+    out = compact_output("search_confluence", json.dumps(search_results(2000)))
+    assert size(out) <= 24000
+    results = json.loads(out)["results"]
+    assert results[-1].startswith("[...truncated ") and results[-1].endswith(" more items]")
+    kept = len(results) - 1
+    assert kept > 100
+    assert str(2000 - kept) in results[-1]
+    # Items themselves are kept whole
+    assert results[0] == {"id": "0", "title": "Page 0", "url": "/spaces/AR/pages/0"}
+
+
+def test_prepare_output_is_never_truncated():
+    body = "<p>" + "y" * 200000 + "</p>"
+    out = compact_output("prepare_confluence_page_merge_update", json.dumps({"id": "1", "storageContent": body}))
+    assert json.loads(out)["storageContent"] == body
+
+
+def test_small_output_is_left_within_budget_untouched():
+    raw = json.dumps({"id": "1", "title": "T", "url": f"{BASE}/x", "other": f"{BASE}/y"})
+    data = json.loads(compact_output("get_confluence_page", raw))
+    assert data == {"baseUrl": BASE, "id": "1", "title": "T", "url": "/x", "other": f"{BASE}/y"}
+
+
+def test_plain_text_is_cut_by_bytes():
+    text = "é" * 30000
+    out = compact_output("some_tool", text)
+    assert out.endswith(" bytes]")
+    assert size(out) <= 24000 + 40
+    assert compact_output("some_tool", "short") == "short"
@@ -0,0 +1,52 @@
+import pytest
+
+from bench_clean_html import make_storage_body
+from src.confluence_mcp.extract import ENGINES, clean_html, lxml_available, resolve_engine
+
+CODE_MACRO = (
+    '<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">python</ac:parameter>'
+    "<ac:plain-text-body><![CDATA[if a < b: print(\"&\")]]></ac:plain-text-body></ac:structured-macro>"
+)
+
+SAMPLES = [
+    "<p>Tom &amp; Jerry&nbsp;say &lt;hi&gt;</p>",
+    "<p>one<br/>two</p><ul><li>three</li><li><p>four</p></li></ul>",
+    CODE_MACRO,
+    "<ac:placeholder>Type here</ac:placeholder><p>kept</p>",
+    '<table><tbody><tr><th>Host</th></tr><tr><td><ac:link><ri:user ri:account-id="a1" /></ac:link>web-1</td></tr></tbody></table>',
+    "plain text",
+    make_storage_body(8 * 1024),
+]
+
+ENGINE_NAMES = [e for e in ENGINES if e != "lxml" or lxml_available()]
+
+
+@pytest.mark.parametrize("engine", ENGINE_NAMES)
+@pytest.mark.parametrize("html", SAMPLES)
+def test_engines_match_bs4(engine, html):
+    assert ENGINES[engine](html) == ENGINES["bs4"](html)
+
+
+@pytest.mark.parametrize("engine", ENGINE_NAMES)
+def test_macro_parameters_are_dropped_and_code_kept(engine):
+    text = clean_html(CODE_MACRO, engine)
+    assert "python" not in text
+    assert text == 'if a < b: print("&")'
+
+
+@pytest.mark.parametrize("engine", ENGINE_NAMES)
+def test_entities_are_decoded(engine):
+    assert clean_html(SAMPLES[0], engine) == "Tom & Jerry\xa0say <hi>"
+
+
+def test_empty_body():
+    assert clean_html("") == ""
+    assert clean_html(None) == ""
+
+
+def test_resolve_engine():
+    assert resolve_engine("auto") == ("lxml" if lxml_available() else "stream")
+    assert resolve_engine("STREAM") == "stream"
+    assert resolve_engine(None) == resolve_engine("auto")
+    with pytest.raises(ValueError, match="Unknown HTML extraction engine"):
+        resolve_engine("regex")
@@ -0,0 +1,62 @@
+import pytest
+from fastmcp import Client
+
+from src.confluence_mcp import server
+
+pytestmark = pytest.mark.anyio
+
+
+def expire(page_id):
+    entry = server.page_cache.lookup(page_id)
+    entry.checked_at -= server.page_cache.ttl + 1
+
+
+async def test_pages_are_fetched_a_chunk_per_request(mock_confluence):
+    ids = list(mock_confluence.pages)[:60]
+    before = mock_confluence.requests
+    pages = await server.fetch_pages(ids)
+    assert set(pages) == set(ids)
+    assert pages[ids[0]]["body"]["storage"]["value"] == mock_confluence.pages[ids[0]]["body"]
+    # 25 ids per request
+    assert mock_confluence.requests - before == 3
+    # Now all cached
+    assert set(await server.fetch_pages(ids)) == set(ids)
+    assert mock_confluence.requests - before == 3
+
+
+async def test_stale_pages_are_revalidated_together(mock_confluence):
+    ids = list(mock_confluence.pages)[:10]
+    await server.fetch_pages(ids)
+    for page_id in ids:
+        expire(page_id)
+    changed = ids[3]
+    mock_confluence.pages[changed]["version"] += 1
+    mock_confluence.pages[changed]["body"] = "<p>changed</p>"
+    before = mock_confluence.requests
+    pages = await server.fetch_pages(ids)
+    # One version probe for all ten, one body request for the changed page
+    assert mock_confluence.requests - before == 2
+    assert pages[changed]["body"]["storage"]["value"] == "<p>changed</p>"
+    assert set(pages) == set(ids)
+
+
+async def test_missing_pages_are_left_out(mock_confluence):
+    page_id = next(iter(mock_confluence.pages))
+    assert set(await server.fetch_pages([page_id, "99999999"])) == {page_id}
+
+
+async def test_batch_tool_keeps_order_and_reports_bad_ids(mock_confluence):
+    ids = list(mock_confluence.pages)[:3]
+    async with Client(server.mcp) as client:
+        result = await client.call_tool("get_confluence_pages", {
+            "page_ids": [ids[2], "abc", ids[0], "99999999", ids[1]], "format": "summary",
+        })
+        too_many = await client.call_tool("get_confluence_pages", {
+            "page_ids": [str(i) for i in range(server.MAX_BATCH_PAGES + 1)],
+        })
+    pages = result.structured_content["result"]
+    assert [p["id"] for p in pages] == [ids[2], "abc", ids[0], "99999999", ids[1]]
+    assert pages[1]["error"] == "Invalid page id."
+    assert pages[3]["error"] == "Page not found or not accessible."
+    assert "summary" in pages[0] and "textContent" not in pages[0]
+    assert too_many.structured_content["result"] == [{"error": f"At most {server.MAX_BATCH_PAGES} page ids per call."}]
@@ -0,0 +1,127 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from src.confluence_mcp.agent.history import HistoryManager, describe_output, estimate_tokens, split_turns
+
+pytestmark = pytest.mark.anyio
+
+SYSTEM = "You are a Confluence assistant."
+
+
+def turn(n, output_chars=100, answer=True):
+    """A user question, a tool call and its output, and (optionally) the answer."""
+    call_id = f"call-{n}"
+    messages = [
+        HumanMessage(content=f"question {n}", id=f"h{n}"),
+        AIMessage(content="", tool_calls=[{"id": call_id, "name": "get_confluence_page", "args": {"page_id": str(n)}}], id=f"a{n}"),
+        ToolMessage(content='{"id": "%d", "title": "Page %d", "textContent": "%s"}' % (n, n, "x" * output_chars), tool_call_id=call_id, id=f"t{n}"),
+    ]
+    if answer:
+        messages.append(AIMessage(content=f"answer {n}", id=f"r{n}"))
+    return messages
+
+
+def tool_outputs(messages):
+    return [m.content for m in messages if isinstance(m, ToolMessage)]
+
+
+def test_split_turns_starts_a_turn_at_each_user_message():
+    messages = turn(1) + turn(2, answer=False)
+    assert [len(t) for t in split_turns(messages)] == [4, 3]
+    assert split_turns([]) == []
+
+
+def test_describe_output():
+    assert describe_output('{"id": "7", "title": "Runbook"}') == 'page 7 "Runbook"'
+    assert describe_output('{"results": [{"id": "1", "title": "A"}]}') == '1 pages: 1 "A"'
+    assert describe_output("not json\nat all") == "not json at all"
+
+
+async def test_history_within_budget_is_sent_unchanged():
+    manager = HistoryManager(max_tokens=10000)
+    messages = turn(1) + turn(2)
+    result, report = await manager.prepare(SYSTEM, [SystemMessage(content="old")] + messages)
+    assert result[0].content == SYSTEM
+    assert result[1:] == messages
+    assert report["collapsedOutputs"] == 0 and report["droppedTurns"] == 0
+
+
+async def test_earlier_tool_outputs_are_collapsed_first():
+    manager = HistoryManager(max_tokens=1000, tool_output_chars=1000)
+    messages = turn(1, 6000) + turn(2, 100) + turn(3, 100, answer=False)
+    result, report = await manager.prepare(SYSTEM, messages)
+    outputs = tool_outputs(result)
+    assert outputs[0].startswith('[Output of get_confluence_page({"page_id": "1"}) omitted')
+    assert 'page 1 "Page 1"' in outputs[0]
+    assert outputs[1:] == tool_outputs(messages)[1:]
+    assert report["collapsedOutputs"] == 1 and report["droppedTurns"] == 0
+    assert report["estimatedTokens"] <= 1000 < report["estimatedTokensBeforeCompaction"]
+
+
+async def test_oldest_turns_are_dropped_into_a_summary():
+    summarized = []
+
+    async def summarize(dropped):
+        summarized.append(dropped)
+        return "they asked about pages 1 and 2"
+
+    manager = HistoryManager(max_tokens=150, keep_turns=1, summarize=summarize)
+    messages = turn(1) + turn(2) + turn(3) + turn(4, answer=False)
+    result, report = await manager.prepare(SYSTEM, messages)
+    assert "Summary of the earlier conversation" in result[0].content
+    assert "they asked about pages 1 and 2" in result[0].content
+    assert report["droppedTurns"] >= 1
+    # The last kept turns and the current one are still whole
+    assert result[-3:] == turn(4, answer=False)
+    # A tool call never loses its result
+    kept_calls = {tc["id"] for m in result if isinstance(m, AIMessage) for tc in m.tool_calls}
+    assert kept_calls == {m.tool_call_id for m in result if isinstance(m, ToolMessage)}
+
+    # The same dropped prefix is summarised once
+    await manager.prepare(SYSTEM, messages)
+    assert len(summarized) == 1
+
+
+async def test_failed_summary_falls_back_to_a_digest():
+    async def summarize(dropped):
+        raise RuntimeError("LLM down")
+
+    manager = HistoryManager(max_tokens=100, keep_turns=0, summarize=summarize)
+    result, _ = await manager.prepare(SYSTEM, turn(1) + turn(2, answer=False))
+    assert "- User: question 1" in result[0].content
+    assert "- Assistant called: get_confluence_page" in result[0].content
+
+
+async def test_latest_tool_outputs_of_the_current_turn_are_kept():
+    manager = HistoryManager(max_tokens=500, keep_turns=0, tool_output_chars=1000)
+    # Two tool rounds for the same question
+    current = turn(1, 5000, answer=False) + [
+        AIMessage(content="", tool_calls=[{"id": "call-2", "name": "get_confluence_page", "args": {"page_id": "2"}}], id="a2"),
+        ToolMessage(content="y" * 5000, tool_call_id="call-2", id="t2"),
+    ]
+    result, report = await manager.prepare(SYSTEM, current)
+    outputs = tool_outputs(result)
+    assert outputs[0].startswith("[Output of get_confluence_page")
+    assert outputs[1] == "y" * 5000
+    assert report["collapsedOutputs"] == 1
+
+
+async def test_usage_is_recorded_per_session():
+    manager = HistoryManager()
+    _, report = await manager.prepare(SYSTEM, turn(1))
+    response = AIMessage(content="ok", usage_metadata={"input_tokens": 120, "output_tokens": 8, "total_tokens": 128})
+    manager.record_usage(response, report, session="a")
+    manager.record_usage(AIMessage(content="ok"), dict(report), session="a")
+    manager.record_usage(response, dict(report), session="b")
+    assert manager.stats("a")["calls"] == 2
+    assert manager.stats("a")["last"]["inputTokens"] is None
+    assert manager.stats("b")["last"]["inputTokens"] == 120
+    assert manager.stats("c") == {"calls": 0, "last": {}}
+    assert manager.stats() == {"calls": 1, "sessions": 2}
+
+
+def test_estimate_counts_tool_calls():
+    plain = AIMessage(content="x" * 400)
+    with_call = AIMessage(content="x" * 400, tool_calls=[{"id": "1", "name": "search_confluence", "args": {"query": "q"}}])
+    assert estimate_tokens(plain) == 104
+    assert estimate_tokens(with_call) > estimate_tokens(plain)
@@ -0,0 +1,69 @@
+import httpx
+import pytest
+
+from mock_confluence import MockConfluence
+from src.confluence_mcp.index import AllowedPageIndex
+from src.confluence_mcp.transport import ConfluenceTransport
+
+pytestmark = pytest.mark.anyio
+
+ROOTS = {"AR": ["100", "200"]}
+
+
+@pytest.fixture
+def mock():
+    return MockConfluence(ROOTS, pages_per_root=12, fanout=3, body_kb=1)
+
+
+@pytest.fixture
+def index(mock):
+    transport = ConfluenceTransport("http://confluence.test", ("user", "token"))
+    transport._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock.app()))
+    return AllowedPageIndex(transport, {space: set(roots) for space, roots in ROOTS.items()})
+
+
+def subtree(mock, page_id):
+    return [page_id] + [p for p, page in mock.pages.items() if page_id in page["ancestors"]]
+
+
+async def test_build_indexes_every_page_under_the_roots(mock, index):
+    await index.build()
+    assert index.ready
+    assert set(index.pages) == set(mock.pages)
+    child = mock.children["100"][0]
+    assert index.contains(child)
+    assert index.get(child).parent_id == "100"
+    assert index.get("100").parent_id is None
+    assert not index.contains("999")
+    assert index.stats()["localHits"] == 1 and index.stats()["localMisses"] == 1
+
+
+async def test_refresh_drops_pages_moved_out_of_scope(mock, index):
+    await index.build()
+    moved = mock.children["100"][0]
+    below = subtree(mock, moved)
+    assert len(below) > 1
+    mock.move(moved, None)
+    await index.refresh()
+    for page_id in below:
+        assert not index.contains(page_id)
+    assert index.contains(mock.children["100"][0])
+    assert len(index.pages) == len(mock.pages) - len(below)
+
+
+async def test_refresh_adds_pages_moved_into_scope(mock, index):
+    await index.build()
+    moved = mock.children["100"][0]
+    mock.move(moved, None)
+    await index.refresh()
+    mock.move(moved, "200")
+    await index.refresh()
+    assert index.get(moved).parent_id == "200"
+    assert index.stats()["refreshes"] == 2
+
+
+async def test_discard_tree(mock, index):
+    await index.build()
+    index.discard_tree("200")
+    assert set(index.pages) == set(subtree(mock, "100"))
+    index.discard_tree("missing")
@@ -0,0 +1,69 @@
+import pytest
+from fastmcp import Client
+
+from src.confluence_mcp import server
+from src.confluence_mcp.server import SUMMARY_CHARS, page_content_fields
+
+pytestmark = pytest.mark.anyio
+
+BODY = "<p>" + " ".join(f"word{i}" for i in range(400)) + "</p>"
+TEXT = server.clean_html(BODY)
+
+
+async def test_formats_select_the_bodies():
+    assert await page_content_fields(BODY, "text", None, 0) == {"textContent": TEXT}
+    assert await page_content_fields(BODY, "storage", None, 0) == {"storageContent": BODY}
+    assert await page_content_fields(BODY, "both", None, 0) == {"textContent": TEXT, "storageContent": BODY}
+
+
+async def test_summary_is_cut_with_lengths():
+    fields = await page_content_fields(BODY, "summary", None, 0)
+    assert fields["summary"] == TEXT[:SUMMARY_CHARS] + "..."
+    assert fields["textLength"] == len(TEXT) and fields["storageLength"] == len(BODY)
+    assert (await page_content_fields("<p>short</p>", "summary", None, 0))["summary"] == "short"
+
+
+async def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Unknown format 'html'"):
+        await page_content_fields(BODY, "html", None, 0)
+
+
+async def test_chunks_cover_the_text_exactly_once():
+    chunks = []
+    offset = 0
+    while offset is not None:
+        fields = await page_content_fields(BODY, "text", 700, offset)
+        assert fields["offset"] == offset and fields["textLength"] == len(TEXT)
+        assert len(fields["textContent"]) <= 700
+        chunks.append(fields["textContent"])
+        offset = fields["nextOffset"]
+    assert "".join(chunks) == TEXT
+    assert len(chunks) == -(-len(TEXT) // 700)
+
+
+async def test_both_continues_until_the_longer_body_ends():
+    # The storage body is a few characters longer than the text
+    fields = await page_content_fields(BODY, "both", 3, len(TEXT))
+    assert fields["textContent"] == ""
+    assert fields["storageContent"] == BODY[len(TEXT):len(TEXT) + 3]
+    assert fields["nextOffset"] == len(TEXT) + 3
+    last = await page_content_fields(BODY, "both", 3, len(BODY) - 3)
+    assert last["storageContent"] == "/p>" and last["nextOffset"] is None
+
+
+async def test_offset_without_max_chars_returns_the_rest():
+    fields = await page_content_fields(BODY, "storage", None, 10)
+    assert fields["storageContent"] == BODY[10:]
+    assert fields["nextOffset"] is None
+
+
+async def test_get_page_in_chunks(mock_confluence):
+    page_id = next(iter(mock_confluence.pages))
+    mock_confluence.pages[page_id]["body"] = BODY
+    async with Client(server.mcp) as client:
+        result = await client.call_tool("get_confluence_page", {
+            "page_id": page_id, "format": "text", "max_chars": 1000, "offset": 1000,
+        })
+    page = result.structured_content
+    assert page["textContent"] == TEXT[1000:2000]
+    assert page["nextOffset"] == 2000
@@ -0,0 +1,109 @@
+import pytest
+
+from src.confluence_mcp.patch import PatchError, apply_operations, index_elements, section_bounds
+
+BODY = (
+    "<h1>Intro</h1><p>Welcome.</p>"
+    "<h2>Setup</h2><p>Install it.</p><ul><li>one</li><li>two</li></ul>"
+    "<h2>Usage</h2><p>Run it.<br>Again.</p>"
+    '<ac:structured-macro ac:name="code"><ac:plain-text-body><![CDATA[if a < b && c > d: </p>]]>'
+    "</ac:plain-text-body></ac:structured-macro>"
+    "<h1>Reference</h1><table><tbody><tr><td>a</td></tr></tbody></table>"
+)
+
+
+def apply(*ops):
+    return apply_operations(BODY, list(ops))
+
+
+def test_section_ends_at_next_heading_of_same_or_higher_level():
+    elements, unmatched = index_elements(BODY)
+    assert unmatched == 0
+    intro = next(e for e in elements if e.tag == "h1")
+    start, end = section_bounds(elements, intro, len(BODY))
+    # h2 sections belong to the h1 above them
+    assert BODY[start:end].startswith("<p>Welcome.</p><h2>Setup</h2>")
+    assert BODY[end:].startswith("<h1>Reference</h1>")
+
+
+def test_replace_section_keeps_heading_and_everything_else():
+    result = apply({"op": "replace_section", "heading": "Setup", "content": "<p>New.</p>"})
+    assert result == BODY.replace("<p>Install it.</p><ul><li>one</li><li>two</li></ul>", "<p>New.</p>")
+
+
+def test_section_inside_container_ends_at_container():
+    body = '<ac:layout><ac:layout-cell><h2>A</h2><p>x</p></ac:layout-cell></ac:layout><p>outside</p>'
+    result = apply_operations(body, [{"op": "append_to_section", "heading": "A", "content": "<p>y</p>"}])
+    assert result == body.replace("<p>x</p>", "<p>x</p><p>y</p>")
+
+
+def test_heading_match_ignores_case_and_whitespace():
+    result = apply({"op": "delete_section", "heading": "  usage "})
+    assert "<h2>Usage</h2>" not in result
+    assert "CDATA" not in result
+    assert result.endswith("<h1>Reference</h1><table><tbody><tr><td>a</td></tr></tbody></table>")
+
+
+def test_void_tags_and_cdata_do_not_unbalance_the_index():
+    # <br> has no end tag and the CDATA holds tag-like text; the table after
+    # them must still be found with the right bounds
+    result = apply({"op": "append_table_row", "content": "<tr><td>b</td></tr>"})
+    assert result.endswith("<tr><td>a</td></tr><tr><td>b</td></tr></tbody></table>")
+    assert "<![CDATA[if a < b && c > d: </p>]]>" in result
+
+
+def test_macro_can_be_replaced_as_an_element():
+    result = apply({"op": "replace_element", "tag": "ac:structured-macro", "content": "<p>no code</p>"})
+    assert "CDATA" not in result
+    assert "<p>Run it.<br>Again.</p><p>no code</p><h1>Reference</h1>" in result
+
+
+def test_element_index_is_scoped_to_heading():
+    result = apply({"op": "delete_element", "tag": "li", "index": 1, "heading": "Setup"})
+    assert "<ul><li>one</li></ul>" in result
+    with pytest.raises(PatchError, match="index 2"):
+        apply({"op": "delete_element", "tag": "li", "index": 2, "heading": "Setup"})
+
+
+def test_duplicate_headings_need_occurrence():
+    body = "<h2>Notes</h2><p>1</p><h2>Notes</h2><p>2</p>"
+    with pytest.raises(PatchError, match="appears 2 times"):
+        apply_operations(body, [{"op": "delete_section", "heading": "Notes"}])
+    result = apply_operations(body, [{"op": "delete_section", "heading": "Notes", "occurrence": 2}])
+    assert result == "<h2>Notes</h2><p>1</p>"
+    with pytest.raises(PatchError, match="occurrence must be 1..2"):
+        apply_operations(body, [{"op": "delete_section", "heading": "Notes", "occurrence": 3}])
+
+
+def test_missing_heading_lists_headings():
+    with pytest.raises(PatchError, match='Operation 1 \\(replace_section\\): Heading \'Nope\' not found.*"Setup"'):
+        apply({"op": "replace_section", "heading": "Nope", "content": ""})
+
+
+def test_replace_text_must_be_unique_unless_all():
+    body = "<p>foo</p><p>foo</p>"
+    with pytest.raises(PatchError, match="occurs 2 times"):
+        apply_operations(body, [{"op": "replace_text", "find": "foo", "replace": "bar"}])
+    assert apply_operations(body, [{"op": "replace_text", "find": "foo", "replace": "bar", "all": True}]) == "<p>bar</p><p>bar</p>"
+    with pytest.raises(PatchError, match="does not occur"):
+        apply_operations(body, [{"op": "replace_text", "find": "baz", "replace": "x"}])
+
+
+def test_unbalanced_content_is_rejected():
+    with pytest.raises(PatchError, match="not balanced"):
+        apply({"op": "append", "content": "<p>open"})
+
+
+def test_failed_operation_reports_position():
+    with pytest.raises(PatchError, match="Operation 2 \\(bogus\\)"):
+        apply({"op": "append", "content": "<p>x</p>"}, {"op": "bogus"})
+
+
+def test_bytes_outside_edit_are_unchanged():
+    # Attribute quoting, entities and self-closing forms a parser round trip
+    # would normalise
+    body = "<p class='a'>x &amp; y&nbsp;<br/></p><h2>S</h2><p>old</p><p data-x=\"1\" >z</p>"
+    result = apply_operations(body, [{"op": "replace_text", "find": "old", "replace": "new"}])
+    assert result == body.replace("old", "new")
+    result = apply_operations(body, [{"op": "replace_element", "tag": "p", "index": 1, "content": "<p>n</p>"}])
+    assert result == body.replace("<p>old</p>", "<p>n</p>")
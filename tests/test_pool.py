@@ -0,0 +1,118 @@
+import pytest
+
+from src.confluence_mcp.agent.pool import MCPClientPool
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClient:
+    """Stands in for MCPClient; `server` records what each connection saw."""
+
+    def __init__(self, server):
+        self.server = server
+        self.alive = True
+        self.closed = False
+
+    async def connect(self):
+        if self.server.fail_connect:
+            raise ConnectionError("spawn failed")
+        self.server.connections.append(self)
+
+    async def close(self):
+        self.closed = True
+
+    def get_tools(self):
+        return ["get_confluence_page", "create_confluence_page"]
+
+    async def call_tool(self, name, arguments):
+        self.server.calls.append((self, name))
+        if self.server.die_on_next_call:
+            # The server process exits mid-call
+            self.server.die_on_next_call = False
+            self.alive = False
+            return f"Error executing tool {name}: connection closed"
+        return f"{name} ok"
+
+    async def ping(self):
+        return self.alive
+
+
+class FakeServer:
+    def __init__(self):
+        self.connections = []
+        self.calls = []
+        self.die_on_next_call = False
+        self.fail_connect = False
+
+
+@pytest.fixture
+async def server_and_pool():
+    server = FakeServer()
+    pool = MCPClientPool(size=2, health_check_interval=0, factory=lambda: FakeClient(server))
+    yield server, pool
+    await pool.close()
+
+
+async def test_leases_fill_the_pool_then_share(server_and_pool):
+    server, pool = server_and_pool
+    a = await pool.lease()
+    b = await pool.lease()
+    c = await pool.lease()
+    assert a.slot is not b.slot
+    assert len(server.connections) == 2
+    assert pool.stats()["leases"] == [2, 1]
+    await b.close()
+    await b.close()
+    assert pool.stats()["leases"] == [2, 0]
+    # The idle slot is reused rather than a new connection opened
+    d = await pool.lease()
+    assert d.slot is b.slot and len(server.connections) == 2
+    assert pool.tools == ["get_confluence_page", "create_confluence_page"]
+    for lease in (a, c, d):
+        await lease.close()
+
+
+async def test_read_is_retried_on_a_fresh_connection_after_a_crash(server_and_pool):
+    server, pool = server_and_pool
+    lease = await pool.lease()
+    server.die_on_next_call = True
+    assert await lease.call_tool("get_confluence_page", {"page_id": "1"}) == "get_confluence_page ok"
+    assert len(server.connections) == 2 and server.connections[0].closed
+    assert [c for c, _ in server.calls] == server.connections
+
+
+async def test_write_is_not_replayed_after_a_crash(server_and_pool):
+    server, pool = server_and_pool
+    lease = await pool.lease()
+    server.die_on_next_call = True
+    result = await lease.call_tool("create_confluence_page", {"title": "T"})
+    assert result.startswith("Error executing tool create_confluence_page:")
+    assert "may or may not have been applied" in result
+    assert len(server.calls) == 1
+    # The connection was still replaced for the next call
+    assert len(server.connections) == 2
+    assert await lease.call_tool("create_confluence_page", {"title": "T"}) == "create_confluence_page ok"
+
+
+async def test_tool_error_from_a_live_server_is_returned_as_is(server_and_pool):
+    server, pool = server_and_pool
+    lease = await pool.lease()
+
+    async def failing(name, arguments):
+        server.calls.append(name)
+        return f"Error executing tool {name}: bad arguments"
+
+    lease.slot.client.call_tool = failing
+    assert await lease.call_tool("get_confluence_page", {}) == "Error executing tool get_confluence_page: bad arguments"
+    assert len(server.calls) == 1 and len(server.connections) == 1
+
+
+async def test_failed_connect_raises_and_frees_the_lease(server_and_pool):
+    server, pool = server_and_pool
+    server.fail_connect = True
+    with pytest.raises(ConnectionError):
+        await pool.lease()
+    assert pool.stats()["leases"] == [0]
+    server.fail_connect = False
+    lease = await pool.lease()
+    assert await lease.call_tool("get_confluence_page", {}) == "get_confluence_page ok"
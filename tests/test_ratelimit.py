@@ -0,0 +1,119 @@
+import time
+
+import anyio
+import httpx
+import pytest
+
+from src.confluence_mcp.ratelimit import RateLimiter, TokenBucket, current_session, parse_reset, request_kind
+
+
+def response(status=200, **headers):
+    return httpx.Response(status, headers=headers)
+
+
+def test_request_kind():
+    assert request_kind("get") == "read"
+    assert request_kind("PUT") == "write"
+    assert request_kind("POST") == "write"
+
+
+def test_parse_reset_accepts_iso_and_epoch():
+    now = 1_700_000_000.0
+    assert parse_reset(str(now + 5), now) == pytest.approx(5)
+    assert parse_reset("2023-11-14T22:13:25Z", now) == pytest.approx(5)
+    assert parse_reset("2023-11-14T22:13:15+00:00", now) == 0.0
+    assert parse_reset("soon", now) is None
+    assert parse_reset(None, now) is None
+
+
+def test_bucket_allows_burst_then_waits_at_rate():
+    bucket = TokenBucket(rate=10, burst=3)
+    now = bucket.updated
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.tokens -= 1
+    assert bucket.wait_time(now) == pytest.approx(0.1)
+    assert bucket.wait_time(now + 0.1) == 0
+
+
+def test_paused_bucket_waits_for_pause():
+    bucket = TokenBucket(rate=10, burst=3)
+    now = bucket.updated
+    bucket.paused_until = now + 2
+    assert bucket.wait_time(now) == pytest.approx(2)
+
+
+def test_429_pauses_and_cuts_rate():
+    limiter = RateLimiter(read_rate=20, write_rate=5)
+    bucket = limiter.buckets["read"]
+    before = time.monotonic()
+    limiter.observe("GET", response(429, **{"Retry-After": "3"}))
+    assert bucket.rate == pytest.approx(14)
+    assert bucket.paused_until >= before + 3
+    assert bucket.tokens <= 0
+    # Writes have their own budget
+    assert limiter.buckets["write"].rate == 5
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_rate_recovers_gradually_but_not_past_configured_rate():
+    limiter = RateLimiter(read_rate=20)
+    bucket = limiter.buckets["read"]
+    limiter.observe("GET", response(429))
+    throttled = bucket.rate
+    limiter.observe("GET", response(200))
+    assert throttled < bucket.rate < 20
+    for _ in range(100):
+        limiter.observe("GET", response(200))
+    assert bucket.rate == 20
+
+
+def test_near_limit_header_trims_rate():
+    limiter = RateLimiter(read_rate=20)
+    limiter.observe("GET", response(200, **{"X-RateLimit-NearLimit": "true"}))
+    assert limiter.buckets["read"].rate == pytest.approx(18)
+
+
+def test_remaining_budget_caps_rate_until_window_resets():
+    limiter = RateLimiter(read_rate=20)
+    bucket = limiter.buckets["read"]
+    reset = str(time.time() + 10)
+    limiter.observe("GET", response(200, **{"X-RateLimit-Remaining": "50", "X-RateLimit-Reset": reset}))
+    # 90% of 50 requests over the 10 seconds left
+    assert bucket.ceiling == pytest.approx(4.5, rel=0.05)
+    assert limiter.stats()["readRate"] == pytest.approx(4.5, rel=0.05)
+    limiter.observe("GET", response(200, **{"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset}))
+    assert bucket.paused_until > time.monotonic() + 9
+    # A response without the headers lifts the cap
+    limiter.observe("GET", response(200))
+    assert bucket.ceiling == 20
+
+
+def test_zero_rate_disables_bucket():
+    limiter = RateLimiter(read_rate=0, write_rate=0)
+    assert limiter.buckets == {}
+    limiter.observe("GET", response(429))
+
+
+@pytest.mark.anyio
+async def test_waiting_sessions_are_served_round_robin():
+    limiter = RateLimiter(read_rate=100, burst_seconds=0.01)
+    order = []
+
+    async def request(session):
+        current_session.set(session)
+        await limiter.acquire("GET")
+        order.append(session)
+
+    async with anyio.create_task_group() as tasks:
+        # Session A queues ten requests before B and C queue one each
+        for _ in range(10):
+            tasks.start_soon(request, "A")
+        await anyio.sleep(0)
+        tasks.start_soon(request, "B")
+        tasks.start_soon(request, "C")
+
+    # B and C don't wait behind all of A's requests
+    assert order.index("B") < 4 and order.index("C") < 5
+    assert order.count("A") == 10
+    assert limiter.stats()["waits"] >= 10
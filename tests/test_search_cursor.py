@@ -0,0 +1,32 @@
+import base64
+
+import pytest
+
+from src.confluence_mcp import server
+
+
+@pytest.mark.parametrize("cursor, start", [("abc", None), (None, 50), ("abc", 25)])
+def test_search_cursor_round_trip(cursor, start):
+    params = server.decode_search_token(server.encode_search_token(cursor, start))
+    assert params.get("cursor") == cursor
+    assert params.get("start") == start
+
+
+def test_search_cursor_from_next_link():
+    data = {"_links": {"next": "/rest/api/search?cql=type%3Dpage&cursor=xyz&limit=25&start=25"}}
+    assert server.decode_search_token(server.next_search_token(data)) == {"cursor": "xyz", "start": 25}
+    assert server.next_search_token({"_links": {}}) is None
+
+
+@pytest.mark.parametrize("token", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    "WzFd",  # [1]
+    base64.urlsafe_b64encode(b'"text"').decode(),
+    base64.urlsafe_b64encode(b'{"s": [1]}').decode(),
+    base64.urlsafe_b64encode(b'{"s": "ten"}').decode(),
+    base64.urlsafe_b64encode(b'{"c": {"x": 1}}').decode(),
+])
+def test_malformed_search_cursor_raises_value_error(token):
+    with pytest.raises(ValueError, match="Invalid search cursor"):
+        server.decode_search_token(token)
@@ -0,0 +1,127 @@
+import threading
+
+import httpx
+import pytest
+
+from mock_confluence import MockConfluence
+from src.confluence_mcp.extract import clean_html
+from src.confluence_mcp.search_index import LocalSearchIndex, to_match_query
+from src.confluence_mcp.transport import ConfluenceTransport
+
+pytestmark = pytest.mark.anyio
+
+ROOTS = {"AR": ["100", "200"]}
+SPACE_CQL = 'type=page AND space in ("AR")'
+SCOPE_CQL = f"{SPACE_CQL} AND (id in (100, 200) OR ancestor in (100, 200))"
+
+
+@pytest.fixture
+def mock():
+    mock = MockConfluence(ROOTS, pages_per_root=12, fanout=3, body_kb=1)
+    mock.pages[kestrel(mock)]["body"] = "<p>The <strong>deployment</strong> runbook for kestrel</p>"
+    return mock
+
+
+def kestrel(mock):
+    """The page (below root 100, with children) whose body mentions kestrel."""
+    return mock.children["100"][0]
+
+
+@pytest.fixture
+def make_index(mock, tmp_path):
+    indexes = []
+
+    def make(extract_text=clean_html, **kwargs):
+        transport = ConfluenceTransport("http://confluence.test", ("user", "token"))
+        transport._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock.app()))
+        index = LocalSearchIndex(
+            str(tmp_path / "search.db"), transport, SCOPE_CQL, extract_text,
+            base_url="https://example.atlassian.net/wiki", space_cql=SPACE_CQL, **kwargs,
+        )
+        indexes.append(index)
+        return index
+
+    yield make
+    for index in indexes:
+        index.close()
+
+
+def test_to_match_query():
+    assert to_match_query("deploy runbook") == '"deploy" AND "runbook"*'
+    assert to_match_query('say "hi"') == '"say" AND "hi"*'
+    assert to_match_query("  ?! ") == ""
+
+
+async def test_full_sync_indexes_every_page_in_scope(mock, make_index):
+    index = make_index()
+    assert not index.ready
+    await index.sync()
+    assert index.ready
+    assert index.stats()["pages"] == len(mock.pages)
+    # Every word must appear, the last one as a prefix
+    [hit] = index.search("runbook kest")
+    assert hit["id"] == kestrel(mock)
+    assert hit["url"] == f"https://example.atlassian.net/wiki/spaces/AR/pages/{kestrel(mock)}"
+    assert "[kestrel]" in hit["excerpt"]
+    assert index.search("runbook falcon") == []
+    assert index.search("") == []
+
+
+async def test_index_stays_ready_across_restarts(make_index):
+    await make_index().sync()
+    assert make_index().ready
+
+
+async def test_full_sync_downloads_only_changed_pages(mock, make_index):
+    index = make_index()
+    await index.sync()
+    mock.pages["200"]["body"] = "<p>falcon</p>"
+    mock.pages["200"]["version"] += 1
+    before = mock.requests
+    await index.sync(full=True)
+    # Version listing plus one body download
+    assert mock.requests - before == 2
+    assert [hit["id"] for hit in index.search("falcon")] == ["200"]
+
+
+async def test_full_sync_drops_pages_that_left_scope(mock, make_index):
+    index = make_index()
+    await index.sync()
+    mock.move(kestrel(mock), None)
+    await index.sync(full=True)
+    assert index.search("kestrel") == []
+
+
+async def test_incremental_sync_drops_pages_moved_out_of_scope(mock, make_index):
+    index = make_index()
+    await index.sync()
+    moved = kestrel(mock)
+    below = [p for p, page in mock.pages.items() if moved in page["ancestors"]]
+    assert below
+    mock.move(moved, None)
+    await index.sync()
+    assert index.search("kestrel") == []
+    assert index.stats()["pages"] == len(mock.pages) - 1 - len(below)
+
+
+async def test_put_and_remove_page(make_index):
+    index = make_index()
+    index.put_page({
+        "id": "300", "title": "Heron", "space": {"key": "AR"}, "version": {"number": 1},
+        "body": {"storage": {"value": "<p>wading</p>"}}, "_links": {"webui": "/x"},
+    })
+    assert [hit["id"] for hit in index.search("heron")] == ["300"]
+    assert [hit["id"] for hit in index.search("wading")] == ["300"]
+    index.remove("300")
+    assert index.search("heron") == []
+
+
+async def test_text_is_extracted_off_the_event_loop(make_index):
+    threads = set()
+
+    def extract_text(html):
+        threads.add(threading.get_ident())
+        return clean_html(html)
+
+    await make_index(extract_text).sync()
+    assert threads and threading.get_ident() not in threads
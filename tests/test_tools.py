@@ -0,0 +1,226 @@
+"""
+Tools end to end against benchmarks/mock_confluence.py (see the
+mock_confluence fixture).
+"""
+import functools
+import json
+
+import anyio
+import httpx
+import pytest
+from fastmcp import Client
+
+from src.confluence_mcp import server
+
+pytestmark = pytest.mark.anyio
+
+BODY = "<h1>Status</h1><p>Green</p><h1>Owners</h1><table><tbody><tr><td>Ann</td></tr></tbody></table>"
+
+
+async def call(client, name, **arguments):
+    result = await client.call_tool(name, arguments, raise_on_error=False)
+    return json.loads(result.content[0].text) if not result.is_error else {"toolError": result.content[0].text}
+
+
+def managed_page(mock):
+    """A page under an allowed parent that the server may modify, with BODY."""
+    page_id = next(p for p in mock.pages if int(p) >= 10_000_000 and int(p) % 2 == 0)
+    mock.pages[page_id]["body"] = BODY
+    return page_id
+
+
+async def test_get_page(mock_confluence):
+    page_id = managed_page(mock_confluence)
+    async with Client(server.mcp) as client:
+        page = await call(client, "get_confluence_page", page_id=page_id, format="storage")
+    assert page["id"] == page_id
+    assert page["storageContent"] == BODY
+
+
+async def test_concurrent_identical_reads_share_one_request(mock_confluence):
+    page_id = managed_page(mock_confluence)
+    async with Client(server.mcp) as client:
+        before = mock_confluence.requests
+        async with anyio.create_task_group() as tasks:
+            for _ in range(5):
+                tasks.start_soon(functools.partial(call, client, "get_confluence_page", page_id=page_id))
+        assert mock_confluence.requests - before == 1
+
+
+async def test_paged_search_walks_every_result_once(mock_confluence):
+    seen = []
+    async with Client(server.mcp) as client:
+        cursor = None
+        while True:
+            arguments = {"query": "type=page", "limit": 7}
+            if cursor:
+                arguments["cursor"] = cursor
+            page = await call(client, "search_confluence_paged", **arguments)
+            seen.extend(r["id"] for r in page["results"])
+            cursor = page["nextCursor"]
+            if not cursor:
+                break
+        assert len(seen) == len(set(seen)) == page["totalSize"]
+        error = await call(client, "search_confluence_paged", query="type=page", cursor="WzFd")
+        assert error == {"error": "Invalid search cursor"}
+
+
+async def test_patch_changes_only_the_edited_section(mock_confluence):
+    page_id = managed_page(mock_confluence)
+    async with Client(server.mcp) as client:
+        result = await call(client, "patch_confluence_page", page_id=page_id, operations=[
+            {"op": "replace_section", "heading": "Status", "content": "<p>Amber</p>"},
+            {"op": "append_table_row", "heading": "Owners", "content": "<tr><td>Bo</td></tr>"},
+        ])
+        assert "error" not in result
+        assert mock_confluence.pages[page_id]["body"] == (
+            "<h1>Status</h1><p>Amber</p><h1>Owners</h1>"
+            "<table><tbody><tr><td>Ann</td></tr><tr><td>Bo</td></tr></tbody></table>"
+        )
+        assert mock_confluence.pages[page_id]["version"] == 2
+
+        failed = await call(client, "patch_confluence_page", page_id=page_id, operations=[
+            {"op": "delete_section", "heading": "Missing"},
+        ])
+        assert "Heading 'Missing' not found" in failed["error"]
+        assert mock_confluence.pages[page_id]["version"] == 2
+
+
+class FailingWrites(httpx.AsyncBaseTransport):
+    """
+    Hands requests to the mock, but the first PUT reports `failure` (a
+    status or an exception) after the mock saved it, or instead of saving
+    it if saved=False.
+    """
+
+    def __init__(self, inner, failure, saved=True):
+        self.inner = inner
+        self.failure = failure
+        self.saved = saved
+
+    async def handle_async_request(self, request):
+        if request.method != "PUT" or self.failure is None:
+            return await self.inner.handle_async_request(request)
+        failure, self.failure = self.failure, None
+        if self.saved:
+            response = await self.inner.handle_async_request(request)
+            await response.aread()
+        if isinstance(failure, int):
+            return httpx.Response(failure, json={"statusCode": failure})
+        raise failure("failed", request=request)
+
+
+def fail_writes(monkeypatch, mock, failure, saved=True):
+    transport = FailingWrites(httpx.ASGITransport(app=mock.app()), failure, saved)
+    monkeypatch.setattr(server.transport, "_client", httpx.AsyncClient(transport=transport))
+
+
+@pytest.mark.parametrize("failure", [504, 409, httpx.ReadTimeout])
+async def test_patch_saved_despite_error_is_applied_once(mock_confluence, monkeypatch, failure):
+    page_id = managed_page(mock_confluence)
+    fail_writes(monkeypatch, mock_confluence, failure)
+    async with Client(server.mcp) as client:
+        result = await call(client, "patch_confluence_page", page_id=page_id, operations=[
+            {"op": "append_table_row", "heading": "Owners", "content": "<tr><td>Bo</td></tr>"},
+        ])
+    assert "error" not in result and result["version"] == 2
+    assert mock_confluence.pages[page_id]["body"].count("<tr><td>Bo</td></tr>") == 1
+    assert mock_confluence.pages[page_id]["version"] == 2
+
+
+async def test_patch_not_saved_reports_the_error(mock_confluence, monkeypatch):
+    page_id = managed_page(mock_confluence)
+    fail_writes(monkeypatch, mock_confluence, 504, saved=False)
+    async with Client(server.mcp) as client:
+        result = await call(client, "patch_confluence_page", page_id=page_id, operations=[
+            {"op": "append", "content": "<p>x</p>"},
+        ])
+    assert "504" in result["error"]
+    assert mock_confluence.pages[page_id]["version"] == 1
+
+
+async def test_update_with_token_skips_the_read(mock_confluence):
+    page_id = managed_page(mock_confluence)
+    async with Client(server.mcp) as client:
+        prepared = await call(client, "prepare_confluence_page_merge_update", page_id=page_id)
+        server.page_cache.clear()
+        before = mock_confluence.requests
+        result = await call(
+            client, "update_confluence_page_full",
+            page_id=page_id, body="<p>new</p>", update_token=prepared["updateToken"],
+        )
+        assert "error" not in result
+        assert mock_confluence.requests - before == 1
+        assert mock_confluence.pages[page_id]["body"] == "<p>new</p>"
+
+
+async def test_update_with_stale_token_reports_the_conflict(mock_confluence):
+    page_id = managed_page(mock_confluence)
+    async with Client(server.mcp) as client:
+        prepared = await call(client, "prepare_confluence_page_merge_update", page_id=page_id)
+        # Someone else edits the page
+        mock_confluence.pages[page_id]["version"] += 1
+        result = await call(
+            client, "update_confluence_page_full",
+            page_id=page_id, body="<p>mine</p>", update_token=prepared["updateToken"],
+        )
+    assert "Page changed since it was read (version 1 -> 2)" in result["error"]
+    assert mock_confluence.pages[page_id]["body"] == BODY
+
+
+async def test_update_saved_despite_error_is_not_a_conflict(mock_confluence, monkeypatch):
+    page_id = managed_page(mock_confluence)
+    fail_writes(monkeypatch, mock_confluence, 504)
+    async with Client(server.mcp) as client:
+        prepared = await call(client, "prepare_confluence_page_merge_update", page_id=page_id)
+        result = await call(
+            client, "update_confluence_page_full",
+            page_id=page_id, body="<p>new</p>", update_token=prepared["updateToken"],
+        )
+    assert "error" not in result and result["id"] == page_id
+    assert mock_confluence.pages[page_id]["version"] == 2
+
+
+async def test_unmanaged_page_cannot_be_patched(mock_confluence):
+    page_id = next(p for p in mock_confluence.pages if int(p) >= 10_000_000 and int(p) % 2 == 1)
+    async with Client(server.mcp) as client:
+        result = await call(client, "patch_confluence_page", page_id=page_id, operations=[
+            {"op": "append", "content": "<p>x</p>"},
+        ])
+    assert "error" in result
+    assert mock_confluence.pages[page_id]["version"] == 1
+
+
+async def test_unmanaged_page_cannot_be_prepared(mock_confluence):
+    page_id = next(p for p in mock_confluence.pages if int(p) >= 10_000_000 and int(p) % 2 == 1)
+    async with Client(server.mcp) as client:
+        result = await call(client, "prepare_confluence_page_merge_update", page_id=page_id)
+    assert result == {"error": "Page does not have required 'ai-generated' or 'ai-managed' labels."}
+
+
+async def test_tree_requests_are_bounded_by_max_pages(mock_confluence):
+    root = sorted(server.ALLOWED_PARENTS["AR"])[0]
+    async with Client(server.mcp) as client:
+        before = mock_confluence.requests
+        tree = await call(client, "get_confluence_tree", page_id=root, max_depth=5, max_pages=4)
+        requests = mock_confluence.requests - before
+        full = await call(client, "get_confluence_tree", page_id=root, max_depth=10, max_pages=500)
+    assert tree["pageCount"] == 4 and tree["truncated"] is True
+    assert tree["tree"]["title"] == mock_confluence.pages[root]["title"]
+    # Access probe plus one listing per level reached
+    assert requests <= 3
+    assert full["pageCount"] == 31 and full["truncated"] is False
+
+
+async def test_tree_stops_listing_a_level_once_the_budget_is_spent(mock_confluence, monkeypatch):
+    monkeypatch.setattr(server, "TREE_CONCURRENCY", 2)
+    root = sorted(server.ALLOWED_PARENTS["AR"])[0]
+    async with Client(server.mcp) as client:
+        before = mock_confluence.requests
+        # The root's 5 children fill most of the budget; the first batch of
+        # the next level fills the rest
+        tree = await call(client, "get_confluence_tree", page_id=root, max_depth=5, max_pages=8)
+        requests = mock_confluence.requests - before
+    assert tree["pageCount"] == 8 and tree["truncated"] is True
+    # Access probe, the root's listing and one batch of 2, not all 5 of the level
+    assert requests == 4
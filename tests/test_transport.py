@@ -0,0 +1,68 @@
+import httpx
+import pytest
+
+from src.confluence_mcp.transport import ConfluenceTransport, parse_retry_after
+
+pytestmark = pytest.mark.anyio
+
+
+def transport_for(statuses):
+    """A transport whose server answers with statuses in turn (the last one repeats)."""
+    seen = []
+
+    def handler(request):
+        seen.append(request.method)
+        return httpx.Response(statuses[min(len(seen), len(statuses)) - 1], json={})
+
+    transport = ConfluenceTransport("http://confluence.test", ("user", "token"), backoff_factor=0)
+    transport._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return transport, seen
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+async def test_get_is_retried_on_5xx():
+    transport, seen = transport_for([503, 502, 200])
+    response = await transport.get("/rest/api/content/1")
+    assert response.status_code == 200
+    assert len(seen) == 3
+    assert transport.stats()["retries"] == 2
+
+
+@pytest.mark.parametrize("method", ["PUT", "POST"])
+async def test_writes_are_not_replayed_after_5xx(method):
+    transport, seen = transport_for([504, 200])
+    response = await transport.request(method, "/rest/api/content/1", json={})
+    assert response.status_code == 504
+    assert seen == [method]
+
+
+@pytest.mark.parametrize("method", ["PUT", "POST"])
+async def test_writes_are_retried_on_429(method):
+    transport, seen = transport_for([429, 200])
+    response = await transport.request(method, "/rest/api/content/1", json={})
+    assert response.status_code == 200
+    assert seen == [method, method]
+
+
+async def test_put_is_not_replayed_after_a_dropped_connection():
+    seen = []
+
+    def handler(request):
+        seen.append(request.method)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    transport = ConfluenceTransport("http://confluence.test", ("user", "token"), backoff_factor=0)
+    transport._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with pytest.raises(httpx.ReadTimeout):
+        await transport.put("/rest/api/content/1", json={})
+    assert seen == ["PUT"]
+    with pytest.raises(httpx.ReadTimeout):
+        await transport.get("/rest/api/content/1")
+    assert len(seen) == 1 + 1 + transport.max_retries
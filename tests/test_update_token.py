@@ -0,0 +1,67 @@
+import base64
+import json
+
+import pytest
+
+from src.confluence_mcp import server
+
+PAGE = {
+    "id": "123",
+    "title": "Runbook",
+    "space": {"key": "AR"},
+    "version": {"number": 7},
+    "metadata": {"labels": {"results": [{"prefix": "global", "name": "ai-managed"}]}},
+    "_links": {"webui": "/spaces/AR/pages/123"},
+}
+
+
+def test_update_token_round_trip():
+    decoded = server.decode_update_token(server.encode_update_token(PAGE), "123")
+    assert decoded["id"] == "123"
+    assert decoded["title"] == "Runbook"
+    assert decoded["space"] == {"key": "AR"}
+    assert decoded["version"] == {"number": 7}
+    assert server.extract_labels(decoded) == ["ai-managed"]
+    assert decoded["_links"]["webui"] == "/spaces/AR/pages/123"
+    # What update checks need from a page is all there
+    assert server.update_access_error(decoded) == server.update_access_error(PAGE)
+
+
+def test_update_token_is_bound_to_its_page():
+    assert server.decode_update_token(server.encode_update_token(PAGE), "124") is None
+
+
+def test_tampered_update_token_is_rejected():
+    token = server.encode_update_token(PAGE)
+    encoded, signature = token.split(".")
+    claims = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+    claims["v"] = 99
+    forged = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    assert server.decode_update_token(f"{forged}.{signature}", "123") is None
+    assert server.decode_update_token(encoded + ".AAAA", "123") is None
+
+
+@pytest.mark.parametrize("token", ["", "garbage", "a.b.c", "!!.??", None])
+def test_malformed_update_token_is_rejected(token):
+    assert server.decode_update_token(token, "123") is None
+
+
+def test_update_token_signed_with_another_secret_is_rejected(monkeypatch):
+    token = server.encode_update_token(PAGE)
+    monkeypatch.setattr(server, "UPDATE_TOKEN_SECRET", b"another server")
+    assert server.decode_update_token(token, "123") is None
+
+
+def test_expired_update_token_is_rejected(monkeypatch):
+    monkeypatch.setattr(server, "UPDATE_TOKEN_TTL", -1)
+    assert server.decode_update_token(server.encode_update_token(PAGE), "123") is None
+
+
+def test_access_error_names_the_refused_action():
+    page = {**PAGE, "space": {"key": "ELSEWHERE"}}
+    assert server.update_access_error(page) == "Page in space 'ELSEWHERE' cannot be modified (space not allowed)."
+    assert server.update_access_error(page, action="prepared for merge") == (
+        "Page in space 'ELSEWHERE' cannot be prepared for merge (space not allowed)."
+    )
+    unlabeled = {**PAGE, "metadata": {"labels": {"results": []}}}
+    assert "'ai-managed' labels" in server.update_access_error(unlabeled, action="prepared for merge")